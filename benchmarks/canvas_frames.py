@@ -0,0 +1,91 @@
+'''
+    Frame time of the flow canvas while panning and zooming a synthetic flow
+
+    Compares the FunctionGraphicWidget widgets embedded in the scene through
+    proxy widgets with the FlowNodeItem items BlueprintGraphicsView draws,
+    zoomed in (every detail drawn) and out (only the boxes and titles). Each
+    frame scrolls the view and repaints it synchronously.
+
+    Usage (from the repository's root; QT_QPA_PLATFORM=offscreen without a
+    display):
+
+        PYTHONPATH=src python benchmarks/canvas_frames.py [--nodes 500] [--frames 60]
+'''
+import time
+from argparse import ArgumentParser
+
+from blueprint.models import Flow, FlowElement, Function
+from blueprint.ui.widgets import BlueprintGraphicsView, FunctionGraphicWidget
+from PySide6.QtWidgets import QApplication, QGraphicsScene
+
+COLUMNS = 25
+
+
+def synthetic_flow(count: int) -> Flow:
+    nodes = []
+    for i in range(count):
+        node = FlowElement(
+            coords=FlowElement.ChartCoords(x=(i % COLUMNS) * 240, y=(i // COLUMNS) * 160),
+            function=Function(f'package.module{i % 50}', f'function{i % 20}'))
+        if nodes:
+            node.inputs['value'] = nodes[-1].uid
+        node.constants['scale'] = i
+        nodes.append(node)
+
+    return Flow(name='synthetic', nodes=nodes)
+
+
+def frame_time(view: BlueprintGraphicsView, zoom: float, frames: int) -> float:
+    view.resetTransform()
+    view.scale(zoom, zoom)
+    view.horizontalScrollBar().setValue(0)
+    view.viewport().repaint()
+
+    start = time.perf_counter()
+    for frame in range(frames):
+        bar = view.horizontalScrollBar()
+        bar.setValue((bar.value() + 40) % max(1, bar.maximum()))
+        view.viewport().repaint()
+
+    return (time.perf_counter() - start) / frames
+
+
+def main():
+    args = ArgumentParser()
+    args.add_argument('--nodes', type=int, default=500)
+    args.add_argument('--frames', type=int, default=60)
+    args = args.parse_args()
+
+    app = QApplication([])
+    flow = synthetic_flow(args.nodes)
+
+    print(f'{args.nodes} nodes, {args.frames} frames of 1280x800')
+    print(f'{"canvas":<24}{"build (s)":>10}{"zoom 1 (ms)":>14}{"zoom 0.25 (ms)":>16}')
+
+    for label in ('proxy widgets (before)', 'FlowNodeItem'):
+        # the scenes are kept alive along with their views
+        scene = QGraphicsScene()
+        start = time.perf_counter()
+        if label == 'FlowNodeItem':
+            view = BlueprintGraphicsView(flow, scene)
+        else:
+            view = BlueprintGraphicsView(Flow(name=flow.name, nodes=[]), scene)
+            for node in flow.nodes:
+                proxy = scene.addWidget(FunctionGraphicWidget(node.function))
+                proxy.setPos(node.coords.x, node.coords.y)
+        build = time.perf_counter() - start
+
+        view.resize(1280, 800)
+        view.show()
+        app.processEvents()
+
+        detailed = frame_time(view, 1.0, args.frames)
+        overview = frame_time(view, 0.25, args.frames)
+        print(f'{label:<24}{build:>10.2f}{detailed * 1000:>14.1f}{overview * 1000:>16.1f}')
+
+        view.close()
+        del view, scene
+
+
+if __name__ == '__main__':
+    main()
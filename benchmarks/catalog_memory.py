@@ -0,0 +1,107 @@
+'''
+    Memory footprint of the functions catalog on a synthetic project
+
+    Compares the plain dataclass records used before (one __dict__ and one
+    module string per function, as decoded from a JSON cache), a list of
+    slotted Function records and the FunctionCatalog, which also interns the
+    module paths and names and indexes the functions by qualified name.
+
+    Usage (from the repository's root):
+
+        PYTHONPATH=src python benchmarks/catalog_memory.py [--functions 200000]
+'''
+import gc
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from inspect import Signature
+from typing import Callable, Iterator, List, Tuple
+
+from blueprint.models import Function, FunctionCatalog
+
+FUNCTIONS_PER_MODULE = 10
+MODULES_PER_PACKAGE = 20
+NAMES = [f'{verb}_{noun}' for verb in ['get', 'set', 'load', 'save', 'parse', 'build', 'make', 'read', 'write', 'to']
+         for noun in ['item', 'items', 'value', 'data', 'frame', 'table', 'row', 'rows', 'file', 'path',
+                      'config', 'record', 'key', 'name', 'list', 'dict', 'json', 'csv', 'node', 'tree']]
+
+
+@dataclass
+class DictFunction:
+    module: str
+    name: str
+    signature: Signature
+
+
+def synthetic_functions(count: int) -> Iterator[Tuple[str, str]]:
+    '''
+        Yield (module, name) couples, with fresh string objects each time,
+        as a JSON decoder would produce them
+    '''
+    for i in range(count):
+        module_id = i // FUNCTIONS_PER_MODULE
+        package_id = module_id // MODULES_PER_PACKAGE
+        module = '.'.join([f'vendor{package_id // 50}', f'pkg{package_id % 50}',
+                           f'module{module_id % MODULES_PER_PACKAGE}'])
+        name = ''.join([NAMES[(i * 7) % len(NAMES)], ''])
+
+        yield module, name
+
+
+def measure(build: Callable[[int], object], count: int) -> Tuple[int, float, object]:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(count)
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return size, elapsed, result
+
+
+def build_dataclasses(count: int) -> List[DictFunction]:
+    return [DictFunction(module, name, None) for module, name in synthetic_functions(count)]
+
+
+def build_slotted(count: int) -> List[Function]:
+    return [Function(module, name) for module, name in synthetic_functions(count)]
+
+
+def build_catalog(count: int) -> FunctionCatalog:
+    return FunctionCatalog(Function(module, name) for module, name in synthetic_functions(count))
+
+
+def main():
+    args = ArgumentParser()
+    args.add_argument('--functions', type=int, default=200000)
+    args = args.parse_args()
+    count: int = args.functions
+
+    print(f'{count} functions, {count // FUNCTIONS_PER_MODULE} modules')
+    print(f'{"representation":<32}{"memory (MB)":>14}{"bytes/function":>16}{"build (s)":>12}')
+
+    catalog = None
+    for label, build in [
+        ('List[dataclass] (before)', build_dataclasses),
+        ('List[Function] (slotted)', build_slotted),
+        ('FunctionCatalog', build_catalog),
+    ]:
+        size, elapsed, result = measure(build, count)
+        print(f'{label:<32}{size / 2 ** 20:>14.1f}{size / count:>16.1f}{elapsed:>12.2f}')
+        if isinstance(result, FunctionCatalog):
+            catalog = result
+        del result
+
+    names = [FunctionCatalog.qualified_name(module, name)
+             for module, name in synthetic_functions(count)][::97]
+    start = time.perf_counter()
+    for name in names:
+        catalog.get(name)
+    elapsed = time.perf_counter() - start
+    print(f'\nFunctionCatalog.get: {elapsed / len(names) * 1e9:.0f} ns per lookup')
+
+
+if __name__ == '__main__':
+    main()
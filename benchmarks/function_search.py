@@ -0,0 +1,119 @@
+'''
+    Query time of the functions filter on a synthetic catalog
+
+    Compares FunctionSearchIndex with a linear scan of the catalog (the
+    filter box's matching before the index), on substring, initials and
+    fuzzy queries, and on a query typed a character at a time (as the
+    filter box runs it, on each edit).
+
+    Usage (from the repository's root):
+
+        PYTHONPATH=src python benchmarks/function_search.py [--functions 100000] [--repeat 20]
+'''
+import time
+from argparse import ArgumentParser
+from typing import Callable, Set
+
+from blueprint.models import Function, FunctionCatalog
+from blueprint.search import FunctionSearchIndex, initials
+
+FUNCTIONS_PER_MODULE = 10
+MODULES_PER_PACKAGE = 20
+VERBS = ['get', 'set', 'load', 'save', 'parse', 'build', 'make', 'read', 'write', 'to']
+NOUNS = ['item', 'items', 'value', 'data', 'frame', 'table', 'row', 'rows', 'file', 'path',
+         'config', 'record', 'key', 'name', 'list', 'dict', 'json', 'csv', 'node', 'tree']
+
+QUERIES = [
+    ('substring', 'parse_json'),
+    ('substring', 'pkg7.module1'),
+    ('substring', 'ro'),
+    ('initials', 'pj'),
+    ('initials', 'gTL'),
+    ('fuzzy', 'prsjsn'),
+    ('fuzzy', 'wrtcsv'),
+]
+TYPED = 'parse_json'
+
+
+def synthetic_catalog(count: int) -> FunctionCatalog:
+    catalog = FunctionCatalog()
+    for i in range(count):
+        module_id = i // FUNCTIONS_PER_MODULE
+        package_id = module_id // MODULES_PER_PACKAGE
+        module = '.'.join([f'vendor{package_id // 50}', f'pkg{package_id % 50}',
+                           f'module{module_id % MODULES_PER_PACKAGE}'])
+        # distinct names, as in real projects
+        name = f'{VERBS[i % len(VERBS)]}_{NOUNS[(i // len(VERBS)) % len(NOUNS)]}_{i // 200}'
+        catalog.add(Function(module, name))
+
+    return catalog
+
+
+def linear_search(catalog: FunctionCatalog, query: str) -> Set[int]:
+    lower_query = query.lower()
+    result = set()
+    fuzzy = set()
+    for id in catalog.ids():
+        fn = catalog[id]
+        if lower_query in FunctionSearchIndex.text(fn):
+            result.add(id)
+        elif query.isalnum():
+            if initials(fn.name).startswith(lower_query):
+                result.add(id)
+            elif len(query) > 2:
+                chars = iter(fn.name.lower())
+                if all(char in chars for char in lower_query):
+                    fuzzy.add(id)
+
+    # the fuzzy matches only count for the queries matching few functions otherwise
+    if len(result) < FunctionSearchIndex.FUZZY_THRESHOLD:
+        result |= fuzzy
+
+    return result
+
+
+def timed(search: Callable[[], Set[int]], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        search()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main():
+    args = ArgumentParser()
+    args.add_argument('--functions', type=int, default=100000)
+    args.add_argument('--repeat', type=int, default=20)
+    args = args.parse_args()
+
+    catalog = synthetic_catalog(args.functions)
+    start = time.perf_counter()
+    index = FunctionSearchIndex(catalog)
+    print(f'{args.functions} functions, index built in {time.perf_counter() - start:.2f} s')
+    print(f'{"query":<26}{"matches":>9}{"index (ms)":>12}{"linear (ms)":>13}')
+
+    for kind, query in QUERIES:
+        matches = index.search(query)
+        assert matches == linear_search(catalog, query), query
+        # a fresh index each time for the fuzzy queries, not narrowed down
+        # from the previous one
+        indexed = timed(lambda: (setattr(index, '_last_fuzzy', None), index.search(query)), args.repeat)
+        linear = timed(lambda: linear_search(catalog, query), max(1, args.repeat // 10))
+        print(f'{kind + " " + repr(query):<26}{len(matches):>9}{indexed * 1000:>12.2f}{linear * 1000:>13.1f}')
+
+    # each edit of the filter box, the fuzzy matches narrowed down from
+    # the previous edit's ones
+    edits = [float('inf')] * len(TYPED)
+    for _ in range(args.repeat):
+        index._last_fuzzy = None
+        for end in range(1, len(TYPED) + 1):
+            start = time.perf_counter()
+            index.search(TYPED[:end])
+            edits[end - 1] = min(edits[end - 1], time.perf_counter() - start)
+    print(f'typing {TYPED!r}, per edit (ms): ' + ' '.join(f'{edit * 1000:.2f}' for edit in edits))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+'''
+    Round-trip (to dictionaries and back) of a synthetic flow
+
+    Compares a reflective converter, walking each object's dataclass fields
+    and type hints on every call (as DictConvertible walked the settings'
+    members), the hand written Flow.toDict / fromDict used before, and the
+    functions blueprint.serialization generates once per class.
+
+    Usage (from the repository's root):
+
+        PYTHONPATH=src python benchmarks/serialization_roundtrip.py [--nodes 10000] [--repeat 5]
+'''
+import dataclasses
+import time
+import typing
+from argparse import ArgumentParser
+from typing import Any, Callable, Tuple
+
+from blueprint import serialization
+from blueprint.models import Flow, FlowElement, Function
+
+
+def synthetic_flow(count: int) -> Flow:
+    nodes = []
+    for i in range(count):
+        node = FlowElement(
+            coords=FlowElement.ChartCoords(x=(i % 100) * 200, y=(i // 100) * 120),
+            function=Function(f'package.module{i % 50}', f'function{i % 20}'))
+        if nodes:
+            node.inputs['value'] = nodes[-1].uid
+        node.constants.update({'scale': i / 10, 'label': f'node {i}', 'enabled': bool(i % 2)})
+        nodes.append(node)
+
+    return Flow(name='synthetic', nodes=nodes)
+
+
+def reflective_to_dict(value: Any) -> Any:
+    if isinstance(value, Function):
+        return {'module': value.module, 'name': value.name}
+    if isinstance(value, FlowElement.ChartCoords):
+        return [value.x, value.y]
+    if dataclasses.is_dataclass(value):
+        return {field.name: reflective_to_dict(getattr(value, field.name))
+                for field in dataclasses.fields(value)}
+    if isinstance(value, list):
+        return [reflective_to_dict(item) for item in value]
+    if isinstance(value, dict):
+        return {key: reflective_to_dict(item) for key, item in value.items()}
+
+    return value
+
+
+def reflective_from_dict(cls: Any, value: Any) -> Any:
+    origin = getattr(cls, '__origin__', None)
+    if cls is Function:
+        return Function.fromDict(value)
+    if cls is FlowElement.ChartCoords:
+        return FlowElement.ChartCoords(*value)
+    if origin is list:
+        return [reflective_from_dict(cls.__args__[0], item) for item in value]
+    if origin is dict:
+        return {key: reflective_from_dict(cls.__args__[1], item) for key, item in value.items()}
+    if dataclasses.is_dataclass(cls):
+        hints = typing.get_type_hints(cls)
+        return cls(**{field.name: reflective_from_dict(hints[field.name], value[field.name])
+                      for field in dataclasses.fields(cls) if field.name in value})
+
+    return value
+
+
+def handwritten_to_dict(flow: Flow) -> dict:
+    return {
+        'uid': flow.uid,
+        'name': flow.name,
+        'nodes': [{
+            'uid': node.uid,
+            'function': {'module': node.function.module, 'name': node.function.name},
+            'coords': [node.coords.x, node.coords.y],
+            'inputs': dict(node.inputs),
+            'constants': dict(node.constants),
+        } for node in flow.nodes],
+    }
+
+
+def handwritten_from_dict(dictionary: dict) -> Flow:
+    return Flow(
+        name=dictionary['name'],
+        nodes=[FlowElement(
+            coords=FlowElement.ChartCoords(*node['coords']),
+            function=Function.fromDict(node['function']),
+            uid=node['uid'],
+            inputs=dict(node.get('inputs', {})),
+            constants=dict(node.get('constants', {}))) for node in dictionary['nodes']],
+        uid=dictionary['uid'])
+
+
+def best_of(repeat: int, call: Callable[[], Any]) -> Tuple[float, Any]:
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = call()
+        best = min(best, time.perf_counter() - start)
+
+    return best, result
+
+
+def main():
+    args = ArgumentParser()
+    args.add_argument('--nodes', type=int, default=10000)
+    args.add_argument('--repeat', type=int, default=5)
+    args = args.parse_args()
+
+    flow = synthetic_flow(args.nodes)
+    expected = serialization.to_dict(flow)
+
+    print(f'{args.nodes} nodes, best of {args.repeat}')
+    print(f'{"converter":<28}{"to dict (ms)":>14}{"from dict (ms)":>16}{"us/node":>10}')
+    for label, to_dict, from_dict in [
+        ('reflective', reflective_to_dict, lambda d: reflective_from_dict(Flow, d)),
+        ('hand written (before)', handwritten_to_dict, handwritten_from_dict),
+        ('generated', serialization.to_dict, lambda d: serialization.from_dict(Flow, d)),
+    ]:
+        encode, dictionary = best_of(args.repeat, lambda: to_dict(flow))
+        decode, decoded = best_of(args.repeat, lambda: from_dict(dictionary))
+        assert serialization.to_dict(decoded) == expected, label
+        print(f'{label:<28}{encode * 1000:>14.1f}{decode * 1000:>16.1f}'
+              f'{(encode + decode) / args.nodes * 1e6:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -7,7 +7,6 @@ from PySide6 import QtCore
 from PySide6.QtGui import QIcon
 
 from PySide6.QtWidgets import QApplication
-from blueprint.model_functions import load_project
 
 from blueprint.settings import Settings
 from blueprint.ui.mainwindow.mainwindow import MainWindow
@@ -50,9 +49,6 @@ def main():
             basePath) if projectPath else None
 
     settings = Settings(filePath=settingsFilePath, load=True)
-    project = None
-    if settings.get_project_root():
-        project = load_project(settings)
 
     app = QApplication([])
     if args.log_level.lower() == 'debug':
@@ -63,9 +59,10 @@ def main():
         'ui', 'images', 'icons', 'blueprint-icon.svg')))
     app.setWindowIcon(icon)
     app.setQuitOnLastWindowClosed(False)
-    widget = MainWindow(settings=settings, project=project)
-    widget.load_functions_from_project()
+    widget = MainWindow(settings=settings)
     widget.show()
+    # the project is loaded in the background, once the window is shown
+    widget.load_project()
 
     widget.signals.closed.connect(lambda: app.quit())
     sys.exit(app.exec())
@@ -0,0 +1,177 @@
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+from blueprint.flow_file import FlowFileError, load_flow
+from blueprint.runner.cache import ResultCache
+from blueprint.runner.checkpoint import RunCheckpoint
+from blueprint.runner.flow_runner import (DEFAULT_BATCH_SIZE, ExecutorType,
+                                          FlowRunner)
+from blueprint.runner.graph import FlowError
+from blueprint.runner.plan import PlanCache
+from blueprint.runner.profiling import FlowProfile
+from blueprint.runner.remote import (AUTHKEY_VARIABLE, RemoteExecutor,
+                                     get_authkey, parse_address)
+
+
+def save_profile(profile: FlowProfile, filePath: Path) -> None:
+    logger = logging.getLogger('blueprint-run')
+    logger.info('Profile:\n' + profile.summary())
+    try:
+        profile.save(filePath)
+    except OSError as ex:
+        logger.error(f'Unable to write the profile: {ex}')
+
+
+def create_remote_executor(args: argparse.Namespace, projectPath: Path) -> RemoteExecutor:
+    if not args.listen:
+        return RemoteExecutor(
+            workers=os.cpu_count() if args.workers is None else args.workers,
+            retries=args.retries, project_root=str(projectPath))
+
+    try:
+        address = parse_address(args.listen)
+        authkey = get_authkey()
+    except ValueError as ex:
+        raise FlowError(f'Invalid --listen address or {AUTHKEY_VARIABLE}: {ex}') from ex
+    if authkey is None:
+        raise FlowError(f'Set {AUTHKEY_VARIABLE} to the workers\' key, to use --listen')
+
+    return RemoteExecutor(
+        address=address, authkey=authkey, workers=args.workers or 0,
+        retries=args.retries, project_root=str(projectPath))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('flow', help='flow file to run')
+    parser.add_argument(
+        '--project-path', help='Path of the project directory (default: the current one)', default=None)
+    parser.add_argument(
+        '--executor', help='thread: run the nodes in a thread pool, process: in a process pool, '
+        'asyncio: await the coroutine functions on an event loop, the other ones in a thread pool, '
+        'remote: on worker processes connected over TCP (see --listen) (default thread)',
+        choices=[executor.value for executor in ExecutorType], default=ExecutorType.THREAD.value)
+    parser.add_argument(
+        '--compiled', help='run the flow\'s compiled plan (cached in the project\'s .blueprint/plans) node after node, '
+        'in this process: the lowest overhead for short flows (not with the executor, cache, checkpoint '
+        'and profile options)', action='store_true')
+    parser.add_argument(
+        '--workers', help='maximum number of nodes running at once (default: the pool\'s default); '
+        'with remote, the number of workers started on this host (default: one per CPU, none with --listen)',
+        type=int, default=None)
+    parser.add_argument(
+        '--listen', help=f'with remote, the host:port to wait for the blueprint-worker processes on, '
+        f'authenticating them with the hex encoded key of the {AUTHKEY_VARIABLE} environment variable',
+        default=None)
+    parser.add_argument(
+        '--retries', help='with remote, how many times a node whose worker disconnects is run again (default 2)', type=int, default=2)
+    parser.add_argument(
+        '--buffer-size', help='items buffered between a streaming node and each of its dependents (default 64)',
+        type=int, default=64)
+    parser.add_argument(
+        '--concurrency', help='maximum number of coroutine functions awaited at once, with asyncio (default 100)',
+        type=int, default=100)
+    parser.add_argument(
+        '--batch-size', help=f'items per call of the batch functions (default {DEFAULT_BATCH_SIZE})',
+        type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        '--shared-memory', help='with the process executor, pass the big return values (from 1 MB) '
+        'to the dependents through shared memory, rather than pickling them through the coordinating process',
+        action='store_true')
+    parser.add_argument(
+        '--cache', help='skip the nodes whose return value is cached in the project\'s .blueprint/cache, '
+        'and cache the others\' ones', action='store_true')
+    parser.add_argument(
+        '--cache-size', help='maximum size of the cache, in MB (default 1024)', type=int, default=1024)
+    parser.add_argument(
+        '--checkpoint', help='record the completed nodes in the project\'s .blueprint/runs, '
+        'for --resume to run again only the nodes that didn\'t complete', action='store_true')
+    parser.add_argument(
+        '--resume', help='resume the last run of the flow which used --checkpoint (implies --checkpoint)',
+        action='store_true')
+    parser.add_argument(
+        '--profile', help='profile the nodes (wall and CPU time, memory, arguments and return values sizes), '
+        'writing a Chrome trace (chrome://tracing, Perfetto) to this file and logging a summary', default=None)
+    parser.add_argument(
+        '--log-level', help='DEBUG, INFO, WARN, ERROR, CRITICAL (default INFO)', default='INFO')
+    args = parser.parse_args()
+
+    if args.compiled:
+        conflicting = [option for option, used in [
+            ('--executor', args.executor != ExecutorType.THREAD.value),
+            ('--workers', args.workers is not None),
+            ('--listen', args.listen is not None),
+            ('--shared-memory', args.shared_memory),
+            ('--cache', args.cache),
+            ('--checkpoint', args.checkpoint),
+            ('--resume', args.resume),
+            ('--profile', args.profile is not None),
+        ] if used]
+        if conflicting:
+            parser.error(f'--compiled runs the nodes one after the other, in this process: '
+                         f'it can\'t be combined with {", ".join(conflicting)}')
+
+    logging.basicConfig(level=logging.getLevelName(args.log_level))
+
+    projectPath = Path(args.project_path or '.').absolute()
+
+    cache = None
+    if args.cache:
+        cache = ResultCache(ResultCache.get_cache_path(projectPath), args.cache_size * 1024 ** 2)
+
+    try:
+        flow = load_flow(Path(args.flow))
+
+        if args.compiled:
+            if str(projectPath) not in sys.path:
+                sys.path.append(str(projectPath))
+            plan = PlanCache(PlanCache.get_plans_path(projectPath)).get(flow)
+            for uid, result in plan.run().items():
+                step = next(step for step in plan.steps if step.uid == uid)
+                print(f'{step.module}.{step.name} ({uid}): {result!r}')
+
+            return
+
+        checkpoint = None
+        if args.checkpoint or args.resume:
+            checkpoint = RunCheckpoint(RunCheckpoint.get_runs_path(projectPath), flow.uid, resume=args.resume)
+
+        executor = None
+        if args.executor == ExecutorType.REMOTE.value:
+            executor = create_remote_executor(args, projectPath)
+
+        runner = FlowRunner(
+            flow, executor_type=ExecutorType(args.executor), workers=args.workers,
+            project_root=projectPath, buffer_size=args.buffer_size,
+            concurrency=args.concurrency, batch_size=args.batch_size,
+            shared_memory=args.shared_memory, cache=cache, checkpoint=checkpoint,
+            profiling=args.profile is not None, executor=executor)
+        try:
+            results = runner.run()
+        finally:
+            if runner.profile is not None:
+                save_profile(runner.profile, Path(args.profile))
+            if executor is not None:
+                executor.shutdown()
+    except (FlowFileError, FlowError) as ex:
+        logging.getLogger('blueprint-run').error(ex)
+        sys.exit(1)
+
+    if runner.resumed:
+        logging.getLogger('blueprint-run').info(
+            'Resumed: ' + ', '.join(
+                runner.graph.label(uid) for uid in runner.graph.order if uid in runner.resumed))
+    if runner.cached:
+        logging.getLogger('blueprint-run').info(
+            'Served from the cache: ' + ', '.join(
+                runner.graph.label(uid) for uid in runner.graph.order if uid in runner.cached))
+
+    for uid, result in results.items():
+        print(f'{runner.graph.label(uid)}: {result!r}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,19 @@
 from argparse import ArgumentParser
 from pathlib import Path
-from blueprint.module_scanner import functions_scanner
+from blueprint.module_scanner import ScanMode, functions_scanner
 
 
 def main():
     args = ArgumentParser()
     args.add_argument('package_root', help='root of the package to scan')
+    args.add_argument(
+        '--mode', help='import: import the modules, ast: parse their source without executing them (default import)',
+        choices=[mode.value for mode in ScanMode], default=ScanMode.IMPORT.value)
+    args.add_argument(
+        '--workers', help='number of worker processes (default 0: scan in the main process)',
+        type=int, default=0)
+    args.add_argument(
+        '--lazy', help="don't extract the signatures while scanning", action='store_true')
     args = args.parse_args()
 
     print('')
@@ -14,7 +22,7 @@ def main():
     print('')
     path = Path(args.package_root)
 
-    print(functions_scanner(path.absolute(), r'_test'))
+    print(functions_scanner(path.absolute(), r'_test', mode=ScanMode(args.mode), workers=args.workers, lazy=args.lazy))
 
 
 if __name__ == '__main__':
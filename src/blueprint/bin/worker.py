@@ -0,0 +1,41 @@
+import argparse
+import logging
+import sys
+from multiprocessing import AuthenticationError
+from pathlib import Path
+
+from blueprint.runner.remote import AUTHKEY_VARIABLE, get_authkey, parse_address, serve
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run the nodes of the flows run by blueprint-run --executor remote, '
+        f'authenticating with the hex encoded key of the {AUTHKEY_VARIABLE} environment variable')
+    parser.add_argument('coordinator', help='host:port the coordinator listens on (see blueprint-run --listen)')
+    parser.add_argument(
+        '--project-path', help='Path of the project directory (default: the current one)', default=None)
+    parser.add_argument(
+        '--log-level', help='DEBUG, INFO, WARN, ERROR, CRITICAL (default INFO)', default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.getLevelName(args.log_level))
+    logger = logging.getLogger('blueprint-worker')
+
+    projectPath = str(Path(args.project_path or '.').absolute())
+    if projectPath not in sys.path:
+        sys.path.append(projectPath)
+
+    try:
+        authkey = get_authkey()
+        if authkey is None:
+            logger.error(f'Set {AUTHKEY_VARIABLE} to the coordinator\'s key')
+            sys.exit(1)
+
+        serve(parse_address(args.coordinator), authkey)
+    except (ValueError, OSError, AuthenticationError) as ex:
+        logger.error(ex)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import re
+import sys
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from blueprint.models import Function
+
+if TYPE_CHECKING:
+    from blueprint.module_scanner import ScanMode
+
+DEPENDENCY_CACHE_VERSION = 2
+
+
+class DependencyCache:
+    '''
+        User-level cache of the third-party distributions' modules and
+        functions, shared by all the projects
+
+        Entries are keyed by distribution name, installed version, scan
+        mode and modules filter, so that a distribution is scanned again
+        only when its version changes. Entries are kept in memory too,
+        so that projects opened by the same process share them for free.
+
+        The modules which failed to be scanned are recorded without
+        functions (None): the entry is incomplete, and only those modules
+        are scanned again.
+    '''
+    path: Path
+    logger: Logger
+
+    _memory: Dict[str, Dict[str, Optional[List[Function]]]]
+
+    __instance: Optional['DependencyCache'] = None
+
+    @staticmethod
+    def get_instance() -> 'DependencyCache':
+        if DependencyCache.__instance is None:
+            DependencyCache.__instance = DependencyCache()
+
+        return DependencyCache.__instance
+
+    @staticmethod
+    def get_cache_dir() -> Path:
+        if sys.platform == 'win32' and os.environ.get('LOCALAPPDATA'):
+            base = Path(os.environ['LOCALAPPDATA'])
+        elif sys.platform == 'darwin':
+            base = Path.home().joinpath('Library', 'Caches')
+        else:
+            base = Path(os.environ.get('XDG_CACHE_HOME')
+                        or Path.home().joinpath('.cache'))
+
+        return base.joinpath('blueprint', 'dependencies')
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path if path else DependencyCache.get_cache_dir()
+        self.logger = getLogger('DependencyCache')
+        self._memory = {}
+
+    @staticmethod
+    def get_key(distribution_name: str, version: str, mode: 'ScanMode', filter: Optional[str]) -> str:
+        name = re.sub(r'[-_.]+', '-', distribution_name).lower()
+        key = f'{name}-{version}-{mode.value}'
+        if filter:
+            key += '-' + hashlib.sha1(filter.encode('utf-8')).hexdigest()[:8]
+
+        return re.sub(r'[^A-Za-z0-9_.+-]', '_', key)
+
+    def lookup(
+            self, distribution_name: str, version: str, mode: 'ScanMode',
+            filter: Optional[str] = None) -> Optional[Dict[str, Optional[List[Function]]]]:
+        '''
+            Return the distribution's modules (in scan order) with their
+            functions (None for the ones which failed to be scanned), or
+            None if they're not cached for this version
+        '''
+        key = DependencyCache.get_key(
+            distribution_name, version, mode, filter)
+        if key in self._memory:
+            return self._memory[key]
+
+        filePath = self.path.joinpath(f'{key}.json')
+        if not filePath.exists():
+            return None
+
+        try:
+            with filePath.open('r') as fh:
+                dictionary = json.load(fh)
+        except (OSError, ValueError) as ex:
+            self.logger.warning(
+                f'Discarding unreadable cache of {distribution_name}: {ex}')
+            return None
+
+        if dictionary.get('version') != DEPENDENCY_CACHE_VERSION:
+            return None
+
+        modules = {module: None if functions is None else [Function.fromDict(function) for function in functions]
+                   for module, functions in dictionary['modules']}
+        self._memory[key] = modules
+
+        return modules
+
+    def store(
+            self, distribution_name: str, version: str, mode: 'ScanMode',
+            filter: Optional[str], modules: Dict[str, Optional[List[Function]]]) -> None:
+        key = DependencyCache.get_key(
+            distribution_name, version, mode, filter)
+        self._memory[key] = modules
+
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+
+            filePath = self.path.joinpath(f'{key}.json')
+            tmpPath = filePath.with_name(f'{filePath.name}.{os.getpid()}.tmp')
+            with tmpPath.open('w') as fh:
+                fh.write(json.dumps({
+                    'version': DEPENDENCY_CACHE_VERSION,
+                    'distribution': distribution_name,
+                    'distributionVersion': version,
+                    'modules': [[module, None if functions is None else [function.toDict() for function in functions]]
+                                for module, functions in modules.items()],
+                }, separators=(',', ':')))
+            os.replace(tmpPath, filePath)
+        except OSError as ex:
+            self.logger.warning(
+                f'Unable to cache distribution {distribution_name}: {ex}')
@@ -0,0 +1,52 @@
+import json
+import os
+from pathlib import Path
+
+from blueprint.models import Flow
+
+FLOW_FILE_VERSION = 1
+
+
+class FlowFileError(Exception):
+    pass
+
+
+def load_flow(filePath: Path) -> Flow:
+    '''
+        Load a flow saved by save_flow
+    '''
+    try:
+        with Path(filePath).open('r') as fh:
+            dictionary = json.loads(fh.read())
+    except (OSError, ValueError) as ex:
+        raise FlowFileError(f'Unable to read the flow {filePath}: {ex}') from ex
+
+    if dictionary.get('version') != FLOW_FILE_VERSION:
+        raise FlowFileError(
+            f'Unsupported flow file version {dictionary.get("version")}: {filePath}')
+
+    return Flow.fromDict(dictionary['flow'])
+
+
+def save_flow(flow: Flow, filePath: Path, compact: bool = False) -> None:
+    '''
+        Save a flow as JSON (without whitespace if compact), atomically
+        replacing the file
+    '''
+    save_flow_dict(flow.toDict(), filePath, compact=compact)
+
+
+def save_flow_dict(dictionary: dict, filePath: Path, compact: bool = False) -> None:
+    '''
+        Save a flow's dictionary (see Flow.toDict), like save_flow
+    '''
+    filePath = Path(filePath)
+    filePath.parent.mkdir(parents=True, exist_ok=True)
+
+    tmpPath = filePath.with_name(f'{filePath.name}.{os.getpid()}.tmp')
+    with tmpPath.open('w') as fh:
+        fh.write(json.dumps({
+            'version': FLOW_FILE_VERSION,
+            'flow': dictionary,
+        }, **({'separators': (',', ':')} if compact else {'indent': 2})))
+    os.replace(tmpPath, filePath)
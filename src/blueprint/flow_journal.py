@@ -0,0 +1,156 @@
+import json
+import os
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import IO, Iterator, Optional
+
+from blueprint.models import Flow, FlowElement
+
+
+class Operation:
+    '''
+        The edits recorded in the journal, as {'op': ..., 'flow': uid, ...}
+        dictionaries: applying one again leaves the flow as it is, so that
+        a journal can be replayed over a snapshot already including some of
+        its operations
+    '''
+    # 'node': the node's dictionary (replacing the node with the same uid)
+    ADD_NODE = 'add'
+    # 'node': uid, 'coords': [x, y]
+    MOVE_NODE = 'move'
+    # 'node': uid
+    DELETE_NODE = 'delete'
+    # 'name': the flow's new name
+    RENAME_FLOW = 'rename'
+
+
+def apply_operation(flow: Flow, operation: dict) -> None:
+    kind = operation['op']
+
+    if kind == Operation.ADD_NODE:
+        node = FlowElement.fromDict(operation['node'])
+        flow.nodes = [other for other in flow.nodes if other.uid != node.uid]
+        flow.nodes.append(node)
+    elif kind == Operation.MOVE_NODE:
+        for node in flow.nodes:
+            if node.uid == operation['node']:
+                node.coords = FlowElement.ChartCoords(*operation['coords'])
+    elif kind == Operation.DELETE_NODE:
+        flow.nodes = [node for node in flow.nodes if node.uid != operation['node']]
+        # the inputs the node's return value was feeding
+        for node in flow.nodes:
+            node.inputs = {parameter: uid for parameter, uid in node.inputs.items()
+                           if uid != operation['node']}
+    elif kind == Operation.RENAME_FLOW:
+        flow.name = operation['name']
+    else:
+        raise ValueError(f'Unknown flow operation {kind!r}')
+
+    flow.touch()
+
+
+def _unlink(path: Path) -> None:
+    # Path.unlink(missing_ok=True) needs Python 3.8
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class FlowJournal:
+    '''
+        Append-only log of the flows' edits (see Operation), one JSON line
+        each, in the project's .blueprint/flows folder
+
+        The journal is rotated when compacted (see FlowStore.compact): its
+        operations are moved to a second file, removed once the flows they
+        edit are saved. Both files are replayed when the project is opened,
+        should blueprint have stopped before.
+    '''
+    JOURNAL_NAME = 'journal.jsonl'
+    COMPACTING_NAME = 'journal.compacting.jsonl'
+
+    path: Path
+    logger: Logger
+    # operations appended since the last rotation
+    pending: int
+
+    _fh: Optional[IO[str]]
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.logger = getLogger('FlowJournal')
+        self.pending = 0
+        self._fh = None
+
+    def journal_path(self) -> Path:
+        return self.path.joinpath(self.JOURNAL_NAME)
+
+    def compacting_path(self) -> Path:
+        return self.path.joinpath(self.COMPACTING_NAME)
+
+    def append(self, operation: dict) -> None:
+        if self._fh is None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._fh = self.journal_path().open('a')
+
+        self._fh.write(json.dumps(operation, separators=(',', ':')) + '\n')
+        # on the disk (the OS's cache) as soon as the edit is done
+        self._fh.flush()
+        self.pending += 1
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def rotate(self) -> None:
+        '''
+            Move the operations to the compacting file (after the ones of a
+            failed compaction, if any), starting a new journal
+        '''
+        self.close()
+        self.pending = 0
+        journalPath = self.journal_path()
+        compactingPath = self.compacting_path()
+
+        if not journalPath.exists():
+            # nothing new since the last rotation
+            return
+
+        if compactingPath.exists():
+            with compactingPath.open('a') as fh:
+                fh.write(journalPath.read_text())
+                # on the disk before the journal is removed
+                fh.flush()
+                os.fsync(fh.fileno())
+            journalPath.unlink()
+        else:
+            os.replace(journalPath, compactingPath)
+
+    def discard_compacted(self) -> None:
+        _unlink(self.compacting_path())
+
+    def clear(self) -> None:
+        self.close()
+        self.discard_compacted()
+        _unlink(self.journal_path())
+        self.pending = 0
+
+    def replay(self) -> Iterator[dict]:
+        '''
+            The operations of both files, the compacting one's first
+        '''
+        for filePath in (self.compacting_path(), self.journal_path()):
+            try:
+                with filePath.open('r') as fh:
+                    lines = fh.readlines()
+            except FileNotFoundError:
+                continue
+
+            for number, line in enumerate(lines, 1):
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # the last line, if blueprint stopped while writing it
+                    self.logger.warning(f'Skipping the unreadable operation {filePath.name}:{number}')
@@ -0,0 +1,292 @@
+import json
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from blueprint.flow_file import FlowFileError, load_flow, save_flow, save_flow_dict
+from blueprint.flow_journal import FlowJournal, Operation, apply_operation
+from blueprint.models import BLUEPRINT_FOLDER_NAME, Flow, FlowElement
+
+FLOW_STORE_VERSION = 1
+
+
+class FlowStore:
+    '''
+        The project's flows, stored in its .blueprint/flows folder
+
+        An index of the flows' uids and names is loaded along with the
+        project, the flows' nodes only when needed (see load_nodes): each
+        flow is saved in its own compact flow file (see flow_file), named
+        after its uid, which blueprint-run can run as is. The index is
+        authoritative for the flows' names.
+
+        The flows' edits (add_node, move_node, delete_node, rename) are
+        applied to the flows and appended to a journal (see FlowJournal),
+        rather than saving the flows: every COMPACT_OPERATIONS operations,
+        the edited flows and the index are saved in the background and the
+        journal emptied (see compact). Opening the store replays the operations of a
+        journal left behind, e.g. by a crash.
+    '''
+    INDEX_NAME = 'index.json'
+    COMPACT_OPERATIONS = 200
+
+    path: Path
+    # uid -> name, in the index's order
+    names: Dict[str, str]
+    journal: FlowJournal
+    logger: Logger
+
+    # uids of the flows whose nodes are loaded (or new)
+    _loaded: Set[str]
+    # the loaded flows edited since the last compaction, by uid
+    _dirty: Dict[str, Flow]
+    _writer: ThreadPoolExecutor
+    _compaction: Optional[Future]
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.names = {}
+        self.journal = FlowJournal(path)
+        self.logger = getLogger('FlowStore')
+        self._loaded = set()
+        self._dirty = {}
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='FlowStore')
+        self._compaction = None
+
+        self.load_index()
+        self.recover()
+
+    @staticmethod
+    def get_flows_path(project_path: Path) -> Path:
+        return project_path.joinpath(BLUEPRINT_FOLDER_NAME, 'flows')
+
+    def index_path(self) -> Path:
+        return self.path.joinpath(self.INDEX_NAME)
+
+    def flow_path(self, uid: str) -> Path:
+        return self.path.joinpath(f'{uid}.json')
+
+    def load_index(self) -> None:
+        filePath = self.index_path()
+        try:
+            with filePath.open('r') as fh:
+                dictionary = json.load(fh)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as ex:
+            self.logger.error(f'Unable to read the flows index: {ex}')
+            return
+
+        if dictionary.get('version') != FLOW_STORE_VERSION:
+            self.logger.error(f'Unsupported flows index version {dictionary.get("version")}')
+            return
+
+        self.names = {uid: name for uid, name in dictionary['flows']}
+
+    def save_index(self, names: Optional[List[Tuple[str, str]]] = None) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        filePath = self.index_path()
+        tmpPath = filePath.with_name(f'{filePath.name}.{os.getpid()}.tmp')
+        with tmpPath.open('w') as fh:
+            fh.write(json.dumps({
+                'version': FLOW_STORE_VERSION,
+                'flows': [[uid, name] for uid, name in (names or self.names.items())],
+            }, separators=(',', ':')))
+        os.replace(tmpPath, filePath)
+
+    def recover(self) -> None:
+        '''
+            Replay the journal left by a previous session, saving the flows
+            it edits
+        '''
+        flows: Dict[str, Flow] = {}
+        unreadable: Set[str] = set()
+        for operation in self.journal.replay():
+            uid = operation.get('flow')
+            if uid not in self.names or uid in unreadable:
+                self.logger.warning(f'Skipping an operation of the flow {uid}')
+                continue
+
+            flow = flows.get(uid)
+            if flow is None:
+                flow = Flow(name=self.names[uid], nodes=[], uid=uid)
+                try:
+                    flow.nodes = load_flow(self.flow_path(uid)).nodes
+                except FlowFileError as ex:
+                    if self.flow_path(uid).exists():
+                        self.logger.error(f'Unable to recover the edits of the flow {flow.name}: {ex}')
+                        unreadable.add(uid)
+                        continue
+                flows[uid] = flow
+
+            try:
+                apply_operation(flow, operation)
+            except (KeyError, TypeError, ValueError) as ex:
+                self.logger.warning(f'Skipping the invalid operation {operation}: {ex!r}')
+                continue
+            self.names[uid] = flow.name
+
+        if not flows:
+            return
+
+        self.logger.info(f'Recovered the unsaved edits of {len(flows)} flow(s)')
+        try:
+            for flow in flows.values():
+                save_flow(flow, self.flow_path(flow.uid), compact=True)
+            self.save_index()
+            self.journal.clear()
+        except OSError as ex:
+            # replayed again next time
+            self.logger.error(f'Unable to save the recovered flows: {ex}')
+
+    def flows(self) -> List[Flow]:
+        '''
+            The stored flows, their nodes not loaded yet
+        '''
+        return [Flow(name=name, nodes=[], uid=uid) for uid, name in self.names.items()]
+
+    def is_loaded(self, flow: Flow) -> bool:
+        return flow.uid in self._loaded or flow.uid not in self.names
+
+    def load_nodes(self, flow: Flow) -> None:
+        '''
+            Load the nodes of a flow returned by flows (once)
+        '''
+        if self.is_loaded(flow):
+            return
+
+        try:
+            flow.nodes = load_flow(self.flow_path(flow.uid)).nodes
+            flow.touch()
+        except FlowFileError:
+            if self.flow_path(flow.uid).exists():
+                raise
+            # indexed before its first save
+        self._loaded.add(flow.uid)
+
+    def save(self, flow: Flow) -> None:
+        '''
+            Save a flow, adding it to the index if new (the flows whose
+            nodes are not loaded are only renamed)
+        '''
+        # the journal's operations would be replayed over this save
+        self.flush()
+
+        if self.is_loaded(flow):
+            save_flow(flow, self.flow_path(flow.uid), compact=True)
+            self._loaded.add(flow.uid)
+            self._dirty.pop(flow.uid, None)
+
+        if self.names.get(flow.uid) != flow.name:
+            self.names[flow.uid] = flow.name
+            self.save_index()
+
+    def record(self, flow: Flow, operation: dict) -> None:
+        '''
+            Record an operation (see flow_journal.Operation) applied to a
+            stored flow
+        '''
+        if flow.uid not in self.names:
+            raise ValueError(f'The flow {flow.name} is not saved yet')
+
+        flow.touch()
+        self.journal.append({**operation, 'flow': flow.uid})
+        self.names[flow.uid] = flow.name
+        if self.is_loaded(flow):
+            self._dirty[flow.uid] = flow
+
+        if self.journal.pending >= self.COMPACT_OPERATIONS:
+            self.compact()
+
+    def add_node(self, flow: Flow, node: FlowElement) -> None:
+        self.check_loaded(flow)
+        flow.nodes.append(node)
+        self.record(flow, {'op': Operation.ADD_NODE, 'node': node.toDict()})
+
+    def move_node(self, flow: Flow, node: FlowElement, x: int, y: int) -> None:
+        self.check_loaded(flow)
+        node.coords = FlowElement.ChartCoords(x, y)
+        self.record(flow, {'op': Operation.MOVE_NODE, 'node': node.uid, 'coords': [x, y]})
+
+    def delete_node(self, flow: Flow, node: FlowElement) -> None:
+        self.check_loaded(flow)
+        operation = {'op': Operation.DELETE_NODE, 'node': node.uid}
+        apply_operation(flow, operation)
+        self.record(flow, operation)
+
+    def rename(self, flow: Flow, name: str) -> None:
+        flow.name = name
+        self.record(flow, {'op': Operation.RENAME_FLOW, 'name': name})
+
+    def check_loaded(self, flow: Flow) -> None:
+        if not self.is_loaded(flow):
+            raise ValueError(f'The nodes of the flow {flow.name} are not loaded')
+
+    def compact(self) -> Optional[Future]:
+        '''
+            Save the edited flows and the index in the background, then
+            remove the journal's operations (the ones recorded meanwhile
+            go to a new journal)
+
+            Returns the compaction's future, None if there's nothing to
+            compact. A compaction still running is left alone (and
+            returned): the next operations will trigger another one.
+        '''
+        if self._compaction is not None:
+            if not self._compaction.done():
+                return self._compaction
+            # the flows the last compaction failed to save, saved again by this one
+            for uid, flow in self._compaction.result().items():
+                self._dirty.setdefault(uid, flow)
+            self._compaction = None
+
+        if not self.journal.pending and not self.journal.compacting_path().exists():
+            return None
+
+        self.journal.rotate()
+        # serialized on the calling thread, as the flows keep changing
+        dirty, self._dirty = self._dirty, {}
+        flows = {uid: flow.toDict() for uid, flow in dirty.items()}
+        names = list(self.names.items())
+
+        self._compaction = self._writer.submit(self._write_compaction, dirty, flows, names)
+
+        return self._compaction
+
+    def _write_compaction(
+            self, dirty: Dict[str, Flow], flows: Dict[str, dict],
+            names: List[Tuple[str, str]]) -> Dict[str, Flow]:
+        '''
+            Runs on the writer thread: returns the flows it failed to save,
+            for compact to merge them back (on the calling thread)
+        '''
+        try:
+            for uid, dictionary in flows.items():
+                save_flow_dict(dictionary, self.flow_path(uid), compact=True)
+            self.save_index(names)
+            self.journal.discard_compacted()
+        except OSError as ex:
+            # the compacting journal is kept, merged into the next one, and
+            # the flows saved again by the next compaction
+            self.logger.error(f'Unable to save the edited flows: {ex}')
+            return dirty
+
+        return {}
+
+    def flush(self) -> None:
+        '''
+            Compact the journal, waiting for the flows to be saved
+        '''
+        if self._compaction is not None:
+            self._compaction.result()
+        compaction = self.compact()
+        if compaction is not None:
+            compaction.result()
+
+    def close(self) -> None:
+        self.flush()
+        self.journal.close()
+        self._writer.shutdown(wait=True)
@@ -1,20 +1,130 @@
-from blueprint.models import Project
-from blueprint.module_scanner import functions_scanner
+import logging
+from pathlib import Path
+from threading import Event
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from blueprint.dependency_cache import DependencyCache
+from blueprint.flow_store import FlowStore
+from blueprint.models import Function, Project
+from blueprint.module_scanner import (ScanMode, functions_scanner,
+                                      module_name_from_path, scan_module_safe)
+from blueprint.scan_index import ScanIndex
 from blueprint.settings import Settings
 
 
-def load_project(settings: Settings) -> Project:
+def scan_project(
+        settings: Settings,
+        mode: Optional[ScanMode] = None,
+        on_module: Optional[Callable[[str, List[Function], int, int], None]] = None,
+        cancel: Optional[Event] = None) -> Tuple[List[Function], Optional[ScanIndex]]:
+    '''
+        Scan the project's (and its dependencies') functions, through the
+        caches enabled in its settings
+
+        Returns the functions along with the project's scan index, if any.
+        See functions_scanner for on_module and cancel.
+    '''
     project_root = settings.get_project_root()
 
-    if not project_root:
-        return
+    if mode is None:
+        mode = ScanMode(settings.scanner.mode)
+
+    index: Optional[ScanIndex] = None
+    dependency_cache: Optional[DependencyCache] = None
+    if settings.scanner.cache:
+        index = ScanIndex(ScanIndex.get_index_path(project_root), mode.value, settings.scanner.lazy)
+        dependency_cache = DependencyCache.get_instance()
+
+    functions = functions_scanner(
+        project_root, mode=mode, index=index, workers=settings.scanner.workers,
+        dependency_cache=dependency_cache, lazy=settings.scanner.lazy,
+        on_module=on_module, cancel=cancel)
+    # a cancelled scan leaves the index as it was
+    if index is not None and not (cancel is not None and cancel.is_set()):
+        index.save()
+
+    return functions, index
 
-    functions = functions_scanner(project_root)
-    # TODO load existing flows
+
+def create_project(
+        settings: Settings,
+        functions: Iterable[Function],
+        scan_index: Optional[ScanIndex] = None) -> Project:
+    # the flows' index only: their nodes are loaded when opened
+    flow_store = None
     flows = []
+    project_root = settings.get_project_root()
+    if project_root:
+        flow_store = FlowStore(FlowStore.get_flows_path(project_root))
+        flows = sorted(flow_store.flows(), key=lambda flow: flow.name)
 
     return Project(
         settings=settings,
         functions=functions,
-        flows=flows
+        flows=flows,
+        scan_index=scan_index,
+        flow_store=flow_store
     )
+
+
+def load_project(settings: Settings, mode: Optional[ScanMode] = None) -> Project:
+    project_root = settings.get_project_root()
+
+    if not project_root:
+        return
+
+    functions, index = scan_project(settings, mode)
+
+    return create_project(settings, functions, index)
+
+
+def rescan_sources(
+        project: Project,
+        changed: Iterable[Path],
+        deleted: Iterable[Path]) -> Dict[str, List[Function]]:
+    '''
+        Rescan the changed source files and forget the deleted ones,
+        updating the project's scan index
+
+        Returns the affected modules along with their new functions, for
+        the caller to apply them (see Project.update_functions): the
+        modules are imported again, which can be run in a thread.
+    '''
+    logger = logging.getLogger('rescan_sources')
+    project_root = project.settings.get_project_root()
+    mode = ScanMode(project.settings.scanner.mode)
+    lazy = project.settings.scanner.lazy
+    index = project.scan_index
+    if index is not None and (index.mode != mode.value or index.lazy != lazy):
+        # the scanner's settings changed since the project was scanned
+        index = None
+
+    functions_by_module: Dict[str, List[Function]] = {}
+
+    for source_path in deleted:
+        module = module_name_from_path(
+            project_root, Path(source_path), check_packages=False)
+        if module:
+            functions_by_module[module] = []
+            if index is not None:
+                index.discard(module)
+
+    for source_path in changed:
+        source_path = Path(source_path)
+        module = module_name_from_path(project_root, source_path)
+        if not module:
+            continue
+
+        functions, error = scan_module_safe(
+            module, source_path, mode, reload=True, lazy=lazy)
+        if functions is None:
+            logger.error(error)
+            functions = []
+        elif index is not None:
+            index.store(module, source_path, functions)
+        functions_by_module[module] = functions
+
+    if index is not None:
+        index.save()
+
+    return functions_by_module
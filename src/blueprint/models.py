@@ -1,21 +1,222 @@
 import logging
 import uuid
 from dataclasses import dataclass, field
-from inspect import Signature
-from typing import List
+from inspect import Parameter, Signature, formatannotation
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional
 
-from blueprint.settings import Settings
+from blueprint.serialization import Field, from_dict, to_dict
+
+if TYPE_CHECKING:
+    # the models are used by the (headless) runner too: no Qt import here
+    from blueprint.flow_store import FlowStore
+    from blueprint.scan_index import ScanIndex
+    from blueprint.search import FunctionSearchIndex
+    from blueprint.settings import Settings
+
+# the project's folder for blueprint's own files (settings, caches...)
+BLUEPRINT_FOLDER_NAME = '.blueprint'
+
+
+class SourceExpression:
+    '''
+        Value known only by its source code, e.g. a parameter's default
+        value found by the AST scanner, which never evaluates the modules
+    '''
+    __slots__ = ('source',)
+
+    source: str
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+
+    def __repr__(self) -> str:
+        return self.source
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, SourceExpression) and other.source == self.source
+
+    def __hash__(self) -> int:
+        return hash(self.source)
+
+
+_PARAMETER_KINDS = {int(kind): kind for kind in [
+    Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD,
+    Parameter.VAR_POSITIONAL, Parameter.KEYWORD_ONLY, Parameter.VAR_KEYWORD]}
+
+
+def _annotation_to_str(annotation: Any) -> str:
+    if isinstance(annotation, str):
+        return annotation
+
+    return formatannotation(annotation)
+
+
+def _default_to_dict(default: Any) -> Any:
+    if default is None or type(default) in [str, int, float, bool]:
+        return default
+
+    source = default.source if isinstance(
+        default, SourceExpression) else repr(default)
+
+    return {'source': source}
+
+
+def _default_from_dict(default: Any) -> Any:
+    if isinstance(default, dict):
+        return SourceExpression(default['source'])
+
+    return default
+
+
+def _signature_to_dict(signature: Signature) -> dict:
+    parameters = []
+    for param in signature.parameters.values():
+        parameter = {'name': param.name, 'kind': int(param.kind)}
+        if param.default is not Parameter.empty:
+            parameter['default'] = _default_to_dict(param.default)
+        if param.annotation is not Parameter.empty:
+            parameter['annotation'] = _annotation_to_str(param.annotation)
+        parameters.append(parameter)
+
+    dictionary = {'parameters': parameters}
+    if signature.return_annotation is not Signature.empty:
+        dictionary['return'] = _annotation_to_str(signature.return_annotation)
+
+    return dictionary
+
+
+def _signature_from_dict(dictionary: dict) -> Signature:
+    parameters = [
+        Parameter(
+            param['name'], _PARAMETER_KINDS[param['kind']],
+            default=_default_from_dict(param['default'])
+            if 'default' in param else Parameter.empty,
+            annotation=param.get('annotation', Parameter.empty))
+        for param in dictionary['parameters']
+    ]
+
+    return Signature(
+        parameters,
+        return_annotation=dictionary.get('return', Signature.empty),
+        __validate_parameters__=False)
+
+
+class _Unresolved:
+    def __reduce__(self) -> str:
+        # unpickles to the same singleton
+        return '_UNRESOLVED'
+
+    def __repr__(self) -> str:
+        return '(unresolved)'
+
+
+_UNRESOLVED = _Unresolved()
 
 
-@dataclass
 class Function:
+    '''
+        A function found by the scanner
+
+        The signature can be given upfront, or left to be resolved on
+        first access (and then cached): out of its serialized form if the
+        function comes from a cache, otherwise out of its source location
+        (see blueprint.module_scanner.resolve_signature).
+    '''
+    @dataclass
+    class Location:
+        __slots__ = ('path', 'line')
+
+        path: Optional[str]
+        line: int
+
+    __slots__ = ('module', 'name', 'location', '_signature')
+
     module: str
     name: str
-    signature: Signature
+    location: Optional['Function.Location']
+
+    # the signature, its serialized form or _UNRESOLVED
+    _signature: Any
+
+    def __init__(
+            self, module: str, name: str, signature: Optional[Signature] = None,
+            location: Optional['Function.Location'] = None) -> None:
+        self.module = module
+        self.name = name
+        self.location = location
+
+        self._signature = _UNRESOLVED if signature is None else signature
+
+    @property
+    def signature(self) -> Optional[Signature]:
+        if self._signature is _UNRESOLVED:
+            from blueprint.module_scanner import resolve_signature
+            self._signature = resolve_signature(self)
+        elif isinstance(self._signature, dict):
+            self._signature = _signature_from_dict(self._signature)
+
+        return self._signature
+
+    @signature.setter
+    def signature(self, signature: Optional[Signature]) -> None:
+        self._signature = _UNRESOLVED if signature is None else signature
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Function) \
+            and other.module == self.module and other.name == self.name
+
+    def __hash__(self) -> int:
+        return hash((self.module, self.name))
+
+    def __repr__(self) -> str:
+        # don't resolve the signature just to print it
+        signature = '(unresolved)' if isinstance(
+            self._signature, dict) else self._signature
+
+        return f'Function(module={self.module!r}, name={self.name!r}, signature={signature})'
+
+    def toDict(self) -> dict:
+        '''
+            Plain (JSON and pickle friendly) representation of the function
+
+            Annotations are converted to their string representation, and
+            non-scalar defaults to SourceExpression objects on the way back.
+            Unresolved signatures are left out.
+        '''
+        dictionary = {'module': self.module, 'name': self.name}
+
+        if isinstance(self._signature, Signature):
+            dictionary['signature'] = _signature_to_dict(self._signature)
+        elif isinstance(self._signature, dict):
+            dictionary['signature'] = self._signature
+        if self.location is not None:
+            dictionary['location'] = [self.location.path, self.location.line]
+
+        return dictionary
+
+    @staticmethod
+    def fromDict(dictionary: dict) -> 'Function':
+        location = dictionary.get('location')
+
+        function = Function(
+            module=dictionary['module'],
+            name=dictionary['name'],
+            location=Function.Location(*location) if location else None)
+        # built on first access only
+        if 'signature' in dictionary:
+            function._signature = dictionary['signature']
+
+        return function
 
 
 @dataclass
 class FlowElement:
+    '''
+        A node of a flow: a call to a function
+
+        Each of the function's parameters gets either the return value of
+        another node of the flow (inputs), or a constant value (constants).
+    '''
     @dataclass
     class ChartCoords:
         x: int
@@ -25,6 +226,31 @@ class FlowElement:
 
     function: Function
 
+    uid: str = field(default_factory=lambda: str(uuid.uuid4()))
+    # parameter name -> uid of the node whose return value it gets
+    inputs: Dict[str, str] = field(default_factory=dict)
+    # parameter name -> value (JSON friendly)
+    constants: Dict[str, Any] = field(default_factory=dict)
+
+    FIELDS = (
+        Field('uid', str, optional=True),
+        Field('function', Function,
+              encode=lambda function: {'module': function.module, 'name': function.name},
+              decode=Function.fromDict),
+        Field('coords', ChartCoords,
+              encode=lambda coords: [coords.x, coords.y],
+              decode=lambda coords: FlowElement.ChartCoords(*coords)),
+        Field('inputs', Dict[str, str], optional=True),
+        Field('constants', Dict[str, Any], optional=True),
+    )
+
+    def toDict(self) -> dict:
+        return to_dict(self)
+
+    @staticmethod
+    def fromDict(dictionary: dict) -> 'FlowElement':
+        return from_dict(FlowElement, dictionary)
+
 
 @dataclass
 class Flow:
@@ -32,18 +258,321 @@ class Flow:
     nodes: List[FlowElement]
 
     uid: str = field(default_factory=lambda: str(uuid.uuid4()))
+    # bumped by touch, when the flow is edited in place (not serialized)
+    revision: int = field(default=0, compare=False, repr=False)
+
+    FIELDS = (
+        Field('uid', str, optional=True),
+        Field('name', str),
+        Field('nodes', List[FlowElement]),
+    )
+
+    def toDict(self) -> dict:
+        return to_dict(self)
+
+    @staticmethod
+    def fromDict(dictionary: dict) -> 'Flow':
+        return from_dict(Flow, dictionary)
+
+    def touch(self) -> None:
+        '''
+            Record an edit of the flow, for the ones caching what they
+            derive from it (e.g. runner.plan.PlanCache)
+        '''
+        self.revision += 1
+
+
+class FunctionCatalog:
+    '''
+        Compact, indexed collection of the scanned functions
+
+        Module paths are interned in a tree of packages, so that each
+        package prefix (and each module's dotted path) is stored once,
+        and so are the functions' names and source paths. Each function
+        gets a stable integer id, and is indexed by its fully qualified
+        name through its module's node, which maps the (interned) names
+        of its functions to their ids.
+    '''
+    class Package:
+        '''
+            A node of the modules tree: a package or module, with its
+            sub-packages and the functions it defines
+        '''
+        __slots__ = ('name', 'path', 'parent', 'children', 'functions')
+
+        name: str
+        path: str
+        parent: Optional['FunctionCatalog.Package']
+        children: Dict[str, 'FunctionCatalog.Package']
+        # function name -> id
+        functions: Dict[str, int]
+
+        def __init__(self, name: str, path: str, parent: Optional['FunctionCatalog.Package']) -> None:
+            self.name = name
+            self.path = path
+            self.parent = parent
+            self.children = {}
+            self.functions = {}
+
+    __slots__ = ('root', '_functions', '_packages', '_strings', '_count')
+
+    root: Package
+
+    # id -> function, None for the removed ones
+    _functions: List[Optional[Function]]
+    # module path -> package node
+    _packages: Dict[str, Package]
+    # intern table of the functions' names and paths
+    _strings: Dict[str, str]
+    _count: int
+
+    def __init__(self, functions: Iterable[Function] = ()) -> None:
+        self.root = FunctionCatalog.Package('', '', None)
+        self._functions = []
+        self._packages = {'': self.root}
+        self._strings = {}
+        self._count = 0
+
+        self.extend(functions)
+
+    @staticmethod
+    def qualified_name(module: str, name: str) -> str:
+        return f'{module}.{name}'
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Function]:
+        return (fn for fn in self._functions if fn is not None)
+
+    def __contains__(self, qualified_name: str) -> bool:
+        return self.id_of(qualified_name) is not None
+
+    def __getitem__(self, id: int) -> Function:
+        fn = self._functions[id]
+        if fn is None:
+            raise KeyError(id)
+
+        return fn
+
+    def __repr__(self) -> str:
+        return f'FunctionCatalog({self._count} functions, {len(self._packages) - 1} packages)'
+
+    def ids(self) -> Iterator[int]:
+        return (id for id, fn in enumerate(self._functions) if fn is not None)
+
+    def id_of(self, qualified_name: str) -> Optional[int]:
+        module, _, name = qualified_name.rpartition('.')
+        package = self._packages.get(module)
+
+        return None if package is None else package.functions.get(name)
+
+    def get(self, qualified_name: str) -> Optional[Function]:
+        id = self.id_of(qualified_name)
+
+        return None if id is None else self._functions[id]
+
+    def package(self, path: str) -> Optional[Package]:
+        return self._packages.get(path)
+
+    def module_functions(self, module: str) -> List[Function]:
+        package = self._packages.get(module)
+        if package is None:
+            return []
+
+        return [self._functions[id] for id in package.functions.values()]
+
+    def _intern(self, string: str) -> str:
+        return self._strings.setdefault(string, string)
+
+    def _package(self, path: str) -> Package:
+        package = self._packages.get(path)
+        if package is not None:
+            return package
+
+        parent_path, _, name = path.rpartition('.')
+        parent = self._package(parent_path)
+        package = FunctionCatalog.Package(self._intern(name), path, parent)
+        parent.children[package.name] = package
+        self._packages[path] = package
+
+        return package
+
+    def add(self, fn: Function) -> int:
+        '''
+            Add a function, replacing (and taking the id of) any function
+            with the same fully qualified name
+        '''
+        package = self._package(fn.module)
+        fn.module = package.path
+        fn.name = self._intern(fn.name)
+        if fn.location is not None and fn.location.path:
+            fn.location.path = self._intern(fn.location.path)
+
+        id = package.functions.get(fn.name)
+        if id is not None:
+            self._functions[id] = fn
+
+            return id
+
+        id = len(self._functions)
+        self._functions.append(fn)
+        package.functions[fn.name] = id
+        self._count += 1
+
+        return id
+
+    def extend(self, functions: Iterable[Function]) -> List[int]:
+        return [self.add(fn) for fn in functions]
+
+    def remove_module(self, module: str) -> List[int]:
+        '''
+            Remove a module's functions, returning their ids
+        '''
+        package = self._packages.get(module)
+        if package is None:
+            return []
+
+        removed = list(package.functions.values())
+        package.functions = {}
+        for id in removed:
+            self._functions[id] = None
+        self._count -= len(removed)
+
+        # drop the now empty branch
+        while package.parent is not None and not package.children and not package.functions:
+            self._packages.pop(package.path)
+            package.parent.children.pop(package.name)
+            package = package.parent
+
+        return removed
+
+    def replace_module(self, module: str, functions: Iterable[Function]) -> List[int]:
+        '''
+            Replace a module's functions, returning the new ids
+        '''
+        self.remove_module(module)
+
+        return self.extend(functions)
 
 
 class Project:
-    settings: Settings
-    functions: List[Function]
+    settings: 'Settings'
+    functions: FunctionCatalog
     flows: List[Flow]
+    scan_index: Optional['ScanIndex']
+    flow_store: Optional['FlowStore']
+
+    _search_index: Optional['FunctionSearchIndex']
 
     logger = logging.getLogger('Project')
 
-    def __init__(self, settings: Settings, functions: List[Function], flows: List[Flow]):
+    def __init__(
+            self, settings: 'Settings', functions: Iterable[Function], flows: List[Flow],
+            scan_index: Optional['ScanIndex'] = None, flow_store: Optional['FlowStore'] = None):
         self.settings = settings
-        self.functions = functions
+        self.functions = functions if isinstance(
+            functions, FunctionCatalog) else FunctionCatalog(functions)
         self.flows = flows
+        self.scan_index = scan_index
+        self.flow_store = flow_store
+        self._search_index = None
 
         self.logger.debug(self.functions)
+
+    @property
+    def search_index(self) -> 'FunctionSearchIndex':
+        '''
+            The functions' search index, built on first use (unless set,
+            see set_search_index)
+        '''
+        if self._search_index is None:
+            from blueprint.search import FunctionSearchIndex
+            self._search_index = FunctionSearchIndex(self.functions)
+
+        return self._search_index
+
+    def set_search_index(self, search_index: 'FunctionSearchIndex') -> bool:
+        '''
+            Use a search index built elsewhere (e.g. in a ProjectLoader's
+            thread), over a catalog holding the same functions under the
+            same ids, i.e. updated the same way as the project's one
+
+            Returns whether the index is used: not if the project's
+            functions differ, nor if the project has an index already.
+        '''
+        if self._search_index is not None:
+            return False
+
+        catalog = search_index.catalog
+        if len(catalog) != len(self.functions) \
+                or any(fn is not other for fn, other in zip(catalog, self.functions)):
+            return False
+
+        search_index.catalog = self.functions
+        self._search_index = search_index
+
+        return True
+
+    def open_flow(self, flow: Flow) -> Flow:
+        '''
+            Load the flow's nodes, if they're not yet (see FlowStore)
+        '''
+        if self.flow_store is not None:
+            self.flow_store.load_nodes(flow)
+
+        return flow
+
+    def save_flow(self, flow: Flow) -> None:
+        if self.flow_store is not None:
+            self.flow_store.save(flow)
+
+    # the flows' edits, journaled by the flow store (see FlowStore.record)
+
+    def add_node(self, flow: Flow, node: FlowElement) -> None:
+        if self.flow_store is not None:
+            self.flow_store.add_node(flow, node)
+        else:
+            flow.nodes.append(node)
+            flow.touch()
+
+    def move_node(self, flow: Flow, node: FlowElement, x: int, y: int) -> None:
+        if self.flow_store is not None:
+            self.flow_store.move_node(flow, node, x, y)
+        else:
+            node.coords = FlowElement.ChartCoords(x, y)
+            flow.touch()
+
+    def delete_node(self, flow: Flow, node: FlowElement) -> None:
+        if self.flow_store is not None:
+            self.flow_store.delete_node(flow, node)
+        else:
+            flow.nodes.remove(node)
+            flow.touch()
+
+    def rename_flow(self, flow: Flow, name: str) -> None:
+        if self.flow_store is not None:
+            self.flow_store.rename(flow, name)
+        else:
+            flow.name = name
+            flow.touch()
+
+    def close(self) -> None:
+        '''
+            Save the flows' pending edits
+        '''
+        if self.flow_store is not None:
+            self.flow_store.close()
+
+    def update_functions(self, functions_by_module: Dict[str, List[Function]]) -> None:
+        '''
+            Replace the functions of the given modules (an empty list
+            removes the module's functions)
+        '''
+        for module, functions in functions_by_module.items():
+            removed = self.functions.remove_module(module)
+            added = self.functions.extend(functions)
+
+            if self._search_index is not None:
+                self._search_index.discard(removed)
+                self._search_index.add(added)
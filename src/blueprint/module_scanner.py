@@ -1,16 +1,38 @@
+import ast
+import importlib
 import logging
+import multiprocessing
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from configparser import ConfigParser
+from enum import Enum
 from importlib import import_module
-from inspect import getmembers, isfunction, signature
+from importlib.util import find_spec
+from inspect import Parameter, Signature, getmembers, isfunction, signature
 from os import sep
 from pathlib import Path
 from pkgutil import iter_modules
-from typing import List, Optional, Pattern, Union
+from re import compile
+from threading import Event
+from typing import Any, Callable, Dict, Iterator, List, Optional, Pattern, Tuple, Union
 
 from setuptools import find_packages
 
-from blueprint.models import Function
+from blueprint.dependency_cache import DependencyCache
+from blueprint.models import Function, SourceExpression
+from blueprint.scan_index import ScanIndex
+
+
+class ScanMode(Enum):
+    '''
+        How the functions are extracted from the modules
+
+        IMPORT imports each module and inspects its members, running any
+        import-time side effect. AST parses the module's source instead,
+        never executing it.
+    '''
+    IMPORT = 'import'
+    AST = 'ast'
 
 
 def get_package_modules(package_name: Path, pattern: Optional[Pattern]) -> List[str]:
@@ -33,6 +55,58 @@ def get_package_modules(package_name: Path, pattern: Optional[Pattern]) -> List[
     return result
 
 
+def get_package_sources(
+        package_name: str,
+        pattern: Optional[Pattern],
+        package_path: Optional[Path] = None) -> List[Tuple[str, Path]]:
+    '''
+        Same as get_package_modules, but locates the package's source files
+        without importing it
+
+        Parameters
+        ----------
+        package_name : str
+            The dotted name of the package
+        pattern : Pattern (optional)
+            If set, filter out the modules matching the pattern
+        package_path : Path (optional)
+            The package's directory, looked up via the import system if unset
+    '''
+    if package_path is None:
+        try:
+            spec = find_spec(package_name)
+        except (ImportError, ValueError):
+            spec = None
+
+        if not spec:
+            return []
+        if not spec.submodule_search_locations:
+            if spec.origin and spec.origin.endswith('.py'):
+                return [(package_name, Path(spec.origin))]
+
+            return []
+
+        package_path = Path(list(spec.submodule_search_locations)[0])
+
+    result: List[Tuple[str, Path]] = []
+    init_path = package_path.joinpath('__init__.py')
+    if init_path.exists():
+        result.append((package_name, init_path))
+
+    for module_info in iter_modules([str(package_path)]):
+        module_import = f'{package_name}.{module_info.name}'
+
+        if module_info.ispkg:
+            result.extend(get_package_sources(
+                module_import, pattern, package_path.joinpath(module_info.name)))
+        elif not pattern or not pattern.search(module_info.name):
+            module_path = package_path.joinpath(f'{module_info.name}.py')
+            if module_path.exists():
+                result.append((module_import, module_path))
+
+    return result
+
+
 def get_top_level_packages(distribution_name: str) -> List[str]:
     top_level = []
     if sys.version_info[0] == 3 and sys.version_info[1] < 8:
@@ -62,9 +136,516 @@ def get_top_level_packages(distribution_name: str) -> List[str]:
     return top_level
 
 
+def get_distribution_version(distribution_name: str) -> Optional[str]:
+    try:
+        if sys.version_info[0] == 3 and sys.version_info[1] < 8:
+            from pkg_resources import get_distribution
+
+            return get_distribution(distribution_name).version
+
+        # Python 3.8+
+        from importlib import metadata
+
+        return metadata.version(distribution_name)
+    except Exception:
+        return None
+
+
+def get_dependencies(src_root: Path) -> List[str]:
+    '''
+        List the distributions the project depends on, as declared
+        in its Pipfile or, lacking it, in its requirements.txt
+    '''
+    distributions: List[str] = []
+
+    pipfilePath = src_root.joinpath('Pipfile')
+    requirementsPath = src_root.joinpath('requirements.txt')
+    if pipfilePath.exists():
+        parser = ConfigParser()
+        parser.read(pipfilePath)
+        if parser.has_section('packages'):
+            distributions.extend(parser['packages'].keys())
+
+    elif requirementsPath.exists():
+        moduleNameRe = compile(r'^([^~=<>!;\[ ]+)')
+        with requirementsPath.open('r') as fh:
+            for line in fh.readlines():
+                matches = moduleNameRe.match(line.strip())
+                if not matches or matches[1].startswith(('#', '-')):
+                    continue
+                distributions.append(matches[1])
+
+    return distributions
+
+
+def module_name_from_path(src_root: Path, source_path: Path, check_packages: bool = True) -> Optional[str]:
+    '''
+        Get the dotted name of a project's module out of its source file,
+        or None if the file is not part of a package
+
+        Set check_packages to False for files which don't exist anymore.
+    '''
+    try:
+        parts = list(source_path.relative_to(src_root).parts)
+    except ValueError:
+        return None
+
+    if len(parts) < 2 or not parts[-1].endswith('.py'):
+        return None
+
+    # as for find_packages, each directory must be a package
+    package_path = src_root
+    for part in parts[:-1] if check_packages else []:
+        package_path = package_path.joinpath(part)
+        if not package_path.joinpath('__init__.py').exists():
+            return None
+
+    if parts[-1] == '__init__.py':
+        parts.pop()
+    else:
+        parts[-1] = parts[-1][:-len('.py')]
+
+    return '.'.join(parts)
+
+
+def find_distribution_modules(
+        distribution_name: str,
+        pattern: Optional[Pattern],
+        mode: ScanMode = ScanMode.IMPORT) -> List[Tuple[str, Optional[Path]]]:
+    '''
+        List the modules of an installed distribution, along with their
+        source file (if known)
+
+        In AST mode the modules are located without being imported,
+        and the modules without a python source file are left out.
+    '''
+    modules: List[Tuple[str, Optional[Path]]] = []
+
+    try:
+        top_level_packages = get_top_level_packages(distribution_name)
+    except Exception as ex:
+        logging.getLogger(__name__).warning(
+            f'Unable to locate distribution {distribution_name}: {ex}')
+        return modules
+
+    for top_level in top_level_packages:
+        if mode is ScanMode.AST:
+            modules.extend(get_package_sources(top_level, pattern))
+        else:
+            modules.extend((module, None) for module in
+                           get_package_modules(top_level, pattern))
+
+    return modules
+
+
+def find_project_modules(
+        src_root: Path,
+        pattern: Optional[Pattern],
+        mode: ScanMode = ScanMode.IMPORT) -> List[Tuple[str, Optional[Path]]]:
+    '''
+        List the project's own modules, along with their source file (if any)
+
+        In AST mode the modules without a python source file are left out.
+    '''
+    modules: List[Tuple[str, Optional[Path]]] = []
+
+    for pkg in find_packages(str(src_root)):
+        pkg_path = Path(f'{src_root}{sep}{pkg.replace(".", sep)}')
+        if pattern is None or pattern.search(pkg) is None:
+            modules.append((pkg, pkg_path.joinpath('__init__.py')))
+        for info in iter_modules([str(pkg_path)]):
+            if not info.ispkg and (pattern is None
+                                   or pattern.search(info.name) is None):
+                module_path = pkg_path.joinpath(f'{info.name}.py')
+                if module_path.exists():
+                    modules.append((pkg + '.' + info.name, module_path))
+                elif mode is not ScanMode.AST:
+                    modules.append((pkg + '.' + info.name, None))
+
+    return modules
+
+
+def find_modules(
+        src_root: Path,
+        pattern: Optional[Pattern],
+        mode: ScanMode = ScanMode.IMPORT) -> List[Tuple[str, Optional[Path]]]:
+    '''
+        List the modules to scan, dependencies first, along with their
+        source file (if any)
+    '''
+    modules: List[Tuple[str, Optional[Path]]] = []
+
+    for distribution_name in get_dependencies(src_root):
+        modules.extend(find_distribution_modules(
+            distribution_name, pattern, mode))
+    modules.extend(find_project_modules(src_root, pattern, mode))
+
+    return modules
+
+
+# the literals' nodes up to Python 3.7, ast.Constant ones since
+_LITERALS: Tuple[type, ...] = (ast.Str, ast.Bytes, ast.Num, ast.NameConstant) \
+    if sys.version_info < (3, 8) else ()
+
+
+def _unparse(node: ast.AST) -> Optional[str]:
+    '''
+        Source code of the expressions annotations and defaults are mostly
+        made of, for the Python versions without ast.unparse and
+        ast.get_source_segment (3.7), None for the others
+    '''
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        value = _unparse(node.value)
+        return None if value is None else f'{value}.{node.attr}'
+    if isinstance(node, (ast.Constant,) + _LITERALS):
+        value = ast.literal_eval(node)
+        return '...' if value is Ellipsis else repr(value)
+    if sys.version_info < (3, 8) and isinstance(node, ast.Ellipsis):
+        return '...'
+
+    if isinstance(node, ast.Subscript):
+        index = node.slice
+        if sys.version_info < (3, 9) and isinstance(index, ast.Index):
+            index = index.value
+        value = _unparse(node.value)
+        # Dict[str, int], not Dict[(str, int)]
+        elements = [_unparse(element) for element in index.elts] \
+            if isinstance(index, ast.Tuple) else [_unparse(index)]
+        if value is None or None in elements:
+            return None
+        return f'{value}[{", ".join(elements)}]'
+    if isinstance(node, (ast.Tuple, ast.List)):
+        elements = [_unparse(element) for element in node.elts]
+        if None in elements:
+            return None
+        if isinstance(node, ast.List):
+            return f'[{", ".join(elements)}]'
+        return f'({elements[0]},)' if len(elements) == 1 else f'({", ".join(elements)})'
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+        # X | Y unions
+        left, right = _unparse(node.left), _unparse(node.right)
+        return None if left is None or right is None else f'{left} | {right}'
+    if isinstance(node, ast.Call):
+        function = _unparse(node.func)
+        arguments = [_unparse(arg) for arg in node.args]
+        for keyword in node.keywords:
+            value = _unparse(keyword.value)
+            # None for **kwargs
+            arguments.append(None if keyword.arg is None or value is None else f'{keyword.arg}={value}')
+        if function is None or None in arguments:
+            return None
+        return f'{function}({", ".join(arguments)})'
+
+    return None
+
+
+def _expression_source(node: ast.AST, source: str) -> str:
+    unparse = getattr(ast, 'unparse', None)  # Python 3.9+
+    if unparse:
+        return unparse(node)
+
+    get_source_segment = getattr(ast, 'get_source_segment', None)  # 3.8+
+    segment = get_source_segment(source, node) if get_source_segment else _unparse(node)
+
+    return segment or ast.dump(node)
+
+
+def _default_value(node: ast.AST, source: str) -> Any:
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return SourceExpression(_expression_source(node, source))
+
+
+def _annotation(node: Optional[ast.AST], source: str) -> Any:
+    if node is None:
+        return Parameter.empty
+    if isinstance(node, (ast.Constant,) + _LITERALS):
+        value = ast.literal_eval(node)
+        if isinstance(value, str):
+            # forward reference, e.g. 'FlowElement.ChartCoords'
+            return value
+
+    return _expression_source(node, source)
+
+
+def ast_signature(
+        definition: Union[ast.FunctionDef, ast.AsyncFunctionDef],
+        source: str) -> Signature:
+    '''
+        Build a function's signature out of its definition's syntax tree
+
+        Annotations are kept as their source code, defaults are evaluated
+        only if they are literals, otherwise they're kept as
+        SourceExpression objects.
+    '''
+    args = definition.args
+    parameters: List[Parameter] = []
+
+    positional = [(arg, Parameter.POSITIONAL_ONLY)
+                  for arg in getattr(args, 'posonlyargs', [])]
+    positional.extend((arg, Parameter.POSITIONAL_OR_KEYWORD)
+                      for arg in args.args)
+    defaults = [None] * (len(positional) - len(args.defaults)) + args.defaults
+
+    for (arg, kind), default in zip(positional, defaults):
+        parameters.append(Parameter(
+            arg.arg, kind,
+            default=Parameter.empty if default is None else _default_value(
+                default, source),
+            annotation=_annotation(arg.annotation, source)))
+
+    if args.vararg:
+        parameters.append(Parameter(
+            args.vararg.arg, Parameter.VAR_POSITIONAL,
+            annotation=_annotation(args.vararg.annotation, source)))
+
+    for arg, default in zip(args.kwonlyargs, args.kw_defaults):
+        parameters.append(Parameter(
+            arg.arg, Parameter.KEYWORD_ONLY,
+            default=Parameter.empty if default is None else _default_value(
+                default, source),
+            annotation=_annotation(arg.annotation, source)))
+
+    if args.kwarg:
+        parameters.append(Parameter(
+            args.kwarg.arg, Parameter.VAR_KEYWORD,
+            annotation=_annotation(args.kwarg.annotation, source)))
+
+    return Signature(
+        parameters,
+        return_annotation=_annotation(definition.returns, source)
+        if definition.returns else Signature.empty)
+
+
+def _module_level_definitions(body: List[ast.stmt]) -> Iterator[ast.stmt]:
+    for statement in body:
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            yield statement
+        elif not isinstance(statement, ast.ClassDef):
+            # if, try, with, for... blocks still define module-level names.
+            # Exception handlers come first, so that the try body's
+            # definitions win over the fallback ones.
+            for handler in getattr(statement, 'handlers', []):
+                yield from _module_level_definitions(handler.body)
+            for block in ('body', 'orelse', 'finalbody'):
+                yield from _module_level_definitions(
+                    getattr(statement, block, []))
+
+
+def scan_module_source(module: str, source_path: Path, lazy: bool = False) -> List[Function]:
+    '''
+        Extract a module's functions parsing its source code, without importing it
+
+        If lazy, the functions' signatures are left to be resolved on demand.
+        Raises SyntaxError if the source can't be parsed.
+    '''
+    source = source_path.read_bytes().decode('utf-8', errors='replace')
+    tree = ast.parse(source, filename=str(source_path))
+
+    # the last definition wins, as it would at runtime
+    definitions = {definition.name: definition for definition
+                   in _module_level_definitions(tree.body)}
+
+    if lazy:
+        return [
+            Function(module=module, name=name, location=Function.Location(
+                str(source_path), definitions[name].lineno))
+            for name in sorted(definitions)
+        ]
+
+    return [
+        Function(module=module, name=name,
+                 signature=ast_signature(definitions[name], source))
+        for name in sorted(definitions)
+    ]
+
+
+def _code_location(fn: Callable) -> Optional[Function.Location]:
+    code = getattr(fn, '__code__', None)
+    if code is None:
+        return None
+
+    return Function.Location(code.co_filename, code.co_firstlineno)
+
+
+def scan_module_import(module: str, reload: bool = False, lazy: bool = False) -> List[Function]:
+    '''
+        Extract a module's functions importing and inspecting it
+
+        If lazy, the functions' signatures are left to be resolved on demand.
+        Raises ImportError if the module can't be imported.
+    '''
+    if reload and module in sys.modules:
+        moduleObj = importlib.reload(sys.modules[module])
+    else:
+        moduleObj = import_module(module)
+    moduleFunctions = [
+        member for member in getmembers(moduleObj, isfunction)
+        if member[1].__module__ == moduleObj.__name__
+    ]
+
+    if lazy:
+        return [Function(module=module, name=fn[0], location=_code_location(fn[1]))
+                for fn in moduleFunctions]
+
+    return [Function(module=module, name=fn[0], signature=signature(fn[1]))
+            for fn in moduleFunctions]
+
+
+def resolve_signature(function: Function) -> Optional[Signature]:
+    '''
+        Resolve the signature of a function scanned lazily
+
+        Modules which are already imported are inspected, otherwise the
+        function's source is parsed, if its location is known, falling
+        back to importing the module.
+    '''
+    logger = logging.getLogger(__name__)
+    location = function.location
+
+    if function.module not in sys.modules and location and location.path:
+        try:
+            source = Path(location.path).read_bytes().decode(
+                'utf-8', errors='replace')
+            definitions = [
+                definition for definition in _module_level_definitions(
+                    ast.parse(source, filename=location.path).body)
+                if definition.name == function.name
+            ]
+            if definitions:
+                # decorators may shift the reported line, fall back to
+                # the last definition, as for scan_module_source
+                definition = next(
+                    (definition for definition in definitions
+                     if definition.lineno == location.line), definitions[-1])
+
+                return ast_signature(definition, source)
+        except (SyntaxError, ValueError, OSError) as ex:
+            logger.debug(
+                f'Unable to parse {location.path}, importing {function.module}: {ex}')
+
+    try:
+        return signature(getattr(import_module(function.module), function.name))
+    except ImportError as ex:
+        logger.error(f'Error loading package {function.module}: {ex.msg}')
+    except (AttributeError, TypeError, ValueError) as ex:
+        logger.error(
+            f'Unable to resolve the signature of {function.module}.{function.name}: {ex}')
+
+    return None
+
+
+def scan_module(
+        module: str,
+        source_path: Optional[Path],
+        mode: ScanMode = ScanMode.IMPORT,
+        reload: bool = False,
+        lazy: bool = False) -> List[Function]:
+    if mode is ScanMode.AST:
+        return scan_module_source(module, source_path, lazy)
+
+    return scan_module_import(module, reload, lazy)
+
+
+def scan_module_safe(
+        module: str,
+        source_path: Optional[Path],
+        mode: ScanMode,
+        reload: bool = False,
+        lazy: bool = False) -> Tuple[Optional[List[Function]], Optional[str]]:
+    '''
+        Scan a module, returning either its functions or the error message
+    '''
+    try:
+        return scan_module(module, source_path, mode, reload, lazy), None
+    except ImportError as ex:
+        return None, f'Error loading package {module}: {ex.msg}'
+    except (SyntaxError, ValueError, OSError) as ex:
+        return None, f'Error parsing module {module}: {ex}'
+
+
+def _init_scan_worker(src_root: str) -> None:
+    sys.path.append(src_root)
+
+
+ScanTask = Tuple[str, Optional[str], str, bool]
+
+
+def _scan_worker(task: ScanTask) -> Tuple[Optional[List[dict]], Optional[str]]:
+    '''
+        Process pool entry point: scan a module and return its functions
+        as picklable descriptors (see Function.toDict)
+    '''
+    module, source_path, mode, lazy = task
+    functions, error = scan_module_safe(
+        module, Path(source_path) if source_path else None, ScanMode(mode), lazy=lazy)
+
+    if functions is None:
+        return None, error
+
+    return [function.toDict() for function in functions], None
+
+
+def _scan_chunk(tasks: List[ScanTask]) -> List[Tuple[Optional[List[dict]], Optional[str]]]:
+    return [_scan_worker(task) for task in tasks]
+
+
+def _scan_in_pool(
+        src_root: Path,
+        modules: List[Tuple[str, Optional[Path]]],
+        mode: ScanMode,
+        workers: int,
+        lazy: bool = False) -> Iterator[Tuple[str, Optional[Path], Optional[List[Function]], Optional[str]]]:
+    '''
+        Scan the modules across a pool of worker processes, yielding the
+        results in the same order as the modules
+    '''
+    # spawn: forking a process running the Qt event loop is not safe
+    context = multiprocessing.get_context('spawn')
+    # small chunks, so that a heavy module only holds back its own worker
+    chunksize = max(1, min(32, len(modules) // (workers * 8)))
+
+    with ProcessPoolExecutor(
+            max_workers=workers, mp_context=context,
+            initializer=_init_scan_worker, initargs=(str(src_root),)) as executor:
+        chunks = [modules[i:i + chunksize]
+                  for i in range(0, len(modules), chunksize)]
+        futures = [executor.submit(_scan_chunk, [
+            (module, str(source_path) if source_path else None, mode.value, lazy)
+            for module, source_path in chunk]) for chunk in chunks]
+
+        try:
+            for chunk, future in zip(chunks, futures):
+                try:
+                    results = future.result()
+                except Exception as ex:
+                    for module, source_path in chunk:
+                        yield module, source_path, None, f'Error scanning module {module}: {ex!r}'
+                    continue
+
+                for (module, source_path), (descriptors, error) in zip(chunk, results):
+                    functions = None if descriptors is None else [
+                        Function.fromDict(descriptor) for descriptor in descriptors]
+                    yield module, source_path, functions, error
+        finally:
+            # closed early (i.e. cancelled): don't wait for the queued chunks
+            for future in futures:
+                future.cancel()
+
+
 def functions_scanner(
         src_root: Union[Path, str],
-        filter: str = None) -> List[Function]:
+        filter: str = None,
+        mode: ScanMode = ScanMode.IMPORT,
+        index: Optional[ScanIndex] = None,
+        workers: int = 0,
+        dependency_cache: Optional[DependencyCache] = None,
+        lazy: bool = False,
+        on_module: Optional[Callable[[str, List[Function], int, int], None]] = None,
+        cancel: Optional[Event] = None) -> List[Function]:
     '''
         Scan the path for all the package's modules functions
 
@@ -74,65 +655,143 @@ def functions_scanner(
             The base path of the package which has to be scanned
         filter : str (optional)
             If set, filter out the modules matching the regex pattern
+        mode : ScanMode (optional)
+            IMPORT (default) to import and inspect the modules,
+            AST to parse their source code without executing them
+        index : ScanIndex (optional)
+            If set, the unchanged project modules' functions are taken from
+            the index instead of being scanned again, and the index is updated
+            with the scanned ones once the scan completes (the caller is in
+            charge of saving it)
+        workers : int (optional)
+            If greater than 1, scan the modules across a pool of as many
+            worker processes, otherwise scan them in this process
+        dependency_cache : DependencyCache (optional)
+            If set, the dependencies' modules and functions are taken from
+            the cache, as long as the installed version didn't change
+        lazy : bool (optional)
+            If set, the functions' signatures are not extracted while
+            scanning, but resolved on first access
+        on_module : Callable (optional)
+            Called with each module's name and functions as soon as they're
+            available (from the caches first), and with the number of
+            modules done so far and in total
+        cancel : Event (optional)
+            If set while scanning, stop and return the functions found so
+            far (the caches are not updated with the incomplete results)
     '''
 
+    src_root = Path(src_root)
     pattern: Optional[Pattern] = None
     if filter is not None:
         pattern = compile(filter)
-    modules: List[str] = []
 
-    pipfilePath = src_root.joinpath('Pipfile')
-    requirementsPath = src_root.joinpath('requirements.txt')
-    if pipfilePath.exists():
-        parser = ConfigParser()
-        parser.read(pipfilePath)
-        if parser.has_section('packages'):
-            for distribution_name in parser['packages'].keys():
-                top_level_packages = get_top_level_packages(distribution_name)
+    result: List[Function] = []
+    try:
+        if mode is ScanMode.IMPORT:
+            sys.path.append(str(src_root))
 
-                for top_level in top_level_packages:
-                    modules.extend(get_package_modules(top_level, pattern))
+        modules: List[Tuple[str, Optional[Path]]] = []
+        functions_by_module: Dict[str, List[Function]] = {}
+        pending: List[Tuple[str, Optional[Path]]] = []
 
-    elif requirementsPath.exists():
-        moduleNameRe = compile(r'^([^~=<>]+)')
-        with requirementsPath.open('r') as fh, fh.readlines() as lines:
-            lines: List[str] = lines
-            for line in lines:
-                matches = moduleNameRe.match(line.strip())
-                if not matches:
+        # distributions to store in the dependency cache once scanned
+        uncached_distributions: List[Tuple[str, str, List[str]]] = []
+        for distribution_name in get_dependencies(src_root):
+            if cancel is not None and cancel.is_set():
+                return result
+
+            version = get_distribution_version(
+                distribution_name) if dependency_cache is not None else None
+            cached = None
+            if version is not None:
+                cached = dependency_cache.lookup(
+                    distribution_name, version, mode, filter)
+                if cached is not None and None not in cached.values():
+                    modules.extend((module, None) for module in cached)
+                    functions_by_module.update(cached)
                     continue
-                distribution_name = matches[1]
-                modules.append(get_package_modules(distribution_name))
 
-    result: List[Function] = []
-    try:
-        for pkg in find_packages(str(src_root)):
-            if pattern is None or pattern.search(pkg) is None:
-                modules.append(pkg)
-            for info in iter_modules(
-                    [f'{src_root}{sep}{pkg.replace(".", sep)}']):
-                if not info.ispkg and (pattern is None
-                                       or pattern.search(info.name) is None):
-                    modules.append(pkg + '.' + info.name)
-
-        sys.path.append(str(src_root))
-        for module in modules:
-            try:
-                moduleObj = import_module(module)
-                moduleFunctions = [
-                    member for member in getmembers(moduleObj, isfunction)
-                    if member[1].__module__ == moduleObj.__name__
-                ]
-
-                for fn in moduleFunctions:
-                    result.append(
-                        Function(module=module, name=fn[0],
-                                 signature=signature(fn[1])))
-
-            except ImportError as ex:
-                logging.getLogger(__name__).error(
-                    f'Error loading package {module}: {ex.msg}'
-                )
+            distribution_modules = find_distribution_modules(
+                distribution_name, pattern, mode)
+            modules.extend(distribution_modules)
+            for module, source_path in distribution_modules:
+                # an incomplete entry: only its failed modules are scanned again
+                if cached is not None and cached.get(module) is not None:
+                    functions_by_module[module] = cached[module]
+                else:
+                    pending.append((module, source_path))
+            if version is not None:
+                uncached_distributions.append((
+                    distribution_name, version,
+                    [module for module, _ in distribution_modules]))
+
+        project_modules = find_project_modules(src_root, pattern, mode)
+        project_module_names = set(module for module, _ in project_modules)
+        modules.extend(project_modules)
+        for module, source_path in project_modules:
+            functions = index.lookup(
+                module, source_path) if index is not None else None
+            if functions is not None:
+                functions_by_module[module] = functions
+            else:
+                pending.append((module, source_path))
+
+        # the project modules to index, once the scan completes
+        scanned_project: List[Tuple[str, Path, List[Function]]] = []
+
+        done = 0
+        if on_module is not None:
+            for module, functions in functions_by_module.items():
+                done += 1
+                on_module(module, functions, done, len(modules))
+
+        if workers > 1 and len(pending) > 1:
+            scanned = _scan_in_pool(src_root, pending, mode, workers, lazy)
+        else:
+            scanned = ((module, source_path) + scan_module_safe(module, source_path, mode, lazy=lazy)
+                       for module, source_path in pending)
+
+        for module, source_path, functions, error in scanned:
+            if cancel is not None and cancel.is_set():
+                scanned.close()
+                break
+
+            done += 1
+            if functions is None:
+                logging.getLogger(__name__).error(error)
+                if on_module is not None:
+                    on_module(module, [], done, len(modules))
+                continue
+
+            functions_by_module[module] = functions
+            if index is not None and source_path is not None \
+                    and module in project_module_names:
+                scanned_project.append((module, source_path, functions))
+            if on_module is not None:
+                on_module(module, functions, done, len(modules))
+
+        if cancel is not None and cancel.is_set():
+            for module, _ in modules:
+                result.extend(functions_by_module.pop(module, []))
+
+            return result
+
+        for module, source_path, functions in scanned_project:
+            index.store(module, source_path, functions)
+
+        for distribution_name, version, distribution_modules in uncached_distributions:
+            # the failed modules (None) are scanned again next time
+            dependency_cache.store(distribution_name, version, mode, filter, {
+                module: functions_by_module.get(module)
+                for module in distribution_modules})
+
+        # merge in the modules' order, regardless of where they come from
+        for module, _ in modules:
+            result.extend(functions_by_module.pop(module, []))
+
+        if index is not None:
+            index.retain(project_module_names)
     except ModuleNotFoundError as ex:
         logging.getLogger(__name__).error(
             f'{ex.msg}\n'
@@ -0,0 +1,157 @@
+import time
+from logging import Logger, getLogger
+from threading import Event
+from typing import Dict, Iterable, List, Optional
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from blueprint.model_functions import rescan_sources, scan_project
+from blueprint.models import Function, FunctionCatalog, Project
+from blueprint.search import FunctionSearchIndex
+from blueprint.settings import Settings
+
+
+class ProjectLoaderSignals(QObject):
+    # modules done, modules in total, last module done
+    progress = Signal(int, int, str)
+    # module -> functions, for the modules loaded since the last emission
+    modulesLoaded = Signal(dict)
+    # the project's scan index (or None) and the functions' search index,
+    # after the last modulesLoaded
+    finished = Signal(object, object)
+    # error message
+    failed = Signal(str)
+
+
+class ProjectLoader(QRunnable):
+    '''
+        Scan a project's functions in a thread of a QThreadPool
+
+        The modules' functions are streamed through the signals as they're
+        loaded, in batches emitted at most every EMIT_INTERVAL seconds, so
+        that the GUI thread isn't flooded with one event per module.
+        The loading can be cancelled at any time: the functions loaded so
+        far are still streamed, and finished is emitted as usual.
+
+        The functions' search index is built along, in this thread: the
+        batches are added to a catalog of its own before being emitted, as
+        Project.update_functions adds them to the project's one (see
+        Project.set_search_index).
+    '''
+    EMIT_INTERVAL = 0.1
+
+    settings: Settings
+    signals: ProjectLoaderSignals
+    logger: Logger
+
+    _cancel: Event
+    _pending: Dict[str, List[Function]]
+    _last_emit: float
+    _search_index: FunctionSearchIndex
+
+    def __init__(self, settings: Settings) -> None:
+        super().__init__()
+        # the signals are kept (and emitted) after run returns
+        self.setAutoDelete(False)
+
+        self.settings = settings
+        self.signals = ProjectLoaderSignals()
+        self.logger = getLogger('ProjectLoader')
+
+        self._cancel = Event()
+        self._pending = {}
+        self._last_emit = 0.0
+        self._search_index = FunctionSearchIndex(FunctionCatalog())
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def start(self, pool: Optional[QThreadPool] = None) -> None:
+        (pool or QThreadPool.globalInstance()).start(self)
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def run(self) -> None:
+        try:
+            _, index = scan_project(
+                self.settings, on_module=self.on_module, cancel=self._cancel)
+        except Exception as ex:
+            self.logger.exception(ex)
+            self.signals.failed.emit(str(ex))
+
+            return
+
+        self.emit_pending()
+        self.signals.finished.emit(index, self._search_index)
+
+    def on_module(self, module: str, functions: List[Function], done: int, total: int) -> None:
+        self._pending[module] = functions
+
+        now = time.monotonic()
+        if now - self._last_emit >= self.EMIT_INTERVAL:
+            self._last_emit = now
+            self.signals.progress.emit(done, total, module)
+            self.emit_pending()
+
+    def emit_pending(self) -> None:
+        if self._pending:
+            pending = self._pending
+            self._pending = {}
+
+            catalog = self._search_index.catalog
+            for module, functions in pending.items():
+                self._search_index.discard(catalog.remove_module(module))
+                self._search_index.add(catalog.extend(functions))
+
+            self.signals.modulesLoaded.emit(pending)
+
+
+class SourcesRescannerSignals(QObject):
+    # module -> functions, of the rescanned and deleted modules
+    finished = Signal(dict)
+    # error message
+    failed = Signal(str)
+
+
+class SourcesRescanner(QRunnable):
+    '''
+        Rescan a project's changed source files in a thread of a
+        QThreadPool (see model_functions.rescan_sources)
+
+        The modules' new functions are emitted by finished, for the GUI
+        thread to apply them to the project. The rescans are meant to be
+        run one at a time (e.g. in a pool of a single thread), in the order
+        the sources changed.
+    '''
+    project: Project
+    changed: List[str]
+    deleted: List[str]
+    signals: SourcesRescannerSignals
+    logger: Logger
+
+    def __init__(self, project: Project, changed: Iterable[str], deleted: Iterable[str]) -> None:
+        super().__init__()
+        # the signals are kept (and emitted) after run returns
+        self.setAutoDelete(False)
+
+        self.project = project
+        self.changed = list(changed)
+        self.deleted = list(deleted)
+        self.signals = SourcesRescannerSignals()
+        self.logger = getLogger('SourcesRescanner')
+
+    def start(self, pool: Optional[QThreadPool] = None) -> None:
+        (pool or QThreadPool.globalInstance()).start(self)
+
+    def run(self) -> None:
+        try:
+            functions_by_module = rescan_sources(self.project, self.changed, self.deleted)
+        except Exception as ex:
+            self.logger.exception(ex)
+            self.signals.failed.emit(str(ex))
+
+            return
+
+        self.signals.finished.emit(functions_by_module)
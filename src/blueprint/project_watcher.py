@@ -0,0 +1,209 @@
+import os
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from PySide6.QtCore import QFileSystemWatcher, QObject, QTimer, Signal
+
+from blueprint.models import BLUEPRINT_FOLDER_NAME
+
+FileStat = Tuple[int, int]
+
+
+class ProjectWatcher(QObject):
+    '''
+        Watch a project's source tree for changed, added and deleted
+        python files
+
+        Directories and python files are watched via QFileSystemWatcher
+        (inotify on Linux): directories to catch added and deleted files,
+        files to catch in-place modifications. Whatever can't be watched
+        (e.g. because the inotify watches limit is hit) is polled instead,
+        as is the whole tree if polling is forced.
+    '''
+    # changed or added files, deleted files
+    sourcesChanged = Signal(list, list)
+
+    DEBOUNCE_INTERVAL = 200
+    POLL_INTERVAL = 2000
+
+    logger: Logger
+    root: Optional[Path]
+
+    _watcher: QFileSystemWatcher
+    _debounce_timer: QTimer
+    _poll_timer: QTimer
+    _force_poll: bool
+
+    # directory -> python file -> (mtime, size)
+    _snapshot: Dict[str, Dict[str, FileStat]]
+    _polled_dirs: Set[str]
+    _dirty_dirs: Set[str]
+
+    def __init__(self, parent: Optional[QObject] = None, force_poll: bool = False) -> None:
+        super().__init__(parent=parent)
+
+        self.logger = getLogger('ProjectWatcher')
+        self.root = None
+        self._force_poll = force_poll
+        self._snapshot = {}
+        self._polled_dirs = set()
+        self._dirty_dirs = set()
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self.on_directory_changed)
+        self._watcher.fileChanged.connect(self.on_file_changed)
+
+        self._debounce_timer = QTimer(self)
+        self._debounce_timer.setSingleShot(True)
+        self._debounce_timer.setInterval(self.DEBOUNCE_INTERVAL)
+        self._debounce_timer.timeout.connect(self.flush)
+
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(self.POLL_INTERVAL)
+        self._poll_timer.timeout.connect(self.on_poll)
+
+    @staticmethod
+    def is_ignored_dir(path: Path) -> bool:
+        return path.name.startswith('.') or path.name == '__pycache__' \
+            or path.name == BLUEPRINT_FOLDER_NAME \
+            or path.joinpath('pyvenv.cfg').exists()
+
+    def watch(self, root: Path) -> None:
+        self.stop()
+
+        self.root = root.absolute()
+        self._add_tree(str(self.root), notify=False)
+
+        if self._polled_dirs:
+            self.logger.info(
+                f'Polling {len(self._polled_dirs)} directories which can not be watched')
+        self._poll_timer.start()
+
+    def stop(self) -> None:
+        self._poll_timer.stop()
+        self._debounce_timer.stop()
+
+        watched = self._watcher.files() + self._watcher.directories()
+        if watched:
+            self._watcher.removePaths(watched)
+
+        self.root = None
+        self._snapshot = {}
+        self._polled_dirs = set()
+        self._dirty_dirs = set()
+
+    def on_directory_changed(self, path: str) -> None:
+        self._dirty_dirs.add(path)
+        self._debounce_timer.start()
+
+    def on_file_changed(self, path: str) -> None:
+        self._dirty_dirs.add(os.path.dirname(path))
+        self._debounce_timer.start()
+
+    def on_poll(self) -> None:
+        if not self._polled_dirs:
+            return
+
+        self._dirty_dirs.update(self._polled_dirs)
+        self.flush()
+
+    def flush(self) -> None:
+        changed: List[str] = []
+        deleted: List[str] = []
+
+        dirty_dirs = self._dirty_dirs
+        self._dirty_dirs = set()
+
+        watched_files = set(self._watcher.files())
+        for directory in sorted(dirty_dirs):
+            if directory not in self._snapshot:
+                continue
+
+            if not os.path.isdir(directory):
+                deleted.extend(self._remove_tree(directory))
+                continue
+
+            old_files = self._snapshot[directory]
+            new_files, subdirs = self._scan_dir(directory)
+            self._snapshot[directory] = new_files
+
+            for file, stat in new_files.items():
+                if file not in old_files or old_files[file] != stat:
+                    changed.append(file)
+            deleted.extend(file for file in old_files if file not in new_files)
+
+            # replaced files (e.g. atomic saves) are not watched anymore
+            self._watch([file for file in new_files
+                         if file not in watched_files], directory)
+
+            for subdir in subdirs:
+                if subdir not in self._snapshot:
+                    changed.extend(self._add_tree(subdir, notify=True))
+            for known_dir in [known_dir for known_dir in self._snapshot
+                              if os.path.dirname(known_dir) == directory
+                              and known_dir not in subdirs]:
+                deleted.extend(self._remove_tree(known_dir))
+
+        if changed or deleted:
+            self.logger.debug(f'Changed: {changed}, deleted: {deleted}')
+            self.sourcesChanged.emit(changed, deleted)
+
+    def _scan_dir(self, directory: str) -> Tuple[Dict[str, FileStat], List[str]]:
+        files: Dict[str, FileStat] = {}
+        subdirs: List[str] = []
+
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return files, subdirs
+
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    if not ProjectWatcher.is_ignored_dir(Path(entry.path)):
+                        subdirs.append(entry.path)
+                elif entry.name.endswith('.py'):
+                    stat = entry.stat()
+                    files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                continue
+
+        return files, subdirs
+
+    def _watch(self, paths: List[str], directory: str) -> None:
+        if self._force_poll or directory in self._polled_dirs:
+            self._polled_dirs.add(directory)
+            return
+
+        if paths and self._watcher.addPaths(paths):
+            self._polled_dirs.add(directory)
+
+    def _add_tree(self, directory: str, notify: bool) -> List[str]:
+        '''
+            Start watching a directory and its subdirectories,
+            returning the python files found in them
+        '''
+        files, subdirs = self._scan_dir(directory)
+        self._snapshot[directory] = files
+        self._watch([directory] + list(files), directory)
+
+        found = list(files) if notify else []
+        for subdir in subdirs:
+            found.extend(self._add_tree(subdir, notify))
+
+        return found
+
+    def _remove_tree(self, directory: str) -> List[str]:
+        '''
+            Forget a removed directory and its subdirectories,
+            returning the python files they contained
+        '''
+        removed: List[str] = []
+        prefix = directory + os.sep
+        for known_dir in [known_dir for known_dir in self._snapshot
+                          if known_dir == directory or known_dir.startswith(prefix)]:
+            removed.extend(self._snapshot.pop(known_dir))
+            self._polled_dirs.discard(known_dir)
+
+        return removed
@@ -0,0 +1,101 @@
+import re
+from dataclasses import dataclass
+from inspect import signature
+from itertools import islice
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    TypeVar)
+
+from blueprint.runner.graph import FlowError
+
+T = TypeVar('T')
+
+BATCH_ATTRIBUTE = '__blueprint_batch__'
+
+# string annotations (postponed ones) of a batch parameter
+_BATCH_ANNOTATION_RE = re.compile(r'^(\w+\.)*Batch\b')
+
+
+class Batch(List[T]):
+    '''
+        Annotation of the parameter of a function transforming items in
+        batches, e.g. def normalize(rows: Batch[dict]) -> List[dict]
+
+        The function gets a list of the upstream node's items, and returns
+        one result per item (any sequence of the same length).
+    '''
+
+
+@dataclass
+class BatchSpec:
+    # the parameter getting the batches
+    parameter: str
+    # items per batch (None: the runner's default)
+    size: Optional[int] = None
+    # applied to each batch (a list) before the call, e.g. numpy.asarray
+    convert: Optional[Callable[[List[Any]], Any]] = None
+
+
+def batch(
+        parameter: Optional[str] = None, size: Optional[int] = None,
+        convert: Optional[Callable[[List[Any]], Any]] = None) -> Callable[[Callable], Callable]:
+    '''
+        Declare a function as transforming its parameter's items in batches
+        (the first parameter by default), see Batch
+    '''
+    def decorator(function: Callable) -> Callable:
+        name = parameter or next(iter(signature(function).parameters))
+        setattr(function, BATCH_ATTRIBUTE, BatchSpec(name, size, convert))
+
+        return function
+
+    return decorator
+
+
+def batch_spec(function: Callable) -> Optional[BatchSpec]:
+    '''
+        How a function transforms items in batches: declared with the batch
+        decorator, or detected by a parameter annotated as a Batch
+    '''
+    spec = getattr(function, BATCH_ATTRIBUTE, None)
+    if isinstance(spec, BatchSpec):
+        return spec
+
+    try:
+        parameters = signature(function).parameters.values()
+    except (TypeError, ValueError):
+        return None
+
+    for parameter in parameters:
+        annotation = parameter.annotation
+        if isinstance(annotation, str):
+            if _BATCH_ANNOTATION_RE.match(annotation):
+                return BatchSpec(parameter.name)
+        elif getattr(annotation, '__origin__', annotation) is Batch:
+            return BatchSpec(parameter.name)
+
+    return None
+
+
+def call_batched(
+        call: Callable[[Dict[str, Any]], Any], name: str, spec: BatchSpec,
+        kwargs: Dict[str, Any], batch_size: int) -> Iterator[Any]:
+    '''
+        Call a function (through call, taking its keyword arguments) once
+        per batch of its batch parameter's items, yielding the results one
+        by one
+    '''
+    kwargs = dict(kwargs)
+    items: Iterable[Any] = iter(kwargs.pop(spec.parameter))
+    size = max(1, spec.size or batch_size)
+
+    while True:
+        items_batch = list(islice(items, size))
+        if not items_batch:
+            return
+
+        kwargs[spec.parameter] = spec.convert(items_batch) if spec.convert else items_batch
+        results = call(kwargs)
+        if len(results) != len(items_batch):
+            raise FlowError(f'{name} returned {len(results)} results for a batch of {len(items_batch)} items')
+
+        yield from results
@@ -0,0 +1,139 @@
+import hashlib
+import inspect
+import os
+import pickle
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from blueprint.models import BLUEPRINT_FOLDER_NAME
+
+RESULT_CACHE_VERSION = 1
+
+
+def function_hash(module: str, name: str, function: Callable) -> Optional[str]:
+    '''
+        Hash of a function's identity: module, name and source code (None
+        when the source is not available, e.g. for builtins)
+    '''
+    try:
+        source = inspect.getsource(function)
+    except (OSError, TypeError):
+        return None
+
+    return hashlib.sha256(f'{module}\0{name}\0{source}'.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    '''
+        Content-addressed cache of the flows' nodes return values, stored
+        in the project's .blueprint/cache folder
+
+        A node's key hashes its function's identity (see function_hash),
+        its constants and the keys of the nodes it gets its inputs from, so
+        that a key is known before running anything: the nodes whose
+        function, constants and upstream nodes didn't change since the
+        value was cached are not run again. The values are pickled, one
+        file per key; past max_size bytes, the least recently used ones are
+        evicted (see evict).
+    '''
+    DEFAULT_MAX_SIZE = 1024 ** 3
+
+    path: Path
+    max_size: int
+    logger: Logger
+
+    def __init__(self, path: Path, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        self.path = path
+        self.max_size = max_size
+        self.logger = getLogger('ResultCache')
+
+    @staticmethod
+    def get_cache_path(project_path: Path) -> Path:
+        return project_path.joinpath(BLUEPRINT_FOLDER_NAME, 'cache')
+
+    @staticmethod
+    def node_key(function_hash: str, constants: Dict[str, Any], input_keys: Dict[str, str]) -> Optional[str]:
+        '''
+            The key of a node, or None if its constants can't be pickled
+        '''
+        try:
+            constants_data = pickle.dumps(sorted(constants.items()), protocol=4)
+        except Exception:
+            return None
+
+        digest = hashlib.sha256(f'{RESULT_CACHE_VERSION}\0{function_hash}\0'.encode('utf-8'))
+        digest.update(constants_data)
+        for parameter, key in sorted(input_keys.items()):
+            digest.update(f'\0{parameter}={key}'.encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def file_path(self, key: str) -> Path:
+        return self.path.joinpath(f'{key}.pickle')
+
+    def load(self, key: str) -> Tuple[bool, Any]:
+        '''
+            Return whether the key is cached, and its value
+        '''
+        filePath = self.file_path(key)
+        try:
+            with filePath.open('rb') as fh:
+                value = pickle.load(fh)
+            # the modification time tracks the last use, for the eviction
+            os.utime(filePath)
+        except FileNotFoundError:
+            return False, None
+        except Exception as ex:
+            self.logger.warning(f'Discarding unreadable cached value {key}: {ex}')
+            return False, None
+
+        return True, value
+
+    def store(self, key: str, value: Any) -> bool:
+        '''
+            Cache a value, returning False if it can't be pickled
+        '''
+        try:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as ex:
+            self.logger.debug(f'Not caching {key}: {ex}')
+            return False
+
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+
+            filePath = self.file_path(key)
+            tmpPath = filePath.with_name(f'{filePath.name}.{os.getpid()}.tmp')
+            with tmpPath.open('wb') as fh:
+                fh.write(data)
+            os.replace(tmpPath, filePath)
+        except OSError as ex:
+            self.logger.warning(f'Unable to cache {key}: {ex}')
+            return False
+
+        return True
+
+    def evict(self) -> None:
+        '''
+            Remove the least recently used values, until the cache fits
+            in max_size bytes
+        '''
+        entries = []
+        try:
+            for entry in os.scandir(self.path):
+                if entry.name.endswith('.pickle'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            return
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
@@ -0,0 +1,182 @@
+import json
+import os
+import pickle
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from blueprint.models import BLUEPRINT_FOLDER_NAME
+from blueprint.runner.cache import ResultCache
+from blueprint.runner.graph import FlowGraph
+
+RUN_CHECKPOINT_VERSION = 1
+
+
+def _write_durably(filePath: Path, data: bytes) -> None:
+    tmpPath = filePath.with_name(f'{filePath.name}.{os.getpid()}.tmp')
+    with tmpPath.open('wb') as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmpPath, filePath)
+
+
+class RunCheckpoint:
+    '''
+        Durable record of a flow run's completed nodes, stored in the
+        project's .blueprint/runs/<flow uid> folder
+
+        Each completed node's return value is pickled to its own file,
+        synced to disk, and only then recorded in the run's manifest, a log
+        appended one synced JSON line per node (replayed when resuming), so
+        that a crash can't leave the manifest pointing to an incomplete
+        value. The values are pickled and written in the background, in
+        completion order (see flush): the nodes are not expected to modify
+        their inputs, i.e. the values being written. Nodes are recorded
+        along with a
+        key hashing their function's name, their constants and their
+        upstream nodes' keys (see node_keys): when resuming a run after
+        editing the flow, the edited nodes and their dependents run again,
+        while fixing a function's source code (e.g. the one that failed)
+        doesn't invalidate anything.
+    '''
+    MANIFEST_NAME = 'manifest.jsonl'
+
+    path: Path
+    flow_uid: str
+    # uid -> key of the recorded nodes
+    nodes: Dict[str, str]
+    logger: Logger
+
+    _writer: Optional[ThreadPoolExecutor]
+
+    def __init__(self, runs_path: Path, flow_uid: str, resume: bool = False) -> None:
+        self.path = runs_path.joinpath(flow_uid)
+        self.flow_uid = flow_uid
+        self.nodes = {}
+        self.logger = getLogger('RunCheckpoint')
+        self._writer = None
+
+        if not resume or not self.load_manifest():
+            self.clear()
+
+    @staticmethod
+    def get_runs_path(project_path: Path) -> Path:
+        return project_path.joinpath(BLUEPRINT_FOLDER_NAME, 'runs')
+
+    @staticmethod
+    def node_keys(graph: FlowGraph) -> Dict[str, str]:
+        keys: Dict[str, str] = {}
+        for uid in graph.order:
+            node = graph.nodes[uid]
+            identity = f'{node.function.module}\0{node.function.name}'
+            input_keys = {parameter: keys[dependency]
+                          for parameter, dependency in node.inputs.items()}
+            # flows' constants come from JSON: they can always be pickled
+            keys[uid] = ResultCache.node_key(identity, node.constants, input_keys) or ''
+
+        return keys
+
+    def manifest_path(self) -> Path:
+        return self.path.joinpath(self.MANIFEST_NAME)
+
+    def value_path(self, uid: str) -> Path:
+        return self.path.joinpath(f'{uid}.pickle')
+
+    def load_manifest(self) -> bool:
+        '''
+            Replay the manifest, returning whether it's the one of the same
+            flow (and version)
+        '''
+        try:
+            with self.manifest_path().open('r') as fh:
+                lines = fh.readlines()
+        except FileNotFoundError:
+            return False
+        except OSError as ex:
+            self.logger.warning(f'Discarding unreadable run manifest: {ex}')
+            return False
+
+        for number, line in enumerate(lines, 1):
+            try:
+                dictionary = json.loads(line)
+            except ValueError:
+                # the last line, if the run stopped while writing it
+                self.logger.warning(f'Skipping the unreadable run manifest line {number}')
+                continue
+
+            if number == 1:
+                if dictionary.get('version') != RUN_CHECKPOINT_VERSION \
+                        or dictionary.get('flowUid') != self.flow_uid:
+                    return False
+            else:
+                self.nodes[dictionary['uid']] = dictionary['key']
+
+        return bool(lines)
+
+    def append_manifest(self, dictionary: dict) -> None:
+        with self.manifest_path().open('a') as fh:
+            fh.write(json.dumps(dictionary, separators=(',', ':')) + '\n')
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def load(self, uid: str, key: str) -> Tuple[bool, Any]:
+        '''
+            Return whether the node was completed (with the same key), and
+            its return value
+        '''
+        if not key or self.nodes.get(uid) != key:
+            return False, None
+
+        try:
+            with self.value_path(uid).open('rb') as fh:
+                return True, pickle.load(fh)
+        except Exception as ex:
+            self.logger.warning(f'Discarding unreadable checkpoint of {uid}: {ex}')
+            return False, None
+
+    def store(self, uid: str, key: str, value: Any) -> None:
+        '''
+            Record a completed node in the background (see flush): its
+            return value is not recorded if it can't be pickled
+        '''
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='RunCheckpoint')
+        self._writer.submit(self._write, uid, key, value)
+
+    def _write(self, uid: str, key: str, value: Any) -> None:
+        try:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as ex:
+            self.logger.debug(f'Not checkpointing {uid}: {ex}')
+            return
+
+        try:
+            if not self.manifest_path().exists():
+                self.path.mkdir(parents=True, exist_ok=True)
+                self.append_manifest({'version': RUN_CHECKPOINT_VERSION, 'flowUid': self.flow_uid})
+            _write_durably(self.value_path(uid), data)
+
+            self.append_manifest({'uid': uid, 'key': key})
+            self.nodes[uid] = key
+        except OSError as ex:
+            self.logger.warning(f'Unable to checkpoint {uid}: {ex}')
+
+    def flush(self) -> None:
+        '''
+            Wait for the completed nodes to be recorded, e.g. once the run
+            completed or failed
+        '''
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+
+    def clear(self) -> None:
+        '''
+            Forget the run, e.g. once it completed
+        '''
+        self.flush()
+        self.nodes = {}
+        shutil.rmtree(self.path, ignore_errors=True)
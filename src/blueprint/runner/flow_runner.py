@@ -0,0 +1,780 @@
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import nullcontext
+from concurrent.futures import (FIRST_COMPLETED, Executor, Future,
+                                ProcessPoolExecutor, ThreadPoolExecutor, wait)
+from enum import Enum
+from functools import partial
+from importlib import import_module
+from inspect import (Parameter, isasyncgen, isasyncgenfunction, iscoroutine,
+                     iscoroutinefunction, signature)
+from logging import Logger, getLogger
+from multiprocessing import get_context
+from pathlib import Path
+from threading import Event
+from typing import (Any, AsyncIterator, Callable, ContextManager, Dict, List,
+                    Optional, Set, Tuple)
+
+from blueprint.models import Flow, Function
+from blueprint.runner.batching import batch_spec, call_batched
+from blueprint.runner.cache import ResultCache, function_hash
+from blueprint.runner.checkpoint import RunCheckpoint
+from blueprint.runner.graph import FlowError, FlowGraph
+from blueprint.runner.profiling import (CacheStatus, FlowProfile, NodeProfile,
+                                        measure, value_size)
+from blueprint.runner.remote import (REMOTE_THRESHOLD, RemoteExecutor,
+                                     RemoteValue, keep)
+from blueprint.runner.streaming import (Stream, StreamError, StreamPump,
+                                        is_streaming)
+from blueprint.runner.transport import (SHARED_MEMORY_THRESHOLD, SharedValue,
+                                        release_blocks, share)
+
+
+class ExecutorType(Enum):
+    '''
+        Where the nodes run: THREAD suits the I/O bound functions (and the
+        ones releasing the GIL), PROCESS the CPU bound ones, as long as
+        their arguments and return values can be pickled, ASYNCIO the
+        coroutine functions (awaited on one event loop, the other functions
+        running in a thread pool), REMOTE spreads them on worker processes
+        connected over TCP, possibly running on other hosts (see
+        remote.RemoteExecutor), with the PROCESS executor's constraints
+    '''
+    THREAD = 'thread'
+    PROCESS = 'process'
+    ASYNCIO = 'asyncio'
+    REMOTE = 'remote'
+
+
+DEFAULT_BATCH_SIZE = 256
+
+_functions: Dict[Tuple[str, str], Callable] = {}
+
+# the handles of the values not passed by the pools themselves
+_VALUE_HANDLES = (SharedValue, RemoteValue)
+
+
+def resolve_function(module: str, name: str) -> Callable:
+    '''
+        Import a flow node's function (once per process)
+    '''
+    key = (module, name)
+    if key not in _functions:
+        try:
+            _functions[key] = getattr(import_module(module), name)
+        except (ImportError, AttributeError) as ex:
+            raise FlowError(f'Unable to load the function {module}.{name}: {ex}') from ex
+
+    return _functions[key]
+
+
+def forget_functions(module: str) -> None:
+    '''
+        Drop the module's functions resolved so far (e.g. once the module
+        is reloaded), for resolve_function to get them again
+    '''
+    for key in [key for key in _functions if key[0] == module]:
+        del _functions[key]
+
+
+def bind_arguments(function: Callable, kwargs: Dict[str, Any]) -> Tuple[List[Any], Dict[str, Any]]:
+    '''
+        Pass the positional-only parameters positionally, the others by keyword
+    '''
+    try:
+        parameters = signature(function).parameters.values()
+    except (TypeError, ValueError):
+        return [], kwargs
+
+    args: List[Any] = []
+    for parameter in parameters:
+        if parameter.kind is Parameter.POSITIONAL_ONLY and parameter.name in kwargs:
+            kwargs = dict(kwargs)
+            args.append(kwargs.pop(parameter.name))
+
+    return args, kwargs
+
+
+async def _collect(items: AsyncIterator[Any]) -> List[Any]:
+    return [item async for item in items]
+
+
+def _call(function: Callable, kwargs: Dict[str, Any]) -> Any:
+    args, kwargs = bind_arguments(function, kwargs)
+
+    return function(*args, **kwargs)
+
+
+def call_function(
+        module: str, name: str, kwargs: Dict[str, Any], materialize: bool = False,
+        batch_size: int = DEFAULT_BATCH_SIZE) -> Any:
+    '''
+        Run a node: only the function's name travels to the pool's workers
+
+        With materialize, a streaming function's items are returned as a
+        list (generators can't be sent back from a process pool), and so
+        are a batch function's results (see call_batched).
+    '''
+    function = resolve_function(module, name)
+
+    spec = batch_spec(function)
+    if spec is not None and spec.parameter in kwargs:
+        results = call_batched(partial(_call, function), f'{module}.{name}', spec, kwargs, batch_size)
+        return list(results) if materialize else results
+
+    result = _call(function, kwargs)
+    # coroutine functions, outside of the asyncio backend
+    if iscoroutine(result):
+        return asyncio.run(result)
+    if isasyncgen(result):
+        return asyncio.run(_collect(result))
+    if materialize and is_streaming(function):
+        return list(result)
+
+    return result
+
+
+def call_function_shared(
+        module: str, name: str, kwargs: Dict[str, Any], materialize: bool = False,
+        batch_size: int = DEFAULT_BATCH_SIZE, threshold: int = SHARED_MEMORY_THRESHOLD) -> Any:
+    '''
+        Run a node, loading its SharedValue arguments and sharing its return
+        value (see transport.share) if it's at least threshold bytes
+    '''
+    try:
+        kwargs = {parameter: value.load() if isinstance(value, SharedValue) else value
+                  for parameter, value in kwargs.items()}
+
+        return share(call_function(module, name, kwargs, materialize, batch_size), threshold)
+    finally:
+        del kwargs
+        release_blocks()
+
+
+def call_function_remote(
+        module: str, name: str, kwargs: Dict[str, Any], materialize: bool = False,
+        batch_size: int = DEFAULT_BATCH_SIZE, threshold: int = REMOTE_THRESHOLD) -> Any:
+    '''
+        Run a node on a remote worker, loading its RemoteValue arguments and
+        keeping its return value on the worker (see remote.keep) if it's at
+        least threshold bytes
+    '''
+    kwargs = {parameter: value.load() if isinstance(value, RemoteValue) else value
+              for parameter, value in kwargs.items()}
+
+    return keep(call_function(module, name, kwargs, materialize, batch_size), threshold)
+
+
+def is_awaitable(function: Callable) -> bool:
+    '''
+        Whether a function runs on the event loop, with the asyncio backend
+    '''
+    return iscoroutinefunction(function) or isasyncgenfunction(function)
+
+
+def _init_worker(project_root: Optional[str]) -> None:
+    if project_root and project_root not in sys.path:
+        sys.path.append(project_root)
+
+
+class FlowRunner:
+    '''
+        Run a flow's nodes as soon as their inputs are ready
+
+        The nodes are submitted to a thread or process pool in topological
+        order, so that independent nodes (e.g. the branches of a fan-out)
+        run concurrently. A node's return value is kept only until all of
+        its dependents are submitted, unless it's one of the flow's outputs.
+
+        With the THREAD executor, the streaming nodes (see is_streaming)
+        hand their items to their dependent as they're produced, through a
+        bounded buffer of buffer_size items: the dependent gets an iterable
+        Stream instead of a return value, and runs alongside its producer.
+        Only the nodes read by one parameter of one dependent are streamed
+        (see streaming_nodes), the others' items are collected into lists:
+        as each stream has its own producer, a dependent can read its
+        streams in any order. With the PROCESS executor, the streaming
+        nodes' items are collected into lists.
+
+        With the ASYNCIO executor, the coroutine functions' nodes are
+        awaited on one event loop, at most concurrency of them at once
+        (async generators' items are collected into lists), while the
+        other nodes run in a thread pool, their items collected as well.
+
+        The batch functions (see batching.Batch) are called once per batch
+        of batch_size items (unless they set their own size), their results
+        streamed (with the THREAD executor) or collected into lists.
+
+        With shared_memory, the PROCESS executor's nodes return their big
+        values (see SHARED_MEMORY_THRESHOLD) through shared memory blocks:
+        the coordinating process only gets their handle, and the workers
+        running the dependents map the blocks, taking the values' buffers
+        by reference (see transport.SharedValue). A block is freed once all
+        the dependents completed.
+
+        With the REMOTE executor, the nodes' big return values (see
+        REMOTE_THRESHOLD) stay on the worker which produced them: their
+        dependents run on that worker when it's free, or fetch them from
+        it. A node whose worker disconnects is retried, on another worker
+        if any (see remote.RemoteExecutor).
+
+        The nodes can run on an executor of one's own instead (e.g. a
+        RemoteExecutor listening for other hosts' workers, or any other
+        concurrent.futures.Executor), left running after the runs: the
+        executor_type tells how it runs them (THREAD: in this process).
+
+        With a ResultCache, the nodes whose key (see ResultCache) is cached
+        are not run, nor the nodes they depend on when nothing else needs
+        them; the return values of the nodes that run are cached.
+
+        With a RunCheckpoint, the nodes' return values are recorded as they
+        complete, and the nodes completed by the checkpoint's run (unless
+        edited since) are not run again, in the same way; the checkpoint is
+        cleared once the flow completes.
+
+        With profiling, the runs record the profile of each node (see
+        profiling.FlowProfile): its wall and CPU times, the peak of the
+        memory it allocated (traced with tracemalloc, which slows the nodes
+        down), the size of its arguments and return value, and whether it
+        was served from the cache. A streaming node's times include the
+        pulling of its items, until its last dependent stops reading.
+    '''
+    flow: Flow
+    graph: FlowGraph
+    executor_type: ExecutorType
+    executor: Optional[Executor]
+    workers: Optional[int]
+    project_root: Optional[Path]
+    buffer_size: int
+    concurrency: int
+    batch_size: int
+    shared_memory: bool
+    cache: Optional[ResultCache]
+    # uid -> cache key (None for the nodes that can't be cached)
+    keys: Dict[str, Optional[str]]
+    # uids of the nodes served from the cache, by the last run
+    cached: Set[str]
+    checkpoint: Optional[RunCheckpoint]
+    # uid -> checkpoint key
+    checkpoint_keys: Dict[str, str]
+    # uids of the nodes completed by the checkpoint's run, by the last run
+    resumed: Set[str]
+    profiling: bool
+    # the profile of the last run (even if it failed), with profiling
+    profile: Optional[FlowProfile]
+    logger: Logger
+
+    _tracing: bool
+
+    def __init__(
+            self, flow: Flow, executor_type: ExecutorType = ExecutorType.THREAD,
+            workers: Optional[int] = None, project_root: Optional[Path] = None,
+            buffer_size: int = 64, concurrency: int = 100, batch_size: int = DEFAULT_BATCH_SIZE,
+            shared_memory: bool = False, cache: Optional[ResultCache] = None, checkpoint: Optional[RunCheckpoint] = None,
+            profiling: bool = False, executor: Optional[Executor] = None) -> None:
+        self.flow = flow
+        self.graph = FlowGraph(flow)
+        self.executor_type = executor_type
+        self.executor = executor
+        self.workers = workers
+        self.project_root = project_root
+        self.buffer_size = buffer_size
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.shared_memory = shared_memory
+        self.cache = cache
+        self.keys = {}
+        self.cached = set()
+        self.checkpoint = checkpoint
+        self.checkpoint_keys = {}
+        self.resumed = set()
+        self.profiling = profiling
+        self.profile = None
+        self.logger = getLogger('FlowRunner')
+
+        self._tracing = False
+
+    def create_executor(self, min_workers: int = 0) -> ContextManager[Executor]:
+        if self.executor is not None:
+            return nullcontext(self.executor)
+
+        project_root = str(self.project_root) if self.project_root else None
+
+        if self.executor_type is ExecutorType.REMOTE:
+            # a cluster of workers on this host
+            return RemoteExecutor(workers=self.workers or os.cpu_count(), project_root=project_root)
+
+        if self.executor_type is ExecutorType.PROCESS:
+            # spawn: forking a process running the Qt event loop is not safe
+            return ProcessPoolExecutor(
+                max_workers=self.workers or os.cpu_count(), mp_context=get_context('spawn'),
+                initializer=_init_worker, initargs=(project_root,))
+
+        _init_worker(project_root)
+        workers = self.workers
+        if workers is not None and workers < min_workers:
+            self.logger.info(f'Using {min_workers} workers, to read all the streams at once')
+            workers = min_workers
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='FlowRunner')
+
+    def out_of_process(self) -> bool:
+        '''
+            Whether the nodes run in other processes
+        '''
+        return self.executor_type in (ExecutorType.PROCESS, ExecutorType.REMOTE)
+
+    def streaming_nodes(self) -> Set[str]:
+        '''
+            The uids of the nodes whose items (or batch results) are streamed
+            to their dependent
+
+            A node read through several parameters (of one or more
+            dependents) is not streamed: its readers would share its pace,
+            and one of them reading its stream to the end before starting
+            another one fed by the same node (or by the nodes it feeds)
+            would block forever once the items fill the other buffers.
+        '''
+        if self.executor_type is not ExecutorType.THREAD:
+            return set()
+
+        _init_worker(str(self.project_root) if self.project_root else None)
+        readers = {uid: 0 for uid in self.graph.nodes}
+        for node in self.graph.nodes.values():
+            for dependency in node.inputs.values():
+                if dependency in readers:
+                    readers[dependency] += 1
+
+        streaming = set()
+        for uid, node in self.graph.nodes.items():
+            if readers[uid] != 1:
+                continue
+            function = resolve_function(node.function.module, node.function.name)
+            if is_streaming(function) or batch_spec(function) is not None:
+                streaming.add(uid)
+
+        return streaming
+
+    def cache_keys(self) -> Dict[str, Optional[str]]:
+        _init_worker(str(self.project_root) if self.project_root else None)
+
+        keys: Dict[str, Optional[str]] = {}
+        for uid in self.graph.order:
+            node = self.graph.nodes[uid]
+            module, name = node.function.module, node.function.name
+            source_hash = function_hash(module, name, resolve_function(module, name))
+            input_keys = {parameter: keys[dependency]
+                          for parameter, dependency in node.inputs.items()}
+
+            if source_hash is None or None in input_keys.values():
+                keys[uid] = None
+            else:
+                keys[uid] = ResultCache.node_key(source_hash, node.constants, input_keys)
+
+        return keys
+
+    def plan(self, streaming: Set[str]) -> Tuple[Set[str], Dict[str, Any]]:
+        '''
+            The uids of the nodes to run, and the cached (or checkpointed)
+            return values of the other nodes they (or the outputs) need
+        '''
+        graph = self.graph
+        self.cached = set()
+        self.resumed = set()
+        if self.cache is None and self.checkpoint is None:
+            return set(graph.nodes), {}
+
+        if self.cache is not None:
+            self.keys = self.cache_keys()
+        if self.checkpoint is not None:
+            self.checkpoint_keys = RunCheckpoint.node_keys(graph)
+        needed = set(graph.outputs())
+        to_run: Set[str] = set()
+        results: Dict[str, Any] = {}
+
+        # dependents first: whether a node is needed is known when reached
+        for uid in reversed(graph.order):
+            if uid not in needed:
+                continue
+
+            if uid not in streaming:
+                if self.checkpoint is not None:
+                    hit, value = self.checkpoint.load(uid, self.checkpoint_keys[uid])
+                    if hit:
+                        results[uid] = value
+                        self.resumed.add(uid)
+                        continue
+
+                key = self.keys.get(uid)
+                if self.cache is not None and key is not None:
+                    hit, value = self.cache.load(key)
+                    if hit:
+                        results[uid] = value
+                        self.cached.add(uid)
+                        continue
+
+            to_run.add(uid)
+            needed.update(graph.dependencies[uid])
+
+        return to_run, results
+
+    def store(self, uid: str, result: Any) -> None:
+        if isinstance(result, _VALUE_HANDLES) and (self.cache is not None or self.checkpoint is not None):
+            result = result.load()
+
+        key = self.keys.get(uid)
+        if self.cache is not None and key is not None:
+            self.cache.store(key, result)
+        if self.checkpoint is not None:
+            self.checkpoint.store(uid, self.checkpoint_keys[uid], result)
+
+    def start_profile(self) -> None:
+        self.profile = None
+        if not self.profiling:
+            return
+
+        self.profile = FlowProfile(self.flow.uid, self.flow.name, start=time.time())
+        # the process pool's workers trace their own allocations
+        if not self.out_of_process() and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+    def profile_served(self, results: Dict[str, Any]) -> None:
+        '''
+            Record the nodes served from the cache or the checkpoint
+        '''
+        if self.profile is None:
+            return
+
+        for uid, value in results.items():
+            self.profile.add(NodeProfile(
+                uid=uid, label=self.graph.label(uid), start=self.profile.start, cpu=0.0,
+                output_size=value_size(value),
+                cache=CacheStatus.RESUMED if uid in self.resumed else CacheStatus.HIT,
+                pid=self.profile.pid))
+
+    def profile_node(self, node: NodeProfile, kwargs: Dict[str, Any], result: Any, streaming: bool = False) -> None:
+        node.input_size = 0
+        for value in kwargs.values():
+            size = value_size(value)
+            if size is None:
+                node.input_size = None
+                break
+            node.input_size += size
+        node.output_size = value_size(result)
+        if streaming:
+            # the allocations of the pump pulling the items are not traced
+            node.memory = None
+        elif self.cache is not None and self.keys.get(node.uid) is not None:
+            node.cache = CacheStatus.MISS
+
+        self.profile.add(node)
+
+    def finish_profile(self) -> None:
+        if self.profile is None:
+            return
+
+        self.profile.wall = time.time() - self.profile.start
+        self.profile.nodes = {uid: self.profile.nodes[uid]
+                              for uid in self.graph.order if uid in self.profile.nodes}
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def completed(self) -> None:
+        if self.cache is not None:
+            self.cache.evict()
+        if self.checkpoint is not None:
+            self.checkpoint.clear()
+
+    def node_arguments(
+            self, uid: str, results: Dict[str, Any],
+            streams: Optional[Dict[Tuple[str, str], Stream]] = None) -> Dict[str, Any]:
+        node = self.graph.nodes[uid]
+        streams = streams or {}
+
+        kwargs = dict(node.constants)
+        kwargs.update((parameter, streams[(dependency, uid)] if (dependency, uid) in streams
+                       else results[dependency])
+                      for parameter, dependency in node.inputs.items())
+
+        return kwargs
+
+    def run(self) -> Dict[str, Any]:
+        '''
+            Run the flow, returning its outputs' return values by node uid
+            (the list of their items, for the streaming ones)
+        '''
+        if self.executor_type is ExecutorType.ASYNCIO:
+            return asyncio.run(self.run_async())
+
+        try:
+            self.start_profile()
+            return self.run_pool()
+        finally:
+            self.finish_profile()
+            if self.checkpoint is not None:
+                # the nodes completed so far, should the run have failed
+                self.checkpoint.flush()
+
+    def run_pool(self) -> Dict[str, Any]:
+        graph = self.graph
+        outputs = set(graph.outputs())
+        streaming = self.streaming_nodes()
+
+        to_run, results = self.plan(streaming)
+        self.profile_served(results)
+        remaining = {uid: len(graph.dependencies[uid] & to_run) for uid in to_run}
+        unsubmitted_dependents = {uid: sum(dependent in to_run for dependent in dependents)
+                                  for uid, dependents in graph.dependents.items()}
+        running: Dict[Future, str] = {}
+        # uid -> arguments of the running nodes, with profiling
+        arguments: Dict[str, Dict[str, Any]] = {}
+
+        # (producer uid, dependent uid) -> stream
+        streams: Dict[Tuple[str, str], Stream] = {}
+        pumps: Dict[str, StreamPump] = {}
+        cancelled = Event()
+        # the streams' readers run alongside their producers, they must all get a worker
+        stream_readers = {dependent for uid in streaming & to_run for dependent in graph.dependents[uid]
+                          if dependent in to_run and dependent not in streaming}
+
+        # uid -> shared memory (or remote) handle of the return value
+        shared: Dict[str, Any] = {}
+        # uid -> dependents which didn't complete yet, of the shared values
+        shared_readers: Dict[str, int] = {}
+        share_values = self.executor_type is ExecutorType.REMOTE or (
+            self.shared_memory and self.executor_type is ExecutorType.PROCESS)
+        if self.executor_type is ExecutorType.REMOTE:
+            node_call = call_function_remote
+        else:
+            node_call = call_function_shared if share_values else call_function
+
+        def input_streams(uid: str) -> List[Stream]:
+            return [streams[(dependency, uid)] for dependency in graph.dependencies[uid]
+                    if (dependency, uid) in streams]
+
+        def release_shared(uid: str) -> None:
+            for dependency in graph.dependencies[uid]:
+                if dependency in shared_readers:
+                    shared_readers[dependency] -= 1
+                    if not shared_readers[dependency] and dependency not in outputs:
+                        shared.pop(dependency).unlink()
+
+        with self.create_executor(min_workers=len(stream_readers)) as executor:
+            def submit(uid: str) -> None:
+                function: Function = graph.nodes[uid].function
+                self.logger.debug(f'Running {graph.label(uid)}')
+                # the items of the streaming functions not streamed are collected
+                call = (node_call, function.module, function.name, self.node_arguments(uid, results, streams),
+                        uid not in streaming, self.batch_size)
+                if self.profile is not None:
+                    arguments[uid] = call[3]
+                    future = executor.submit(measure, uid, graph.label(uid), True, *call)
+                else:
+                    future = executor.submit(*call)
+                running[future] = uid
+
+                for dependency in graph.dependencies[uid]:
+                    unsubmitted_dependents[dependency] -= 1
+                    if not unsubmitted_dependents[dependency] and dependency not in outputs:
+                        results.pop(dependency, None)
+
+            def pump(uid: str, items: Any) -> None:
+                node_streams = []
+                for dependent in graph.dependents[uid]:
+                    if dependent not in to_run:
+                        continue
+                    streams[(uid, dependent)] = Stream(self.buffer_size, cancelled)
+                    node_streams.append(streams[(uid, dependent)])
+
+                pumps[uid] = StreamPump(
+                    graph.label(uid), items, node_streams, cancelled,
+                    inputs=input_streams(uid), collect=uid in outputs)
+                pumps[uid].start()
+
+            try:
+                for uid in graph.order:
+                    if uid in to_run and not remaining[uid]:
+                        submit(uid)
+
+                while running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        uid = running.pop(future)
+                        try:
+                            result = future.result()
+                        except StreamError:
+                            # the producer's error, rather than the reader's
+                            raise
+                        except Exception as ex:
+                            raise FlowError(f'{graph.label(uid)} failed: {ex!r}') from ex
+                        if self.profile is not None:
+                            result, node_profile = result
+                            self.profile_node(node_profile, arguments.pop(uid), result, uid in streaming)
+
+                        if uid in streaming:
+                            pump(uid, result)
+                        else:
+                            if isinstance(result, _VALUE_HANDLES):
+                                shared[uid] = result
+                                shared_readers[uid] = sum(
+                                    dependent in to_run for dependent in graph.dependents[uid])
+                            results[uid] = result
+                            self.store(uid, result)
+                            release_shared(uid)
+                            for stream in input_streams(uid):
+                                stream.close()
+
+                        for dependent in graph.dependents[uid]:
+                            if dependent in to_run:
+                                remaining[dependent] -= 1
+                                if not remaining[dependent]:
+                                    submit(dependent)
+
+                for uid, node_pump in pumps.items():
+                    node_pump.join()
+                    if node_pump.error is not None:
+                        raise node_pump.error
+                    if uid in outputs:
+                        results[uid] = node_pump.collected
+                    if self.profile is not None and node_pump.ended is not None:
+                        node_profile = self.profile.nodes[uid]
+                        node_profile.wall = node_pump.ended - node_profile.start
+                        node_profile.cpu += node_pump.cpu
+
+                for uid in outputs & shared.keys():
+                    results[uid] = shared[uid].load()
+            except BaseException:
+                # stop the pumps, and the nodes blocked on their streams
+                cancelled.set()
+                for pending in running:
+                    pending.cancel()
+                raise
+            finally:
+                if share_values:
+                    # once the nodes still running are done, with their values
+                    wait(running)
+                    for future in running:
+                        if future.cancelled() or future.exception() is not None:
+                            continue
+                        result = future.result()
+                        if self.profile is not None:
+                            result = result[0]
+                        if isinstance(result, _VALUE_HANDLES):
+                            result.unlink()
+                    for handle in shared.values():
+                        handle.unlink()
+
+        self.completed()
+
+        return {uid: results[uid] for uid in graph.order if uid in outputs}
+
+    async def run_async(self) -> Dict[str, Any]:
+        '''
+            Run the flow on the running event loop (see ExecutorType.ASYNCIO)
+        '''
+        try:
+            self.start_profile()
+            return await self.run_loop()
+        finally:
+            self.finish_profile()
+            if self.checkpoint is not None:
+                # the nodes completed so far, should the run have failed
+                self.checkpoint.flush()
+
+    async def run_loop(self) -> Dict[str, Any]:
+        graph = self.graph
+        outputs = set(graph.outputs())
+
+        to_run, results = self.plan(set())
+        self.profile_served(results)
+        remaining = {uid: len(graph.dependencies[uid] & to_run) for uid in to_run}
+        unsubmitted_dependents = {uid: sum(dependent in to_run for dependent in dependents)
+                                  for uid, dependents in graph.dependents.items()}
+        running: Dict[asyncio.Future, str] = {}
+        # uid -> arguments of the running nodes, with profiling
+        arguments: Dict[str, Dict[str, Any]] = {}
+
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+
+        with self.create_executor() as executor:
+            functions = {uid: resolve_function(node.function.module, node.function.name)
+                         for uid, node in graph.nodes.items()}
+
+            async def call(uid: str, kwargs: Dict[str, Any]) -> Any:
+                function = functions[uid]
+                if not is_awaitable(function):
+                    node: Function = graph.nodes[uid].function
+                    call = partial(call_function, node.module, node.name, kwargs, True, self.batch_size)
+                    if self.profile is not None:
+                        call = partial(measure, uid, graph.label(uid), True, call)
+                    return await loop.run_in_executor(executor, call)
+
+                args, kwargs = bind_arguments(function, kwargs)
+                async with semaphore:
+                    if self.profile is None:
+                        if isasyncgenfunction(function):
+                            return await _collect(function(*args, **kwargs))
+                        return await function(*args, **kwargs)
+
+                    # the loop's thread runs the other coroutines too: no CPU time
+                    node_profile = NodeProfile(
+                        uid=uid, label=graph.label(uid), start=time.time(), pid=os.getpid())
+                    wall = time.perf_counter()
+                    if isasyncgenfunction(function):
+                        result = await _collect(function(*args, **kwargs))
+                    else:
+                        result = await function(*args, **kwargs)
+                    node_profile.wall = time.perf_counter() - wall
+
+                    return result, node_profile
+
+            def submit(uid: str) -> None:
+                self.logger.debug(f'Running {graph.label(uid)}')
+                kwargs = self.node_arguments(uid, results)
+                if self.profile is not None:
+                    arguments[uid] = kwargs
+                task = asyncio.ensure_future(call(uid, kwargs))
+                running[task] = uid
+
+                for dependency in graph.dependencies[uid]:
+                    unsubmitted_dependents[dependency] -= 1
+                    if not unsubmitted_dependents[dependency] and dependency not in outputs:
+                        results.pop(dependency)
+
+            try:
+                for uid in graph.order:
+                    if uid in to_run and not remaining[uid]:
+                        submit(uid)
+
+                while running:
+                    done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        uid = running.pop(task)
+                        try:
+                            results[uid] = task.result()
+                        except Exception as ex:
+                            raise FlowError(f'{graph.label(uid)} failed: {ex!r}') from ex
+                        if self.profile is not None:
+                            results[uid], node_profile = results[uid]
+                            self.profile_node(node_profile, arguments.pop(uid), results[uid])
+
+                        self.store(uid, results[uid])
+                        for dependent in graph.dependents[uid]:
+                            if dependent in to_run:
+                                remaining[dependent] -= 1
+                                if not remaining[dependent]:
+                                    submit(dependent)
+            except BaseException:
+                for task in running:
+                    task.cancel()
+                await asyncio.gather(*running, return_exceptions=True)
+                raise
+
+        self.completed()
+
+        return {uid: results[uid] for uid in graph.order if uid in outputs}
@@ -0,0 +1,85 @@
+from typing import Dict, List, Set
+
+from blueprint.models import Flow, FlowElement
+
+
+class FlowError(Exception):
+    '''
+        The flow can't be run, or one of its nodes failed
+    '''
+
+
+class FlowGraph:
+    '''
+        The data dependencies between a flow's nodes
+
+        A node depends on the nodes whose return value it gets as input.
+        The graph is checked upon creation: links to unknown nodes and
+        cycles raise a FlowError.
+    '''
+    flow: Flow
+    nodes: Dict[str, FlowElement]
+    # uid -> uids of the nodes it gets its inputs from
+    dependencies: Dict[str, Set[str]]
+    # uid -> uids of the nodes getting its return value (in flow order)
+    dependents: Dict[str, List[str]]
+    # uids, each node after its dependencies (and in flow order otherwise)
+    order: List[str]
+
+    def __init__(self, flow: Flow) -> None:
+        self.flow = flow
+        self.nodes = {}
+        self.dependencies = {}
+        self.dependents = {}
+
+        for node in flow.nodes:
+            if node.uid in self.nodes:
+                raise FlowError(f'Duplicate node {node.uid} in flow {flow.name}')
+            self.nodes[node.uid] = node
+            self.dependencies[node.uid] = set()
+            self.dependents[node.uid] = []
+
+        for node in flow.nodes:
+            for parameter, uid in node.inputs.items():
+                if uid not in self.nodes:
+                    raise FlowError(
+                        f'{self.label(node.uid)}: parameter {parameter} is linked to the unknown node {uid}')
+                if uid not in self.dependencies[node.uid]:
+                    self.dependencies[node.uid].add(uid)
+                    self.dependents[uid].append(node.uid)
+
+        self.order = self.topological_order()
+
+    def label(self, uid: str) -> str:
+        function = self.nodes[uid].function
+
+        return f'{function.module}.{function.name} ({uid})'
+
+    def topological_order(self) -> List[str]:
+        remaining = {uid: len(dependencies)
+                     for uid, dependencies in self.dependencies.items()}
+        # stack of the ready nodes, popping them in flow order
+        ready = [uid for uid in reversed(list(self.nodes)) if not remaining[uid]]
+
+        order: List[str] = []
+        while ready:
+            uid = ready.pop()
+            order.append(uid)
+
+            for dependent in reversed(self.dependents[uid]):
+                remaining[dependent] -= 1
+                if not remaining[dependent]:
+                    ready.append(dependent)
+
+        if len(order) < len(self.nodes):
+            cycle = ', '.join(self.label(uid)
+                              for uid in self.nodes if remaining[uid])
+            raise FlowError(f'The flow {self.flow.name} has a cycle among: {cycle}')
+
+        return order
+
+    def outputs(self) -> List[str]:
+        '''
+            The nodes whose return value is not used by any other node
+        '''
+        return [uid for uid in self.order if not self.dependents[uid]]
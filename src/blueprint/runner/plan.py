@@ -0,0 +1,356 @@
+import hashlib
+import importlib
+import json
+import os
+import sys
+import time
+import weakref
+from dataclasses import dataclass, replace
+from inspect import Parameter, signature
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from blueprint.models import BLUEPRINT_FOLDER_NAME, Flow
+from blueprint.runner.batching import batch_spec
+from blueprint.runner.flow_runner import (call_function, forget_functions,
+                                          is_awaitable, resolve_function)
+from blueprint.runner.graph import FlowError, FlowGraph
+from blueprint.runner.streaming import is_streaming
+
+EXECUTION_PLAN_VERSION = 2
+
+# seconds between two checks of an in-memory plan's source files
+SOURCES_CHECK_INTERVAL = 1.0
+
+
+def flow_hash(flow: Flow) -> str:
+    return hashlib.sha1(json.dumps(flow.toDict(), sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def reload_modules(modules: Iterable[str]) -> None:
+    '''
+        Reload the (imported) modules whose source changed, dropping the
+        functions resolved out of them
+    '''
+    for module in modules:
+        try:
+            if module in sys.modules:
+                importlib.reload(sys.modules[module])
+        except Exception as ex:
+            raise FlowError(f'Unable to reload the module {module}: {ex!r}') from ex
+        finally:
+            forget_functions(module)
+
+
+@dataclass(frozen=True)
+class PlanStep:
+    '''
+        A node of an execution plan, getting its arguments from the plan's
+        slots and storing its return value into its own slot
+    '''
+    uid: str
+    module: str
+    name: str
+    # (parameter, slot), the positional-only parameters first
+    arguments: Tuple[Tuple[str, int], ...]
+    # how many arguments are passed positionally
+    positional: int
+    # whether the function is called as is (False: see call_function)
+    plain: bool
+    # the slots no later step reads, freed after this step
+    release: Tuple[int, ...]
+
+    def toDict(self) -> dict:
+        return {
+            'uid': self.uid,
+            'module': self.module,
+            'name': self.name,
+            'arguments': self.arguments,
+            'positional': self.positional,
+            'plain': self.plain,
+            'release': self.release,
+        }
+
+    @staticmethod
+    def fromDict(dictionary: dict) -> 'PlanStep':
+        return PlanStep(
+            uid=dictionary['uid'],
+            module=dictionary['module'],
+            name=dictionary['name'],
+            arguments=tuple((parameter, slot) for parameter, slot in dictionary['arguments']),
+            positional=dictionary['positional'],
+            plain=dictionary['plain'],
+            release=tuple(dictionary['release']))
+
+
+@dataclass(frozen=True)
+class ExecutionPlan:
+    '''
+        A flow compiled into a flat, immutable list of steps (see
+        compile_plan), run one after the other in the calling thread
+
+        The steps' return values and the nodes' constants live in a list
+        of slots: step i stores its return value into slot i, the
+        constants follow. The plan records the flow's hash and the stats
+        of the functions' source files, to tell when it's outdated.
+    '''
+    flow_uid: str
+    flow_hash: str
+    # (module, source file, size, mtime in ns) of the functions' modules
+    sources: Tuple[Tuple[str, str, int, int], ...]
+    steps: Tuple[PlanStep, ...]
+    constants: Tuple[Any, ...]
+    # (uid, slot) of the flow's outputs
+    outputs: Tuple[Tuple[str, int], ...]
+
+    def is_current(self, flow: Flow) -> bool:
+        return flow.uid == self.flow_uid and flow_hash(flow) == self.flow_hash \
+            and not self.changed_sources()
+
+    def changed_sources(self) -> List[str]:
+        '''
+            The modules whose source file changed since the compilation
+        '''
+        changed = []
+        for module, path, size, mtime in self.sources:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                changed.append(module)
+                continue
+            if stat.st_size != size or stat.st_mtime_ns != mtime:
+                changed.append(module)
+
+        return changed
+
+    def run(self) -> Dict[str, Any]:
+        '''
+            Run the plan, returning its outputs' return values by node uid
+        '''
+        slots: List[Any] = [None] * len(self.steps)
+        slots.extend(self.constants)
+
+        for index, step in enumerate(self.steps):
+            values = [slots[slot] for _, slot in step.arguments]
+            try:
+                if step.plain:
+                    function = resolve_function(step.module, step.name)
+                    slots[index] = function(
+                        *values[:step.positional],
+                        **{parameter: value for (parameter, _), value
+                           in zip(step.arguments[step.positional:], values[step.positional:])})
+                else:
+                    slots[index] = call_function(
+                        step.module, step.name,
+                        {parameter: value for (parameter, _), value in zip(step.arguments, values)},
+                        materialize=True)
+            except FlowError:
+                raise
+            except Exception as ex:
+                raise FlowError(f'{step.module}.{step.name} ({step.uid}) failed: {ex!r}') from ex
+
+            for slot in step.release:
+                slots[slot] = None
+
+        return {uid: slots[slot] for uid, slot in self.outputs}
+
+    def toDict(self) -> dict:
+        return {
+            'version': EXECUTION_PLAN_VERSION,
+            'flowUid': self.flow_uid,
+            'flowHash': self.flow_hash,
+            'sources': self.sources,
+            'steps': [step.toDict() for step in self.steps],
+            'constants': self.constants,
+            'outputs': self.outputs,
+        }
+
+    @staticmethod
+    def fromDict(dictionary: dict) -> 'ExecutionPlan':
+        return ExecutionPlan(
+            flow_uid=dictionary['flowUid'],
+            flow_hash=dictionary['flowHash'],
+            sources=tuple((module, path, size, mtime) for module, path, size, mtime in dictionary['sources']),
+            steps=tuple(PlanStep.fromDict(step) for step in dictionary['steps']),
+            constants=tuple(dictionary['constants']),
+            outputs=tuple((uid, slot) for uid, slot in dictionary['outputs']))
+
+
+def compile_plan(flow: Flow, graph: Optional[FlowGraph] = None) -> ExecutionPlan:
+    '''
+        Compile a flow (whose functions must be importable) into an
+        execution plan, resolving its functions and binding their
+        arguments once for all
+    '''
+    graph = graph or FlowGraph(flow)
+    slot_of = {uid: index for index, uid in enumerate(graph.order)}
+    outputs = set(graph.outputs())
+
+    constants: List[Any] = []
+    sources: Dict[str, Tuple[str, str, int, int]] = {}
+    steps: List[PlanStep] = []
+    # slot -> index of the last step reading it
+    last_read: Dict[int, int] = {}
+
+    for index, uid in enumerate(graph.order):
+        node = graph.nodes[uid]
+        module, name = node.function.module, node.function.name
+        function = resolve_function(module, name)
+
+        source = sys.modules[module].__dict__.get('__file__')
+        if module not in sources and source:
+            stat = os.stat(source)
+            sources[module] = (module, source, stat.st_size, stat.st_mtime_ns)
+
+        arguments: Dict[str, int] = {}
+        for parameter, value in node.constants.items():
+            arguments[parameter] = len(graph.order) + len(constants)
+            constants.append(value)
+        for parameter, dependency in node.inputs.items():
+            arguments[parameter] = slot_of[dependency]
+            last_read[slot_of[dependency]] = index
+
+        try:
+            parameters = list(signature(function).parameters.values())
+        except (TypeError, ValueError):
+            parameters = []
+        positional_only = [parameter.name for parameter in parameters
+                           if parameter.kind is Parameter.POSITIONAL_ONLY and parameter.name in arguments]
+        ordered = positional_only + [parameter for parameter in arguments
+                                     if parameter not in positional_only]
+
+        plain = not (is_awaitable(function) or is_streaming(function) or batch_spec(function) is not None)
+        steps.append(PlanStep(
+            uid=uid, module=module, name=name,
+            arguments=tuple((parameter, arguments[parameter]) for parameter in ordered),
+            positional=len(positional_only), plain=plain, release=()))
+
+    # free each node's return value after its last reader (outputs are kept)
+    releases: Dict[int, List[int]] = {}
+    for slot, index in last_read.items():
+        if graph.order[slot] not in outputs:
+            releases.setdefault(index, []).append(slot)
+    steps = [replace(step, release=tuple(sorted(releases.get(index, []))))
+             for index, step in enumerate(steps)]
+
+    return ExecutionPlan(
+        flow_uid=flow.uid,
+        flow_hash=flow_hash(flow),
+        sources=tuple(sources.values()),
+        steps=tuple(steps),
+        constants=tuple(constants),
+        outputs=tuple((uid, slot_of[uid]) for uid in graph.outputs()))
+
+
+class PlanCache:
+    '''
+        The flows' compiled execution plans, stored in the project's
+        .blueprint/plans folder: a plan is compiled again once the flow or
+        its functions' source files change
+
+        Plans are kept in memory too, for the processes running a flow
+        again and again: the flow is hashed again only when it's another
+        instance or edited since (see Flow.touch), and the source files
+        are checked at most every SOURCES_CHECK_INTERVAL seconds. The
+        changed modules are reloaded before compiling the plan again.
+    '''
+    path: Path
+    logger: Logger
+
+    _memory: Dict[str, ExecutionPlan]
+    # flow uid -> (flow, revision, time of the sources' check) last found current
+    _checked: Dict[str, Tuple['weakref.ref[Flow]', int, float]]
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.logger = getLogger('PlanCache')
+        self._memory = {}
+        self._checked = {}
+
+    @staticmethod
+    def get_plans_path(project_path: Path) -> Path:
+        return project_path.joinpath(BLUEPRINT_FOLDER_NAME, 'plans')
+
+    def file_path(self, flow_uid: str) -> Path:
+        return self.path.joinpath(f'{flow_uid}.json')
+
+    def is_current(self, plan: ExecutionPlan, flow: Flow) -> bool:
+        checked = self._checked.get(flow.uid)
+        unchanged = checked is not None and checked[0]() is flow and checked[1] == flow.revision
+        now = time.monotonic()
+
+        if not unchanged and (flow.uid != plan.flow_uid or flow_hash(flow) != plan.flow_hash):
+            return False
+        if not unchanged or now - checked[2] >= SOURCES_CHECK_INTERVAL:
+            if plan.changed_sources():
+                return False
+            self._checked[flow.uid] = (weakref.ref(flow), flow.revision, now)
+
+        return True
+
+    def load(self, flow: Flow) -> Optional[ExecutionPlan]:
+        plan = self.read(flow)
+        if plan is None or not self.is_current(plan, flow):
+            return None
+
+        self._memory[flow.uid] = plan
+
+        return plan
+
+    def read(self, flow: Flow) -> Optional[ExecutionPlan]:
+        '''
+            The flow's last plan, current or not
+        '''
+        plan = self._memory.get(flow.uid)
+        if plan is not None:
+            return plan
+
+        filePath = self.file_path(flow.uid)
+        try:
+            with filePath.open('r') as fh:
+                dictionary = json.load(fh)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as ex:
+            self.logger.warning(f'Discarding unreadable plan of {flow.name}: {ex}')
+            return None
+
+        if dictionary.get('version') != EXECUTION_PLAN_VERSION:
+            return None
+
+        return ExecutionPlan.fromDict(dictionary)
+
+    def store(self, plan: ExecutionPlan) -> None:
+        self._memory[plan.flow_uid] = plan
+
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+
+            filePath = self.file_path(plan.flow_uid)
+            tmpPath = filePath.with_name(f'{filePath.name}.{os.getpid()}.tmp')
+            with tmpPath.open('w') as fh:
+                fh.write(json.dumps(plan.toDict(), separators=(',', ':')))
+            os.replace(tmpPath, filePath)
+        except (OSError, TypeError, ValueError) as ex:
+            self.logger.warning(f'Unable to store the plan of {plan.flow_uid}: {ex}')
+
+    def get(self, flow: Flow) -> ExecutionPlan:
+        '''
+            The flow's plan, compiled (and stored) if outdated
+        '''
+        plan = self.read(flow)
+        if plan is not None and self.is_current(plan, flow):
+            self._memory[flow.uid] = plan
+            return plan
+
+        if plan is not None:
+            # else compile_plan would resolve the functions already imported
+            reload_modules(plan.changed_sources())
+        self._memory.pop(flow.uid, None)
+        self._checked.pop(flow.uid, None)
+        plan = compile_plan(flow)
+        self.store(plan)
+        self._checked[flow.uid] = (weakref.ref(flow), flow.revision, time.monotonic())
+
+        return plan
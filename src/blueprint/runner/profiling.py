@@ -0,0 +1,275 @@
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from blueprint.runner.remote import RemoteValue
+from blueprint.runner.transport import SharedValue
+
+FLOW_PROFILE_VERSION = 1
+
+
+class CacheStatus:
+    # served from the result cache, or from the checkpoint of a past run
+    HIT = 'hit'
+    RESUMED = 'resumed'
+    # run, its return value cached
+    MISS = 'miss'
+
+
+def value_size(value: Any) -> Optional[int]:
+    '''
+        Approximate size of a value, in bytes: its buffer's size (bytes,
+        NumPy arrays...), or its size along with its items' ones, for the
+        containers (their items' items are not counted)
+
+        None for the values whose size is not known in advance, e.g. the
+        streams and the generators.
+    '''
+    if value is None:
+        return 0
+    if isinstance(value, SharedValue):
+        return sum(value.sizes)
+    if isinstance(value, RemoteValue):
+        return value.size
+
+    try:
+        with memoryview(value) as view:
+            return view.nbytes
+    except TypeError:
+        pass
+
+    if isinstance(value, (str, int, float, bool)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            sys.getsizeof(key) + sys.getsizeof(item) for key, item in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value)
+    if hasattr(value, '__next__') or hasattr(value, '__anext__'):
+        return None
+
+    return sys.getsizeof(value)
+
+
+@dataclass
+class NodeProfile:
+    uid: str
+    label: str
+    # seconds since the epoch
+    start: float
+    # seconds
+    wall: float = 0.0
+    # seconds spent by the thread running the node (None: unknown, e.g.
+    # for the coroutine functions, sharing their thread)
+    cpu: Optional[float] = None
+    # peak of the memory allocated while running the node, in bytes (None:
+    # not traced). The nodes running at once in the same process share the
+    # peak: it's exact only for the nodes running alone (or in a process
+    # pool).
+    memory: Optional[int] = None
+    # bytes, see value_size
+    input_size: Optional[int] = None
+    output_size: Optional[int] = None
+    # see CacheStatus (None: no cache)
+    cache: Optional[str] = None
+    pid: int = 0
+    thread: int = 0
+
+    def toDict(self) -> dict:
+        return {
+            'uid': self.uid,
+            'label': self.label,
+            'start': self.start,
+            'wall': self.wall,
+            'cpu': self.cpu,
+            'memory': self.memory,
+            'inputSize': self.input_size,
+            'outputSize': self.output_size,
+            'cache': self.cache,
+            'pid': self.pid,
+            'thread': self.thread,
+        }
+
+    @staticmethod
+    def fromDict(dictionary: dict) -> 'NodeProfile':
+        return NodeProfile(
+            uid=dictionary['uid'],
+            label=dictionary['label'],
+            start=dictionary['start'],
+            wall=dictionary['wall'],
+            cpu=dictionary.get('cpu'),
+            memory=dictionary.get('memory'),
+            input_size=dictionary.get('inputSize'),
+            output_size=dictionary.get('outputSize'),
+            cache=dictionary.get('cache'),
+            pid=dictionary.get('pid', 0),
+            thread=dictionary.get('thread', 0))
+
+
+def measure(
+        uid: str, label: str, trace_memory: bool,
+        call: Callable[..., Any], *args: Any) -> Tuple[Any, NodeProfile]:
+    '''
+        Call call(*args) (e.g. call_function, in a pool's worker), returning
+        its return value and the profile of the call
+
+        The memory is the peak of the allocations traced during the call:
+        tracemalloc is started for the call if not tracing already (e.g. in
+        a process pool's worker), and stopped after it. It's not measured
+        (None) when tracing already without tracemalloc.reset_peak (Python
+        3.9+), the peak being the one since tracing started.
+    '''
+    started = trace_memory and not tracemalloc.is_tracing()
+    memory_before: Optional[int] = None
+    if started:
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+    elif trace_memory and hasattr(tracemalloc, 'reset_peak'):
+        memory_before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    profile = NodeProfile(
+        uid=uid, label=label, start=time.time(), pid=os.getpid(), thread=threading.get_ident())
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+
+    try:
+        result = call(*args)
+
+        profile.cpu = time.thread_time() - cpu
+        profile.wall = time.perf_counter() - wall
+        if memory_before is not None:
+            profile.memory = max(0, tracemalloc.get_traced_memory()[1] - memory_before)
+    finally:
+        if started:
+            tracemalloc.stop()
+
+    return result, profile
+
+
+def format_size(size: Optional[int]) -> str:
+    if size is None:
+        return '-'
+    for unit in ('B', 'KiB', 'MiB'):
+        if size < 1024:
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+
+    return f'{size:.1f} GiB'
+
+
+def format_time(seconds: Optional[float]) -> str:
+    return '-' if seconds is None else f'{seconds * 1000:.1f}'
+
+
+@dataclass
+class FlowProfile:
+    '''
+        The per-node profile of a flow's run (see FlowRunner's profile),
+        saved as a Chrome trace (chrome://tracing, Perfetto...): one
+        complete event per node, the measures in its arguments
+    '''
+    flow_uid: str
+    flow_name: str
+    # seconds since the epoch
+    start: float
+    wall: float = 0.0
+    # the process coordinating the run
+    pid: int = field(default_factory=os.getpid)
+    # by uid, in the flow's order
+    nodes: Dict[str, NodeProfile] = field(default_factory=dict)
+
+    def add(self, node: NodeProfile) -> None:
+        self.nodes[node.uid] = node
+
+    def hottest(self) -> float:
+        '''
+            The longest wall time of a node, in seconds
+        '''
+        return max((node.wall for node in self.nodes.values()), default=0.0)
+
+    def toTrace(self) -> dict:
+        events: List[dict] = []
+        for pid in sorted({node.pid for node in self.nodes.values()}):
+            events.append({
+                'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+                'args': {'name': 'blueprint' if pid == self.pid else f'worker {pid}'},
+            })
+
+        for node in self.nodes.values():
+            events.append({
+                'name': node.label,
+                'cat': node.cache or 'node',
+                'ph': 'X',
+                'ts': round((node.start - self.start) * 1e6, 3),
+                'dur': round(node.wall * 1e6, 3),
+                'pid': node.pid,
+                'tid': node.thread,
+                'args': node.toDict(),
+            })
+
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': {
+                'version': FLOW_PROFILE_VERSION,
+                'flowUid': self.flow_uid,
+                'flowName': self.flow_name,
+                'start': self.start,
+                'wall': self.wall,
+                'pid': self.pid,
+            },
+        }
+
+    @staticmethod
+    def fromTrace(dictionary: dict) -> 'FlowProfile':
+        other = dictionary.get('otherData', {})
+        if other.get('version') != FLOW_PROFILE_VERSION:
+            raise ValueError('Not a flow profile')
+
+        profile = FlowProfile(
+            flow_uid=other['flowUid'], flow_name=other['flowName'],
+            start=other['start'], wall=other['wall'], pid=other.get('pid', 0))
+        for event in dictionary['traceEvents']:
+            if event.get('ph') == 'X':
+                profile.add(NodeProfile.fromDict(event['args']))
+
+        return profile
+
+    def save(self, filePath: Path) -> None:
+        tmpPath = filePath.with_name(f'{filePath.name}.{os.getpid()}.tmp')
+        with tmpPath.open('w') as fh:
+            fh.write(json.dumps(self.toTrace(), separators=(',', ':')))
+        os.replace(tmpPath, filePath)
+
+    @staticmethod
+    def load(filePath: Path) -> 'FlowProfile':
+        with filePath.open('r') as fh:
+            return FlowProfile.fromTrace(json.load(fh))
+
+    def summary(self) -> str:
+        '''
+            A table of the nodes' measures, the slowest first
+        '''
+        header = ('Node', 'Wall ms', 'CPU ms', 'Memory', 'Input', 'Output', 'Cache')
+        rows = [header]
+        for node in sorted(self.nodes.values(), key=lambda node: node.wall, reverse=True):
+            rows.append((
+                node.label, format_time(node.wall), format_time(node.cpu),
+                format_size(node.memory), format_size(node.input_size),
+                format_size(node.output_size), node.cache or '-'))
+
+        widths = [max(len(row[column]) for row in rows) for column in range(len(header))]
+        lines = ['  '.join(value.ljust(width) if column == 0 else value.rjust(width)
+                           for column, (value, width) in enumerate(zip(row, widths)))
+                 for row in rows]
+        lines.insert(1, '-' * len(lines[0]))
+        lines.append(f'Total: {self.wall * 1000:.1f} ms')
+
+        return '\n'.join(lines)
@@ -0,0 +1,561 @@
+import os
+import pickle
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import Executor, Future
+from logging import Logger, getLogger
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from threading import Condition, Lock, Thread
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+# the authentication key of the coordinator and its workers, hex encoded
+AUTHKEY_VARIABLE = 'BLUEPRINT_AUTHKEY'
+
+# return values smaller than this (pickled) travel back to the coordinator
+REMOTE_THRESHOLD = 64 * 1024
+
+# seconds a worker tries connecting to a coordinator not listening (yet), and a
+# coordinator waits for a worker to connect
+CONNECT_TIMEOUT = 30
+
+Address = Tuple[str, int]
+
+
+class RemoteError(Exception):
+    pass
+
+
+def parse_address(address: str) -> Address:
+    host, _, port = address.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f'Not a host:port address: {address}')
+
+    return host, int(port)
+
+
+def get_authkey() -> Optional[bytes]:
+    authkey = os.environ.get(AUTHKEY_VARIABLE)
+
+    return bytes.fromhex(authkey) if authkey else None
+
+
+class _WorkerState:
+    '''
+        The return values kept by this worker process, served to the other
+        workers (and to the coordinator) by its data server
+    '''
+    uid: str
+    address: Address
+    authkey: bytes
+    # key -> pickled value
+    values: Dict[str, bytes]
+    lock: Lock
+
+    def __init__(self, uid: str, address: Address, authkey: bytes) -> None:
+        self.uid = uid
+        self.address = address
+        self.authkey = authkey
+        self.values = {}
+        self.lock = Lock()
+
+
+# set in the worker processes (see serve)
+_worker: Optional[_WorkerState] = None
+
+# the connections to the workers' data servers, by address
+_peers: Dict[Address, Connection] = {}
+_peers_lock = Lock()
+
+
+class RemoteValue:
+    '''
+        Handle of a return value kept by the worker which produced it: it
+        travels in place of the value, and the nodes (or the coordinator)
+        needing the value fetch it from the worker's data server, unless
+        they run on that worker (see RemoteExecutor's scheduling)
+    '''
+    __slots__ = ('owner', 'address', 'key', 'size')
+
+    # uid of the worker keeping the value
+    owner: str
+    # its data server
+    address: Address
+    key: str
+    # bytes, pickled
+    size: int
+
+    def __init__(self, owner: str, address: Address, key: str, size: int) -> None:
+        self.owner = owner
+        self.address = address
+        self.key = key
+        self.size = size
+
+    def __repr__(self) -> str:
+        return f'RemoteValue({self.owner!r}, {self.key!r}, {self.size} bytes)'
+
+    def _request(self, request: Tuple[Any, ...], reply: bool = True) -> Optional[bytes]:
+        with _peers_lock:
+            connection = _peers.get(self.address)
+            if connection is None:
+                connection = _peers[self.address] = Client(self.address, authkey=_authkey())
+            try:
+                connection.send(request)
+                return connection.recv_bytes() if reply else None
+            except (OSError, EOFError):
+                del _peers[self.address]
+                connection.close()
+                raise
+
+    def load(self) -> Any:
+        if _worker is not None and _worker.uid == self.owner:
+            with _worker.lock:
+                data = _worker.values.get(self.key)
+        else:
+            try:
+                data = self._request(('get', self.key)) or None
+            except (OSError, EOFError) as ex:
+                raise RemoteError(f'Unable to reach the worker keeping {self.key}: {ex}') from ex
+
+        if data is None:
+            raise RemoteError(f'The value {self.key} was lost')
+
+        return pickle.loads(data)
+
+    def unlink(self) -> None:
+        '''
+            Free the value on its worker
+        '''
+        if _worker is not None and _worker.uid == self.owner:
+            with _worker.lock:
+                _worker.values.pop(self.key, None)
+            return
+
+        try:
+            self._request(('drop', self.key), reply=False)
+        except (OSError, EOFError):
+            # the worker is gone, and the value with it
+            pass
+
+
+_coordinator_authkey: Optional[bytes] = None
+
+
+def _authkey() -> bytes:
+    if _worker is not None:
+        return _worker.authkey
+    if _coordinator_authkey is None:
+        raise RemoteError('No coordinator nor worker is running in this process')
+
+    return _coordinator_authkey
+
+
+def keep(value: Any, threshold: int = REMOTE_THRESHOLD) -> Any:
+    '''
+        Keep a return value in this worker, returning its RemoteValue, or
+        the value itself if it's smaller than threshold bytes pickled (or
+        can't be pickled, or this is not a worker process)
+    '''
+    if _worker is None:
+        return value
+
+    try:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return value
+    if len(data) < threshold:
+        return value
+
+    key = uuid.uuid4().hex
+    with _worker.lock:
+        _worker.values[key] = data
+
+    return RemoteValue(_worker.uid, _worker.address, key, len(data))
+
+
+def _serve_values(connection: Connection) -> None:
+    try:
+        while True:
+            request, key = connection.recv()
+            with _worker.lock:
+                if request == 'get':
+                    data = _worker.values.get(key, b'')
+                else:
+                    _worker.values.pop(key, None)
+                    continue
+            connection.send_bytes(data)
+    except (OSError, EOFError):
+        pass
+    finally:
+        connection.close()
+
+
+def _local_host(address: Address) -> str:
+    '''
+        This host's address on the route to address
+    '''
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        # no packet is sent
+        probe.connect(address)
+        return probe.getsockname()[0]
+
+
+def _connect(address: Address, authkey: bytes, timeout: float) -> Connection:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return Client(address, authkey=authkey)
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+
+def serve(address: Address, authkey: bytes, timeout: float = CONNECT_TIMEOUT) -> None:
+    '''
+        Run a worker: pull the nodes to run from the coordinator listening
+        on address (waiting up to timeout seconds for it), until it stops
+    '''
+    global _worker
+    logger = getLogger('RemoteWorker')
+
+    data_listener = Listener((_local_host(address), 0), backlog=64, authkey=authkey)
+    _worker = _WorkerState(uuid.uuid4().hex, data_listener.address, authkey)
+
+    def accept() -> None:
+        while True:
+            try:
+                connection = data_listener.accept()
+            except AuthenticationError:
+                continue
+            except OSError:
+                # closed
+                return
+            Thread(target=_serve_values, args=(connection,), daemon=True).start()
+
+    Thread(target=accept, name='RemoteWorker data', daemon=True).start()
+
+    coordinator = _connect(address, authkey, timeout)
+    coordinator.send(('hello', _worker.uid, _worker.address, os.getpid()))
+    logger.info(f'Connected to {address[0]}:{address[1]}')
+
+    try:
+        while True:
+            message = coordinator.recv()
+            if message[0] == 'stop':
+                break
+
+            _, task, payload = message
+            try:
+                function, args, kwargs = pickle.loads(payload)
+                reply = ('done', task, True, function(*args, **kwargs))
+            except Exception as ex:
+                logger.debug(f'Task {task} failed', exc_info=True)
+                reply = ('done', task, False, ex)
+
+            try:
+                coordinator.send(reply)
+            except Exception as ex:
+                # e.g. an unpicklable exception or return value
+                coordinator.send(('done', task, False, RemoteError(f'Unable to send the result back: {ex!r}')))
+    except EOFError:
+        logger.info('The coordinator is gone')
+    finally:
+        coordinator.close()
+        data_listener.close()
+
+
+class _Task:
+    uid: int
+    future: Future
+    function: Callable
+    args: Tuple[Any, ...]
+    kwargs: Dict[str, Any]
+    attempts: int
+    # the workers it failed on
+    failed_on: Set[str]
+
+    def __init__(self, uid: int, future: Future, function: Callable, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> None:
+        self.uid = uid
+        self.future = future
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.attempts = 0
+        self.failed_on = set()
+
+    def local_bytes(self, worker: str) -> int:
+        '''
+            The size of the task's arguments kept by the worker
+        '''
+        size = 0
+        for arg in list(self.args) + list(self.kwargs.values()):
+            for value in arg.values() if isinstance(arg, dict) else (arg,):
+                if isinstance(value, RemoteValue) and value.owner == worker:
+                    size += value.size
+
+        return size
+
+
+class RemoteExecutor(Executor):
+    '''
+        Run the submitted calls on worker processes, possibly on other
+        hosts, connected to this coordinator over TCP (see serve, and the
+        blueprint-worker command)
+
+        The workers pull the calls: each one gets a call as soon as it's
+        done with the previous one, preferring the calls whose RemoteValue
+        arguments it keeps (data locality), then the oldest ones. A call
+        whose worker disconnects (e.g. crashes) is retried up to retries
+        times, on another worker if any: the exceptions raised by the calls
+        themselves are not retried. The workers authenticate with
+        authkey (HMAC): the calls and their values are pickled, never
+        accept connections from untrusted hosts.
+
+        With workers, that many worker processes are started on this host,
+        along with the external ones connecting. The pending calls fail
+        (with a RemoteError) once no worker is connected and none can
+        connect anymore: the local workers exited, or no worker connected
+        for connect_timeout seconds.
+    '''
+    address: Address
+    retries: int
+    connect_timeout: float
+    logger: Logger
+
+    _authkey: bytes
+    _listener: Listener
+    _condition: Condition
+    _pending: List[_Task]
+    _running: Dict[int, _Task]
+    # uid -> connection of the connected workers
+    _workers: Dict[str, Connection]
+    _processes: List[subprocess.Popen]
+    # pids of the workers which connected
+    _pids: Set[int]
+    _next_task: int
+    _shutdown: bool
+    # since when no worker is connected (None: some are)
+    _idle_since: Optional[float]
+
+    def __init__(
+            self, address: Address = ('127.0.0.1', 0), authkey: Optional[bytes] = None,
+            workers: int = 0, retries: int = 2, project_root: Optional[str] = None,
+            connect_timeout: float = CONNECT_TIMEOUT) -> None:
+        global _coordinator_authkey
+
+        self.retries = retries
+        self.connect_timeout = connect_timeout
+        self.logger = getLogger('RemoteExecutor')
+
+        self._authkey = authkey or get_authkey() or os.urandom(32)
+        _coordinator_authkey = self._authkey
+        self._listener = Listener(address, backlog=64, authkey=self._authkey)
+        self.address = self._listener.address
+        self._condition = Condition()
+        self._pending = []
+        self._running = {}
+        self._workers = {}
+        self._processes = []
+        self._pids = set()
+        self._next_task = 0
+        self._shutdown = False
+        self._idle_since = time.monotonic()
+
+        Thread(target=self._accept, name='RemoteExecutor', daemon=True).start()
+        Thread(target=self._watch, name='RemoteExecutor watchdog', daemon=True).start()
+        self.logger.info(f'Waiting for workers on {self.address[0]}:{self.address[1]}')
+
+        for _ in range(workers):
+            self.start_worker(project_root)
+
+    def start_worker(self, project_root: Optional[str] = None) -> None:
+        '''
+            Start a worker process on this host
+        '''
+        command = [sys.executable, '-m', 'blueprint.bin.worker', f'{self.address[0]}:{self.address[1]}']
+        if project_root:
+            command += ['--project-path', project_root]
+        environment = dict(os.environ)
+        environment[AUTHKEY_VARIABLE] = self._authkey.hex()
+        # the workers import blueprint as this process does
+        environment['PYTHONPATH'] = os.pathsep.join(path for path in sys.path if path)
+
+        self._processes.append(subprocess.Popen(command, env=environment))
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                connection = self._listener.accept()
+            except AuthenticationError as ex:
+                self.logger.warning(f'Refused a worker: {ex}')
+                continue
+            except OSError:
+                return
+            if self._shutdown:
+                connection.close()
+                return
+
+            try:
+                _, uid, _, pid = connection.recv()
+            except (OSError, EOFError, ValueError):
+                connection.close()
+                continue
+
+            with self._condition:
+                self._workers[uid] = connection
+                self._pids.add(pid)
+                self._idle_since = None
+            self.logger.debug(f'Worker {uid} connected (pid {pid})')
+            Thread(target=self._serve_worker, args=(uid, connection), name=f'RemoteExecutor {uid}', daemon=True).start()
+
+    def _watch(self) -> None:
+        '''
+            Fail the pending tasks while no worker can run them
+        '''
+        with self._condition:
+            while not self._shutdown:
+                self._condition.wait(timeout=1)
+                self._fail_unreachable()
+
+    def _fail_unreachable(self) -> None:
+        # with the condition held
+        if self._workers or not self._pending:
+            return
+
+        if self._processes and all(process.poll() is not None for process in self._processes):
+            reason = 'The workers exited'
+        elif self._idle_since is not None and time.monotonic() - self._idle_since >= self.connect_timeout:
+            reason = f'No worker connected for {self.connect_timeout:.0f} seconds'
+        else:
+            # (re)connecting
+            return
+
+        for task in self._pending:
+            if task.attempts or task.future.set_running_or_notify_cancel():
+                task.future.set_exception(RemoteError(reason))
+        self.logger.error(f'{reason}: failing {len(self._pending)} pending task(s)')
+        self._pending = []
+        self._condition.notify_all()
+
+    def _next(self, worker: str) -> Optional[_Task]:
+        '''
+            The next task for the worker (None: shutting down)
+        '''
+        with self._condition:
+            while True:
+                self._pending = [task for task in self._pending if not task.future.cancelled()]
+                # the retried tasks go to other workers, if any
+                candidates = [task for task in self._pending
+                              if worker not in task.failed_on or not set(self._workers) - task.failed_on]
+                if candidates:
+                    # the oldest of the ones with the most local data
+                    task = max(candidates, key=lambda task: (task.local_bytes(worker), -task.uid))
+                    self._pending.remove(task)
+                    if not task.attempts and not task.future.set_running_or_notify_cancel():
+                        continue
+                    self._running[task.uid] = task
+                    self.logger.debug(f'Task {task.uid} on worker {worker} ({task.local_bytes(worker)} local bytes)')
+                    return task
+
+                if self._shutdown:
+                    return None
+                self._condition.wait()
+
+    def _finish(self, task: _Task, worker: str, ok: bool, result: Any, retry: bool = True) -> None:
+        retry = retry and not ok and task.attempts < self.retries
+        with self._condition:
+            self._running.pop(task.uid, None)
+            if retry:
+                task.attempts += 1
+                task.failed_on.add(worker)
+                self._pending.append(task)
+            self._condition.notify_all()
+
+        if retry:
+            self.logger.info(f'Retrying task {task.uid}, which failed: {result!r}')
+        elif ok:
+            task.future.set_result(result)
+        else:
+            task.future.set_exception(result)
+
+    def _serve_worker(self, uid: str, connection: Connection) -> None:
+        task = None
+        try:
+            while True:
+                task = self._next(uid)
+                if task is None:
+                    connection.send(('stop',))
+                    break
+
+                try:
+                    payload = pickle.dumps((task.function, task.args, task.kwargs), protocol=pickle.HIGHEST_PROTOCOL)
+                except Exception as ex:
+                    self._finish(task, uid, False, ex, retry=False)
+                    task = None
+                    continue
+
+                connection.send(('run', task.uid, payload))
+                try:
+                    _, _, ok, result = connection.recv()
+                except (OSError, EOFError):
+                    raise
+                except Exception as ex:
+                    # e.g. the worker's return value can't be unpickled here
+                    ok, result = False, RemoteError(f'Unable to load the result: {ex!r}')
+                # the call's own errors would fail again
+                self._finish(task, uid, ok, result, retry=False)
+                task = None
+        except (OSError, EOFError) as ex:
+            self.logger.warning(f'Lost worker {uid}: {ex!r}')
+            if task is not None:
+                self._finish(task, uid, False, RemoteError(f'Lost the worker running the task: {ex!r}'))
+        finally:
+            connection.close()
+            with self._condition:
+                self._workers.pop(uid, None)
+                if not self._workers:
+                    self._idle_since = time.monotonic()
+                    self._fail_unreachable()
+                self._condition.notify_all()
+
+    def submit(self, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError('Cannot submit calls after shutdown')
+
+            future: Future = Future()
+            self._pending.append(_Task(self._next_task, future, fn, args, kwargs))
+            self._next_task += 1
+            self._condition.notify_all()
+
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self._condition:
+            if cancel_futures:
+                for task in self._pending:
+                    task.future.cancel()
+                self._pending = []
+            if wait:
+                while self._pending or self._running:
+                    self._condition.wait()
+            self._shutdown = True
+            self._condition.notify_all()
+
+        # wake the accepting thread up
+        try:
+            Client(self.address, authkey=self._authkey).close()
+        except OSError:
+            pass
+        self._listener.close()
+
+        for process in self._processes:
+            if process.pid not in self._pids:
+                # still trying to connect
+                process.terminate()
+            if wait:
+                process.wait()
@@ -0,0 +1,248 @@
+import collections.abc
+import re
+import time
+from inspect import isasyncgenfunction, isgeneratorfunction, signature
+from logging import getLogger
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+from blueprint.runner.graph import FlowError
+
+# string return annotations (postponed ones) marking a function as streaming
+_STREAMING_ANNOTATION_RE = re.compile(
+    r'^(typing\.|collections\.abc\.)?(Iterator|Generator)\b')
+
+# how often the blocked producers and consumers check for cancellation
+_POLL_INTERVAL = 0.1
+
+_END = object()
+
+
+def is_streaming(function: Callable) -> bool:
+    '''
+        Whether a function produces its items lazily: generator functions,
+        and functions annotated as returning an Iterator or a Generator
+    '''
+    if isasyncgenfunction(function):
+        return False
+    if isgeneratorfunction(function):
+        return True
+
+    try:
+        annotation = signature(function).return_annotation
+    except (TypeError, ValueError):
+        return False
+    if isinstance(annotation, str):
+        return bool(_STREAMING_ANNOTATION_RE.match(annotation))
+
+    # typing.Iterator[int] and the like
+    origin = getattr(annotation, '__origin__', annotation)
+    return origin in (collections.abc.Iterator, collections.abc.Generator)
+
+
+class StreamError(FlowError):
+    '''
+        The node producing a stream failed
+    '''
+
+
+class Stream:
+    '''
+        The items of a streaming node, as received by one of its dependents
+
+        Items go through a bounded buffer: the producer blocks when it's
+        full, so that the memory used depends on the buffer's size rather
+        than on the number of items. They're handed over in chunks of a
+        quarter of the buffer, not to pay the threads' synchronization for
+        each one of them; a chunk is sent early when the producer is slow.
+        A stream can be iterated once.
+    '''
+    CHUNKS = 4
+
+    chunk_size: int
+    closed: bool
+
+    _queue: Queue
+    _cancelled: Event
+    # producer side
+    _pending: List[Any]
+    _last_flush: float
+    # consumer side
+    _chunk: List[Any]
+    _position: int
+    # StopIteration, or the producer's error, once received
+    _end: Optional[Exception]
+
+    def __init__(self, buffer_size: int, cancelled: Event) -> None:
+        self.chunk_size = max(1, buffer_size // self.CHUNKS)
+        self.closed = False
+
+        self._queue = Queue(maxsize=max(1, buffer_size // self.chunk_size))
+        self._cancelled = cancelled
+        self._pending = []
+        self._last_flush = 0.0
+        self._chunk = []
+        self._position = 0
+        self._end = None
+
+    def __iter__(self) -> Iterator[Any]:
+        return self
+
+    def __next__(self) -> Any:
+        while self._position >= len(self._chunk):
+            self._chunk = self._get()
+            self._position = 0
+
+        item = self._chunk[self._position]
+        self._position += 1
+
+        return item
+
+    def _get(self) -> List[Any]:
+        # iterators keep raising StopIteration once exhausted
+        if self._end is not None:
+            raise self._end
+
+        while True:
+            if self._cancelled.is_set():
+                raise StreamError('The flow run was cancelled')
+            try:
+                chunk = self._queue.get(timeout=_POLL_INTERVAL)
+                break
+            except Empty:
+                continue
+
+        if chunk is _END:
+            self._end = StopIteration()
+        elif isinstance(chunk, StreamError):
+            self._end = chunk
+        if self._end is not None:
+            self.closed = True
+            raise self._end
+
+        return chunk
+
+    def _put(self, chunk: Any) -> None:
+        while not self.closed and not self._cancelled.is_set():
+            try:
+                self._queue.put(chunk, timeout=_POLL_INTERVAL)
+                return
+            except Full:
+                continue
+
+    def flush(self) -> None:
+        if self._pending:
+            chunk = self._pending
+            self._pending = []
+            self._put(chunk)
+        self._last_flush = time.monotonic()
+
+    def put(self, item: Any) -> None:
+        '''
+            Buffer an item, blocking while the buffer is full (items are
+            dropped once the dependent doesn't read anymore)
+        '''
+        self._pending.append(item)
+        if len(self._pending) >= self.chunk_size or time.monotonic() - self._last_flush >= _POLL_INTERVAL:
+            self.flush()
+
+    def end(self, error: Optional[StreamError] = None) -> None:
+        '''
+            The producer is done, or failed
+        '''
+        self.flush()
+        self._put(_END if error is None else error)
+
+    def close(self) -> None:
+        '''
+            The dependent is done reading, whether the stream ended or not
+        '''
+        self.closed = True
+        self._pending = []
+
+
+class StreamPump:
+    '''
+        Pull a streaming node's items in a dedicated thread, feeding one
+        stream per dependent (the slowest dependent sets the pace), and
+        collecting them if the node is one of the flow's outputs
+
+        Pumps don't take the pool's threads, so that streaming stages
+        can't starve the consumers they're feeding.
+    '''
+    label: str
+    items: Iterable[Any]
+    streams: List[Stream]
+    # the streams the node reads from, closed once it's done
+    inputs: List[Stream]
+    # the items, for outputs
+    collected: Optional[List[Any]]
+    error: Optional[StreamError]
+    # seconds spent pulling the items, and when the pump stopped (since the epoch)
+    cpu: float
+    ended: Optional[float]
+
+    _cancelled: Event
+    _thread: Thread
+
+    def __init__(
+            self, label: str, items: Iterable[Any], streams: List[Stream],
+            cancelled: Event, inputs: Optional[List[Stream]] = None, collect: bool = False) -> None:
+        self.label = label
+        self.items = items
+        self.streams = streams
+        self.inputs = inputs or []
+        self.collected = [] if collect else None
+        self.error = None
+        self.cpu = 0.0
+        self.ended = None
+
+        self._cancelled = cancelled
+        self._thread = Thread(target=self.run, name=f'StreamPump {label}', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def join(self) -> None:
+        self._thread.join()
+
+    def run(self) -> None:
+        iterator = None
+        cpu = time.thread_time()
+        try:
+            iterator = iter(self.items)
+            for item in iterator:
+                if self._cancelled.is_set():
+                    break
+                if self.collected is not None:
+                    self.collected.append(item)
+                elif all(stream.closed for stream in self.streams):
+                    break
+
+                for stream in self.streams:
+                    stream.put(item)
+        except Exception as ex:
+            getLogger('StreamPump').debug(f'{self.label} failed', exc_info=True)
+            if isinstance(ex, StreamError):
+                # an upstream node's failure
+                self.error = ex
+            else:
+                self.error = StreamError(f'{self.label} failed: {ex!r}')
+                self.error.__cause__ = ex
+            for stream in self.streams:
+                stream.end(self.error)
+
+            return
+        finally:
+            # e.g. run the generator's finally clauses
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+            for stream in self.inputs:
+                stream.close()
+            self.cpu = time.thread_time() - cpu
+            self.ended = time.time()
+
+        for stream in self.streams:
+            stream.end()
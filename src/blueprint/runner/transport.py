@@ -0,0 +1,133 @@
+import pickle
+from typing import Any, Dict, List
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python 3.7: values are always pickled through the pool's pipes
+    shared_memory = None
+
+# values smaller than this go through the pool's pipes
+SHARED_MEMORY_THRESHOLD = 1024 ** 2
+
+# shared memory blocks mapped by this process, by name
+_attached: Dict[str, Any] = {}
+
+
+class SharedValue:
+    '''
+        Handle of a value stored in a shared memory block, which travels
+        between the processes in place of the value itself
+
+        The block holds the value's pickle, followed by its out-of-band
+        buffers (pickle protocol 5: NumPy arrays, bytearrays...), which are
+        handed to the processes loading the value by reference, as views
+        of the block. bytes are copied out of the block once (a bytes
+        object can't wrap foreign memory), memoryviews are not.
+    '''
+    __slots__ = ('name', 'kind', 'sizes')
+
+    PICKLE = 'pickle'
+    BYTES = 'bytes'
+    VIEW = 'memoryview'
+
+    name: str
+    kind: str
+    # size of each buffer in the block, the pickle first (PICKLE kind)
+    sizes: List[int]
+
+    def __init__(self, name: str, kind: str, sizes: List[int]) -> None:
+        self.name = name
+        self.kind = kind
+        self.sizes = sizes
+
+    def __repr__(self) -> str:
+        return f'SharedValue({self.name!r}, {self.kind!r}, {sum(self.sizes)} bytes)'
+
+    def load(self) -> Any:
+        block = _attached.get(self.name)
+        if block is None:
+            block = _attached[self.name] = shared_memory.SharedMemory(name=self.name)
+
+        buffers = []
+        offset = 0
+        for size in self.sizes:
+            buffers.append(block.buf[offset:offset + size])
+            offset += size
+
+        if self.kind == SharedValue.BYTES:
+            return bytes(buffers[0])
+        if self.kind == SharedValue.VIEW:
+            return buffers[0]
+
+        return pickle.loads(buffers[0], buffers=buffers[1:])
+
+    def unlink(self) -> None:
+        '''
+            Free the block once the processes which mapped it release it
+            (views of it stay valid until then)
+        '''
+        block = _attached.get(self.name)
+        try:
+            if block is None:
+                block = shared_memory.SharedMemory(name=self.name)
+                block.unlink()
+                block.close()
+            else:
+                block.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def share(value: Any, threshold: int = SHARED_MEMORY_THRESHOLD) -> Any:
+    '''
+        Move a value to a shared memory block, returning its SharedValue,
+        or the value itself if it's smaller than threshold bytes (or can't
+        be pickled)
+    '''
+    if shared_memory is None:
+        return value
+
+    if type(value) is bytes:
+        kind = SharedValue.BYTES
+        buffers = [memoryview(value)]
+    elif type(value) is memoryview:
+        if not value.contiguous:
+            return value
+        kind = SharedValue.VIEW
+        buffers = [value.cast('B')]
+    else:
+        kind = SharedValue.PICKLE
+        pickle_buffers: List[pickle.PickleBuffer] = []
+        try:
+            data = pickle.dumps(value, protocol=5, buffer_callback=pickle_buffers.append)
+            buffers = [memoryview(data)] + [buffer.raw() for buffer in pickle_buffers]
+        except Exception:
+            # e.g. non-contiguous buffers: let the pool deal with the value
+            return value
+
+    sizes = [buffer.nbytes for buffer in buffers]
+    if not sum(sizes) or sum(sizes) < threshold:
+        return value
+
+    block = shared_memory.SharedMemory(create=True, size=sum(sizes))
+    offset = 0
+    for buffer in buffers:
+        block.buf[offset:offset + buffer.nbytes] = buffer
+        offset += buffer.nbytes
+    block.close()
+
+    return SharedValue(block.name, kind, sizes)
+
+
+def release_blocks() -> None:
+    '''
+        Unmap the shared memory blocks no value of this process uses anymore
+    '''
+    for name, block in list(_attached.items()):
+        try:
+            block.close()
+        except BufferError:
+            # views of the block are still alive
+            continue
+        del _attached[name]
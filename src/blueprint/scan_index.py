@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from blueprint.models import BLUEPRINT_FOLDER_NAME, Function
+
+SCAN_INDEX_VERSION = 1
+
+
+def file_hash(path: Path) -> str:
+    return hashlib.sha1(path.read_bytes()).hexdigest()
+
+
+class ScanIndex:
+    '''
+        On-disk index of the scanned modules, stored in the project's
+        .blueprint folder
+
+        Each module is recorded along with its source file's path, size,
+        modification time and content hash, and the functions extracted
+        from it. A module is considered unchanged (and its functions are
+        taken from the index) if its size and mtime match, or if its
+        content hash does.
+
+        The index is discarded if it was written with another scan mode, or
+        with or without lazy signatures (see functions_scanner).
+    '''
+    filePath: Path
+    mode: str
+    lazy: bool
+    entries: Dict[str, dict]
+    logger: Logger
+
+    _dirty: bool
+
+    def __init__(self, filePath: Path, mode: str, lazy: bool = False, load: bool = True) -> None:
+        self.filePath = filePath.absolute()
+        self.mode = mode
+        self.lazy = lazy
+        self.entries = {}
+        self.logger = getLogger('ScanIndex')
+        self._dirty = False
+
+        if load:
+            self.load()
+
+    @staticmethod
+    def get_index_path(project_path: Path) -> Path:
+        return project_path.joinpath(BLUEPRINT_FOLDER_NAME, 'scan_index.json')
+
+    def load(self) -> None:
+        if not self.filePath.exists():
+            return
+
+        try:
+            with self.filePath.open('r') as fh:
+                dictionary = json.load(fh)
+        except (OSError, ValueError) as ex:
+            self.logger.warning(f'Discarding unreadable scan index: {ex}')
+            return
+
+        # the functions found depend on the scanner's version and mode
+        if dictionary.get('version') != SCAN_INDEX_VERSION \
+                or dictionary.get('mode') != self.mode \
+                or dictionary.get('lazy', False) != self.lazy:
+            self._dirty = True
+            return
+
+        self.entries = dictionary.get('modules', {})
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+
+        bpDir = self.filePath.parent
+        if not bpDir.exists():
+            os.mkdir(bpDir)
+
+        tmpPath = self.filePath.with_name(self.filePath.name + '.tmp')
+        with tmpPath.open('w') as fh:
+            # dumps goes through the C encoder, dump doesn't
+            fh.write(json.dumps({
+                'version': SCAN_INDEX_VERSION,
+                'mode': self.mode,
+                'lazy': self.lazy,
+                'modules': self.entries,
+            }, separators=(',', ':')))
+        os.replace(tmpPath, self.filePath)
+
+        self._dirty = False
+
+    def lookup(self, module: str, source_path: Optional[Path]) -> Optional[List[Function]]:
+        '''
+            Return the module's indexed functions, or None if the module
+            is unknown or its source has changed since it was indexed
+        '''
+        entry = self.entries.get(module)
+        if entry is None or source_path is None or entry['path'] != str(source_path):
+            return None
+
+        try:
+            stat = source_path.stat()
+            if stat.st_size != entry['size']:
+                return None
+            if stat.st_mtime_ns != entry['mtime']:
+                # touched, but possibly unchanged
+                if file_hash(source_path) != entry['hash']:
+                    return None
+                entry['mtime'] = stat.st_mtime_ns
+                self._dirty = True
+        except OSError:
+            return None
+
+        return [Function.fromDict(function) for function in entry['functions']]
+
+    def store(self, module: str, source_path: Optional[Path], functions: List[Function]) -> None:
+        if source_path is None:
+            return
+
+        try:
+            stat = source_path.stat()
+            self.entries[module] = {
+                'path': str(source_path),
+                'size': stat.st_size,
+                'mtime': stat.st_mtime_ns,
+                'hash': file_hash(source_path),
+                'functions': [function.toDict() for function in functions],
+            }
+            self._dirty = True
+        except OSError as ex:
+            self.logger.warning(f'Unable to index module {module}: {ex}')
+
+    def discard(self, module: str) -> None:
+        if self.entries.pop(module, None) is not None:
+            self._dirty = True
+
+    def retain(self, modules: Iterable[str]) -> None:
+        '''
+            Drop the modules which are not part of the project anymore
+        '''
+        modules = set(modules)
+        for module in [module for module in self.entries if module not in modules]:
+            self.discard(module)
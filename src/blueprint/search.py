@@ -0,0 +1,325 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from blueprint.models import Function, FunctionCatalog
+
+_WORDS_RE = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+')
+
+
+def initials(name: str) -> str:
+    '''
+        The initials of a function name's words, either snake or camel cased,
+        e.g. "gtlp" for get_top_level_packages or getTopLevelPackages
+    '''
+    return ''.join(word[0] for word in _WORDS_RE.findall(name)).lower()
+
+
+def _ngrams(text: str, n: int) -> Set[str]:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class _NgramIndex:
+    '''
+        Bigram and trigram index of a set of strings, for substring searches
+    '''
+    keys: List[str]
+    # bigram or trigram -> keys containing it
+    _ngrams: Dict[str, List[str]]
+
+    def __init__(self, keys: Iterable[str] = ()) -> None:
+        self.keys = []
+        self._ngrams = {}
+
+        for key in keys:
+            self.add(key)
+
+    def add(self, key: str) -> None:
+        self.keys.append(key)
+
+        ngrams = self._ngrams
+        for ngram in _ngrams(key, 2) | _ngrams(key, 3):
+            posting = ngrams.get(ngram)
+            if posting is None:
+                ngrams[ngram] = [key]
+            else:
+                posting.append(key)
+
+    def search(self, query: str) -> List[str]:
+        if len(query) < 2:
+            return [key for key in self.keys if query in key]
+        if len(query) == 2:
+            return self._ngrams.get(query, [])
+
+        candidates: Optional[List[str]] = None
+        for trigram in _ngrams(query, 3):
+            posting = self._ngrams.get(trigram)
+            if posting is None:
+                return []
+            if candidates is None or len(posting) < len(candidates):
+                candidates = posting
+
+        return [key for key in candidates if query in key]
+
+
+class _CharacterIndex:
+    '''
+        Bitmaps of the keys containing each character, for subsequence
+        searches: a key can only match if it contains all of the query's
+        characters
+
+        The bitmaps are bytearrays (bit i for the i-th key), turned into
+        integers on first use after a change, to be intersected at once.
+    '''
+    keys: List[str]
+    _bits: Dict[str, bytearray]
+    _masks: Dict[str, int]
+
+    def __init__(self, keys: Iterable[str] = ()) -> None:
+        self.keys = []
+        self._bits = {}
+        self._masks = {}
+
+        for key in keys:
+            self.add(key)
+
+    def add(self, key: str) -> None:
+        byte, bit = divmod(len(self.keys), 8)
+        self.keys.append(key)
+
+        for char in set(key):
+            bits = self._bits.get(char)
+            if bits is None:
+                self._bits[char] = bits = bytearray()
+            if len(bits) <= byte:
+                bits.extend(bytes(byte + 1 - len(bits)))
+            bits[byte] |= 1 << bit
+            self._masks.pop(char, None)
+
+    def candidates(self, query: str) -> List[str]:
+        '''
+            The keys containing all of the query's characters
+        '''
+        mask = -1
+        for char in set(query):
+            char_mask = self._masks.get(char)
+            if char_mask is None:
+                bits = self._bits.get(char)
+                if bits is None:
+                    return []
+                self._masks[char] = char_mask = int.from_bytes(bits, 'little')
+            mask &= char_mask
+        if mask == -1:
+            return list(self.keys)
+
+        # the binary digits from the lowest bit, i.e. one per key
+        digits = bin(mask)[:1:-1]
+        keys = self.keys
+
+        return [keys[match.start()] for match in _ONE_RE.finditer(digits)]
+
+
+_ONE_RE = re.compile('1')
+
+
+class FunctionSearchIndex:
+    '''
+        Search index over the catalog's functions, for the functions filter
+
+        A function matches a query if (case insensitively):
+        - the query is a substring of its fully qualified name
+          (n-gram indexes of the distinct module paths and names)
+        - the query is a prefix of its name's initials, e.g. "gtl" or "gTL"
+          for get_top_level_packages (initials table)
+        - fuzzy matching only, when the query has fewer than
+          FUZZY_THRESHOLD matches otherwise: the query's characters appear
+          in order in its name (a regular expression run over the distinct
+          names containing all of them, see _CharacterIndex, narrowed down
+          while the query is being typed)
+
+        Module paths and names are indexed once however many functions
+        share them. The index is updated along with the catalog (see add
+        and discard); removed ids are filtered out at query time, and
+        purged once they accumulate.
+    '''
+    catalog: FunctionCatalog
+
+    # lowercase module path -> ids
+    _modules: Dict[str, array]
+    _module_keys: _NgramIndex
+    # lowercase name -> ids
+    _names: Dict[str, array]
+    _name_keys: _NgramIndex
+    # initials -> ids, and the sorted initials for prefix searches
+    _initials: Dict[str, array]
+    _sorted_initials: Optional[List[str]]
+    # the names' characters for fuzzy searches, and the last fuzzy query
+    # with its matching names
+    _name_chars: _CharacterIndex
+    _last_fuzzy: Optional[Tuple[str, List[str]]]
+
+    _removed: Set[int]
+
+    PURGE_THRESHOLD = 1024
+    FUZZY_THRESHOLD = 100
+
+    def __init__(self, catalog: FunctionCatalog) -> None:
+        self.catalog = catalog
+        self._modules = {}
+        self._module_keys = _NgramIndex()
+        self._names = {}
+        self._name_keys = _NgramIndex()
+        self._initials = {}
+        self._sorted_initials = None
+        self._name_chars = _CharacterIndex()
+        self._last_fuzzy = None
+        self._removed = set()
+
+        self.add(catalog.ids())
+
+    @staticmethod
+    def text(fn: Function) -> str:
+        return FunctionCatalog.qualified_name(fn.module, fn.name).lower()
+
+    def add(self, ids: Iterable[int]) -> None:
+        '''
+            Index the catalog's functions with the given (new) ids
+        '''
+        for id in ids:
+            fn = self.catalog[id]
+
+            module = fn.module.lower()
+            posting = self._modules.get(module)
+            if posting is None:
+                self._modules[module] = posting = array('i')
+                self._module_keys.add(module)
+            posting.append(id)
+
+            name = fn.name.lower()
+            posting = self._names.get(name)
+            if posting is None:
+                self._names[name] = posting = array('i')
+                self._name_keys.add(name)
+                self._name_chars.add(name)
+                self._last_fuzzy = None
+            posting.append(id)
+
+            key = initials(fn.name)
+            posting = self._initials.get(key)
+            if posting is None:
+                self._initials[key] = posting = array('i')
+                self._sorted_initials = None
+            posting.append(id)
+
+    def discard(self, ids: Iterable[int]) -> None:
+        '''
+            Forget the functions with the given ids, removed from the catalog
+        '''
+        self._removed.update(ids)
+
+        if len(self._removed) > self.PURGE_THRESHOLD \
+                and len(self._removed) * 4 > len(self.catalog):
+            self._purge()
+
+    def _purge(self) -> None:
+        removed = self._removed
+        for index in (self._modules, self._names, self._initials):
+            for key in list(index):
+                posting = array('i', (id for id in index[key] if id not in removed))
+                if posting:
+                    index[key] = posting
+                else:
+                    index.pop(key)
+
+        self._module_keys = _NgramIndex(self._modules)
+        self._name_keys = _NgramIndex(self._names)
+        self._name_chars = _CharacterIndex(self._names)
+        self._sorted_initials = None
+        self._last_fuzzy = None
+        self._removed = set()
+
+    def _valid(self, ids: Iterable[int]) -> Iterable[int]:
+        if not self._removed:
+            return ids
+
+        return (id for id in ids if id not in self._removed)
+
+    def _ids(self, postings: Dict[str, array], keys: Iterable[str]) -> Iterable[int]:
+        # chained at C speed: broad queries match thousands of keys
+        return self._valid(chain.from_iterable(map(postings.__getitem__, keys)))
+
+    def search_substring(self, query: str) -> Set[int]:
+        query = query.lower()
+        result: Set[int] = set()
+
+        # names can't contain dots, so the query's last dot (if any) is
+        # either within the module path or the one joining it to the name
+        head, dot, tail = query.rpartition('.')
+        if not dot:
+            result.update(self._ids(self._modules, self._module_keys.search(query)))
+            result.update(self._ids(self._names, self._name_keys.search(query)))
+
+            return result
+
+        if not head:
+            if not tail:
+                return set(self.catalog.ids())
+
+            result.update(self._ids(self._modules, self._module_keys.search(query)))
+            result.update(self._ids(self._names, [
+                name for name in self._name_keys.search(tail) if name.startswith(tail)]))
+
+            return result
+
+        for module in self._module_keys.search(head):
+            if query in module:
+                result.update(self._valid(self._modules[module]))
+            elif module.endswith(head):
+                result.update(id for id in self._valid(self._modules[module])
+                              if self.catalog[id].name.lower().startswith(tail))
+
+        return result
+
+    def search_initials(self, query: str) -> Set[int]:
+        query = query.lower()
+        if self._sorted_initials is None:
+            self._sorted_initials = sorted(self._initials)
+
+        keys = self._sorted_initials
+        start = bisect_left(keys, query)
+        end = bisect_right(keys, query + '\uffff', start)
+
+        return set(self._ids(self._initials, keys[start:end]))
+
+    def search_fuzzy(self, query: str) -> Set[int]:
+        query = query.lower()
+        # the query's characters, in order
+        pattern = re.compile('.*?'.join(re.escape(char) for char in query))
+
+        if self._last_fuzzy is not None and query.startswith(self._last_fuzzy[0]):
+            # the query is being typed: only the last matches can match
+            candidates = self._last_fuzzy[1]
+        else:
+            candidates = self._name_chars.candidates(query)
+        names = [name for name in candidates if pattern.search(name)]
+        self._last_fuzzy = (query, names)
+
+        return set(self._ids(self._names, names))
+
+    def search(self, query: str, fuzzy: bool = True) -> Set[int]:
+        '''
+            The ids of the functions matching the query (see the class' doc)
+        '''
+        if not query:
+            return set(self.catalog.ids())
+
+        result = self.search_substring(query)
+        if query.isalnum():
+            result |= self.search_initials(query)
+            # a fallback, for the queries matching few functions otherwise
+            if fuzzy and len(query) > 2 and len(result) < self.FUZZY_THRESHOLD:
+                result |= self.search_fuzzy(query)
+
+        return result
@@ -0,0 +1,259 @@
+import dataclasses
+import typing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, Type, TypeVar
+
+T = TypeVar('T')
+
+# the values passed as they are
+_SCALARS = (str, int, float, bool, type(None), Any, object)
+
+
+@dataclass(frozen=True)
+class Field:
+    '''
+        A serialized attribute of a class
+
+        The attribute's type tells how it's converted: the scalars (and
+        Any) are kept as they are, Path becomes a string, the classes with
+        a schema (see fields) become dictionaries, and the List, Tuple,
+        Dict and Optional types of those are converted item by item.
+        encode and decode replace the conversion, e.g. for a custom shape.
+    '''
+    name: str
+    type: Any = Any
+    # the dictionary's key (default: the name)
+    key: Optional[str] = None
+    encode: Optional[Callable[[Any], Any]] = None
+    decode: Optional[Callable[[Any], Any]] = None
+    # whether the key can be missing, the attribute keeping its default
+    optional: bool = False
+
+    @property
+    def dict_key(self) -> str:
+        return self.key or self.name
+
+
+def has_schema(cls: Any) -> bool:
+    return isinstance(cls, type) and ('FIELDS' in vars(cls) or dataclasses.is_dataclass(cls))
+
+
+def fields(cls: type) -> Tuple[Field, ...]:
+    '''
+        The serialized fields of a class: its FIELDS, in their order, or
+        its dataclass fields (typed by their annotations)
+    '''
+    if 'FIELDS' in vars(cls):
+        return tuple(cls.FIELDS)
+
+    hints = typing.get_type_hints(cls)
+    return tuple(
+        Field(field.name, hints.get(field.name, Any), optional=(
+            field.default is not dataclasses.MISSING or field.default_factory is not dataclasses.MISSING))
+        for field in dataclasses.fields(cls))
+
+
+class _Generator:
+    '''
+        Source code of the functions converting a class' instances, the
+        objects they use (converters, classes) bound in the namespace
+    '''
+    namespace: Dict[str, Any]
+
+    def __init__(self) -> None:
+        self.namespace = {}
+        self._depth = 0
+
+    def bind(self, value: Any) -> str:
+        name = f'_{len(self.namespace)}'
+        self.namespace[name] = value
+
+        return name
+
+    def variable(self) -> str:
+        self._depth += 1
+
+        return f'v{self._depth}'
+
+    def encode(self, type_: Any, expression: str) -> str:
+        origin = getattr(type_, '__origin__', None)
+        arguments = getattr(type_, '__args__', ())
+
+        if type_ in _SCALARS or isinstance(type_, TypeVar):
+            return expression
+        if origin is typing.Union:
+            others = [argument for argument in arguments if argument is not type(None)]
+            if len(others) == 1:
+                return f'(None if {expression} is None else {self.encode(others[0], expression)})'
+            return expression
+        if origin in (list, tuple, set, frozenset):
+            item = arguments[0] if arguments else Any
+            if item in _SCALARS:
+                return f'list({expression})'
+            variable = self.variable()
+            return f'[{self.encode(item, variable)} for {variable} in {expression}]'
+        if origin is dict:
+            item = arguments[1] if len(arguments) == 2 else Any
+            if item in _SCALARS:
+                return f'dict({expression})'
+            key, variable = self.variable(), self.variable()
+            return f'{{{key}: {self.encode(item, variable)} for {key}, {variable} in {expression}.items()}}'
+        if type_ is Path:
+            return f'str({expression})'
+        if has_schema(type_):
+            return f'{self.bind(encoder(type_))}({expression})'
+
+        return expression
+
+    def decode(self, type_: Any, expression: str) -> str:
+        origin = getattr(type_, '__origin__', None)
+        arguments = getattr(type_, '__args__', ())
+
+        if type_ in _SCALARS or isinstance(type_, TypeVar):
+            return expression
+        if origin is typing.Union:
+            others = [argument for argument in arguments if argument is not type(None)]
+            if len(others) == 1:
+                return f'(None if {expression} is None else {self.decode(others[0], expression)})'
+            return expression
+        if origin in (list, tuple, set, frozenset):
+            item = arguments[0] if arguments else Any
+            if item in _SCALARS:
+                return f'{self.bind(origin)}({expression})'
+            variable = self.variable()
+            items = f'[{self.decode(item, variable)} for {variable} in {expression}]'
+            return items if origin is list else f'{self.bind(origin)}({items})'
+        if origin is dict:
+            item = arguments[1] if len(arguments) == 2 else Any
+            if item in _SCALARS:
+                return f'dict({expression})'
+            key, variable = self.variable(), self.variable()
+            return f'{{{key}: {self.decode(item, variable)} for {key}, {variable} in {expression}.items()}}'
+        if type_ is Path:
+            return f'{self.bind(Path)}({expression})'
+        if has_schema(type_):
+            return f'{self.bind(decoder(type_))}({expression})'
+
+        return expression
+
+    def encode_field(self, field: Field, expression: str) -> str:
+        if field.encode is not None:
+            return f'{self.bind(field.encode)}({expression})'
+
+        return self.encode(field.type, expression)
+
+    def decode_field(self, field: Field, expression: str) -> str:
+        if field.decode is not None:
+            return f'{self.bind(field.decode)}({expression})'
+
+        return self.decode(field.type, expression)
+
+    def compile(self, source: str, cls: type, kind: str) -> Callable:
+        exec(compile(source, f'<{kind} of {cls.__qualname__}>', 'exec'), self.namespace)
+
+        return self.namespace[kind]
+
+
+_encoders: Dict[type, Callable[[Any], dict]] = {}
+_decoders: Dict[type, Callable[[dict], Any]] = {}
+_updaters: Dict[type, Callable[[Any, dict], None]] = {}
+
+
+def encoder(cls: type) -> Callable[[Any], dict]:
+    '''
+        The function converting the class' instances to dictionaries,
+        generated on first use
+    '''
+    function = _encoders.get(cls)
+    if function is None:
+        generator = _Generator()
+        items = ', '.join(f'{field.dict_key!r}: {generator.encode_field(field, f"obj.{field.name}")}'
+                          for field in fields(cls))
+        function = _encoders[cls] = generator.compile(
+            f'def encode(obj):\n    return {{{items}}}\n', cls, 'encode')
+
+    return function
+
+
+def decoder(cls: Type[T]) -> Callable[[dict], T]:
+    '''
+        The function building the class' instances from dictionaries (the
+        fields being passed as keyword arguments), generated on first use
+    '''
+    function = _decoders.get(cls)
+    if function is None:
+        generator = _Generator()
+        cls_name = generator.bind(cls)
+        required = [field for field in fields(cls) if not field.optional]
+        optional = [field for field in fields(cls) if field.optional]
+
+        lines = ['def decode(d):']
+        items = ', '.join(f'{field.name!r}: {generator.decode_field(field, f"d[{field.dict_key!r}]")}'
+                          for field in required)
+        lines.append(f'    kwargs = {{{items}}}')
+        for field in optional:
+            key = repr(field.dict_key)
+            lines.append(f'    if {key} in d:')
+            lines.append(f'        kwargs[{field.name!r}] = {generator.decode_field(field, f"d[{key}]")}')
+        lines.append(f'    return {cls_name}(**kwargs)')
+        function = _decoders[cls] = generator.compile('\n'.join(lines) + '\n', cls, 'decode')
+
+    return function
+
+
+def updater(cls: type) -> Callable[[Any, dict], None]:
+    '''
+        The function setting an instance's attributes from a dictionary's
+        keys, generated on first use: the nested objects with a schema are
+        updated in place
+    '''
+    function = _updaters.get(cls)
+    if function is None:
+        generator = _Generator()
+        lines = ['def update(obj, d):']
+        for field in fields(cls):
+            key = repr(field.dict_key)
+            lines.append(f'    if {key} in d:')
+            if field.decode is None and has_schema(field.type):
+                lines.append(f'        if obj.{field.name} is not None:')
+                lines.append(f'            {generator.bind(updater(field.type))}(obj.{field.name}, d[{key}])')
+                lines.append('        else:')
+                lines.append(f'            obj.{field.name} = {generator.decode_field(field, f"d[{key}]")}')
+            else:
+                lines.append(f'        obj.{field.name} = {generator.decode_field(field, f"d[{key}]")}')
+        lines.append('    return obj')
+        function = _updaters[cls] = generator.compile('\n'.join(lines) + '\n', cls, 'update')
+
+    return function
+
+
+def to_dict(obj: Any) -> dict:
+    return encoder(type(obj))(obj)
+
+
+def from_dict(cls: Type[T], dictionary: dict) -> T:
+    return decoder(cls)(dictionary)
+
+
+def update_from_dict(obj: T, dictionary: dict) -> T:
+    return updater(type(obj))(obj, dictionary)
+
+
+class Serializable:
+    '''
+        Dictionary conversion of the classes declaring their FIELDS (see
+        Field), through functions generated once per class
+    '''
+    FIELDS: Tuple[Field, ...] = ()
+
+    def toDict(self) -> dict:
+        return to_dict(self)
+
+    def fromDict(self: T, dictionary: dict) -> T:
+        '''
+            Update the object from a dictionary (the missing keys leave
+            their attribute untouched)
+        '''
+        return update_from_dict(self, dictionary)
+
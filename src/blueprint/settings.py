@@ -1,12 +1,14 @@
-import inspect
 import os
+from concurrent.futures import ThreadPoolExecutor
 from logging import Logger, getLogger
 from pathlib import Path
-from typing import Any, Optional, Type, TypeVar
+from typing import Optional
 
 import yaml
 
 from blueprint.decorators import autoemit
+from blueprint.models import BLUEPRINT_FOLDER_NAME
+from blueprint.serialization import Field, Serializable
 
 try:
     from yaml import CDumper as Dumper
@@ -14,47 +16,10 @@ try:
 except ImportError:
     from yaml import Loader, Dumper
 
-from PySide6.QtCore import QObject, Signal, SignalInstance
+from PySide6.QtCore import QCoreApplication, QObject, QTimer, Signal
 
-BLUEPRINT_FOLDER_NAME = '.blueprint'
-T = TypeVar('T')
 
-
-class DictConvertible:
-    @staticmethod
-    def scalarValue(value) -> Any:
-        if type(value) in [str, int, float, bool] or value is None:
-            return value
-
-        return str(value)
-
-    def fromDict(self: Type[T], dictionary: dict) -> T:
-        for member in inspect.getmembers(self):
-            name, _ = member
-            if name in dictionary:
-                setattr(self, name, dictionary[name])
-
-    def toDict(self, subElement: Any = None) -> dict:
-        obj = {}
-        objToDict = subElement if subElement else self
-
-        for key, value in objToDict.__dict__.items():
-            if isinstance(value, Signal) or key in ['filePath', 'logger']:
-                continue
-
-            if callable(getattr(value, 'toDict', None)):
-                obj[key] = value.toDict()
-            elif type(value) is list:
-                listValues = []
-                for val in value:
-                    listValues.append(self.toDict(val))
-            else:
-                obj[key] = DictConvertible.scalarValue(value)
-
-        return obj
-
-
-class UI(QObject, DictConvertible):
+class UI(QObject, Serializable):
     viewFlowsChanged = Signal(bool)
     viewFunctionsChanged = Signal(bool)
     viewObjectPropertiesChanged = Signal(bool)
@@ -64,6 +29,12 @@ class UI(QObject, DictConvertible):
     viewObjectProperties = autoemit(
         'viewObjectProperties', 'viewObjectPropertiesChanged', bool)
 
+    FIELDS = (
+        Field('viewFlows', bool),
+        Field('viewFunctions', bool),
+        Field('viewObjectProperties', bool),
+    )
+
     def __init__(
         self, parent: Optional[QObject] = None, viewFlows: bool = True, viewFunctions: bool = True, viewObjectProperties: bool = True
     ) -> None:
@@ -74,17 +45,55 @@ class UI(QObject, DictConvertible):
         self.viewObjectProperties = viewObjectProperties
 
 
-class Settings(QObject, DictConvertible):
+class ScannerSettings(QObject, Serializable):
+    # see blueprint.module_scanner.ScanMode
+    mode: str
+    # keep the scan results in .blueprint/scan_index.json, and the
+    # dependencies' ones in the user's cache directory
+    cache: bool
+    # scan across as many processes, 0 or 1 to scan in the GUI's process
+    workers: int
+    # resolve the functions' signatures only when they're needed
+    lazy: bool
+
+    FIELDS = (
+        Field('mode', str),
+        Field('cache', bool),
+        Field('workers', int),
+        Field('lazy', bool),
+    )
+
+    def __init__(
+        self, parent: Optional[QObject] = None, mode: str = 'import', cache: bool = True, workers: int = 0,
+        lazy: bool = False
+    ) -> None:
+        super().__init__(parent=parent)
+
+        self.mode = mode
+        self.cache = cache
+        self.workers = workers
+        self.lazy = lazy
+
+
+class Settings(QObject, Serializable):
     filePath: Optional[Path]
     logger: Logger
     ui: UI
+    scanner: ScannerSettings
+
+    FIELDS = (
+        Field('ui', UI),
+        Field('scanner', ScannerSettings),
+    )
 
     def __init__(
         self, filePath: Path = None, ui: Optional[UI] = None,
-        parent: Optional[QObject] = None, load: bool = False
+        parent: Optional[QObject] = None, load: bool = False,
+        scanner: Optional[ScannerSettings] = None
     ) -> None:
         super().__init__(parent=parent)
         self.ui = ui if ui else UI()
+        self.scanner = scanner if scanner else ScannerSettings()
         self.filePath = filePath.absolute() if filePath else None
         self.logger = getLogger('Settings')
 
@@ -105,8 +114,8 @@ class Settings(QObject, DictConvertible):
             return
 
         with self.filePath.open('r') as fh:
-            dictionary = yaml.load(fh, Loader=Loader)
-            self.ui.fromDict(dictionary['ui'])
+            # the sections (and keys) missing from the file keep their defaults
+            self.fromDict(yaml.load(fh, Loader=Loader) or {})
 
     def get_project_root(self) -> Optional[Path]:
         if self.filePath:
@@ -116,9 +125,28 @@ class Settings(QObject, DictConvertible):
 
 
 class SettingsManager(QObject):
+    '''
+        Persist the settings as they change: the changes are coalesced into
+        one write, once no other change came for WRITE_DELAY milliseconds
+
+        The settings are serialized on their thread, and written by a
+        background one: atomically (through a temporary file), and only if
+        their content changed. Pending changes are written when the
+        application quits (see flush).
+    '''
+    WRITE_DELAY = 500
+
     logger: Logger
     settings: Settings
 
+    # the content of the settings file, as last loaded or written
+    _written: Optional[str]
+    # the content submitted to the writer, until written (or failed)
+    _pending: Optional[str]
+    _timer: QTimer
+    _writer: ThreadPoolExecutor
+    _closed: bool
+
     __instances = {}
 
     @staticmethod
@@ -139,24 +167,85 @@ class SettingsManager(QObject):
         self.logger = getLogger('SettingsManager')
 
         self.settings = settings
+        try:
+            self._written = settings.filePath.read_text() if settings.filePath else None
+        except OSError:
+            self._written = None
+        self._pending = None
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(self.WRITE_DELAY)
+        self._timer.timeout.connect(self.flush)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='SettingsManager')
+        self._closed = False
+
+        application = QCoreApplication.instance()
+        if application is not None:
+            application.aboutToQuit.connect(self.close)
+
         self.installUpdatesWatcher()
 
     def installUpdatesWatcher(self, obj: Optional[QObject] = None):
         obj = obj if obj else self.settings
 
+        # the signals of the settings' classes, not QObject's ones
+        for cls in type(obj).__mro__:
+            if cls is QObject:
+                break
+            for name, attr in vars(cls).items():
+                if isinstance(attr, Signal):
+                    getattr(obj, name).connect(self.updateWatcher)
         for attr in obj.__dict__.values():
-            if type(attr) is SignalInstance:
-                attr.connect(self.updateWatcher)
-            elif isinstance(attr, QObject):
+            if isinstance(attr, QObject):
                 self.installUpdatesWatcher(attr)
 
     def updateWatcher(self, *_) -> None:
         self.logger.debug('Detected settings change')
+        # (re)start the idle window
+        self._timer.start()
+
+    def flush(self) -> None:
+        '''
+            Write the pending changes now (in the background)
+        '''
+        self._timer.stop()
         if not self.settings.filePath:
             return
-        bpDir = self.settings.filePath.parent
-        if not bpDir.exists():
-            os.mkdir(bpDir)
 
-        with open(self.settings.filePath, 'w') as fh:
-            yaml.dump(self.settings.toDict(), stream=fh, Dumper=Dumper)
+        content = yaml.dump(self.settings.toDict(), Dumper=Dumper)
+        if content == self._written or content == self._pending:
+            return
+
+        self._pending = content
+        if self._closed:
+            self.write(self.settings.filePath, content)
+        else:
+            self._writer.submit(self.write, self.settings.filePath, content)
+
+    def write(self, filePath: Path, content: str) -> None:
+        try:
+            filePath.parent.mkdir(parents=True, exist_ok=True)
+
+            tmpPath = filePath.with_name(f'{filePath.name}.{os.getpid()}.tmp')
+            with tmpPath.open('w') as fh:
+                fh.write(content)
+                # on the disk before replacing the previous file
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmpPath, filePath)
+            # only now: a failed write is retried by the next flush
+            self._written = content
+        except OSError as ex:
+            self.logger.error(f'Unable to save the settings: {ex}')
+        finally:
+            if self._pending is content:
+                self._pending = None
+
+    def close(self) -> None:
+        '''
+            Write the pending changes, waiting for the writes to complete
+        '''
+        self.flush()
+        self._closed = True
+        self._writer.shutdown(wait=True)
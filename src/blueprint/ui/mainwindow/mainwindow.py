@@ -2,33 +2,40 @@
 import inspect
 import logging
 import os
+from functools import partial
 from io import StringIO
 from pathlib import Path
-from threading import Thread
-from typing import Callable, Dict
+from typing import Callable, Dict, List, Optional, Set
 
-from blueprint.model_functions import load_project
+from blueprint.flow_file import FlowFileError
+from blueprint.model_functions import create_project
 from blueprint.models import Flow, Function, Project
-from blueprint.settings import Settings
+from blueprint.project_loader import ProjectLoader, SourcesRescanner
+from blueprint.project_watcher import ProjectWatcher
+from blueprint.runner.profiling import FlowProfile
+from blueprint.scan_index import ScanIndex
+from blueprint.search import FunctionSearchIndex
+from blueprint.settings import Settings, SettingsManager
 from blueprint.ui.mainwindow.menu import Menu
 from blueprint.ui.models import (FlowListItem, FnPropsCategoryItem,
-                                 FnPropsPropItem, FnTreeItem)
+                                 FnPropsPropItem, FunctionTreeModel)
 from blueprint.ui.qplaintextedit_log_handler import QPlainTextEditLogHandler
 from blueprint.ui.widgets import (BlueprintGraphicsView, FnTreeView,
                                   FunctionGraphicWidget)
 from PySide6 import QtCore, QtGui
-from PySide6.QtCore import QEvent, QFile, QObject, QTimer, Signal
+from PySide6.QtCore import QEvent, QFile, QObject, QThreadPool, Signal
 from PySide6.QtGui import QStandardItemModel
 from PySide6.QtUiTools import QUiLoader
 from PySide6.QtWidgets import (QApplication, QFileDialog, QGraphicsScene,
                                QGroupBox, QInputDialog, QLineEdit, QListView,
                                QMainWindow, QMessageBox, QPlainTextEdit,
-                               QPushButton, QStatusBar, QTabWidget, QTreeView,
-                               QWidget)
+                               QProgressBar, QPushButton, QStatusBar,
+                               QTabWidget, QTreeView, QWidget)
 
 
 class MainWindowSignals(QObject):
     closed = Signal(None)
+    projectLoaded = Signal(None)
 
 
 class MainWindow(QMainWindow):
@@ -36,7 +43,13 @@ class MainWindow(QMainWindow):
     logStream: StringIO
 
     settings: Settings
+    settings_manager: Optional[SettingsManager]
     project: Project
+    project_loader: Optional[ProjectLoader]
+    project_watcher: ProjectWatcher
+    # the source files' rescans, run one at a time
+    rescan_pool: QThreadPool
+    rescanners: Set[SourcesRescanner]
     graphics_views: Dict[str, BlueprintGraphicsView]
 
     ui: QWidget
@@ -45,6 +58,7 @@ class MainWindow(QMainWindow):
 
     functionsGroupBox: QGroupBox
     functionsTreeView: FnTreeView
+    functionsTreeModel: FunctionTreeModel
     functionsFilterLineEdit: QLineEdit
     functionsFilter: str
 
@@ -55,6 +69,8 @@ class MainWindow(QMainWindow):
     blueprintsTabWidget: QTabWidget
 
     status_bar: QStatusBar
+    loadingProgressBar: QProgressBar
+    cancelLoadingPushButton: QPushButton
 
     propertiesTreeView: QTreeView
     logViewer: QPlainTextEdit
@@ -64,6 +80,7 @@ class MainWindow(QMainWindow):
         self.signals = MainWindowSignals()
         self.settings = settings
         self.project = project
+        self.project_loader = None
         self.graphics_views = {}
 
         self.load_ui()
@@ -72,6 +89,11 @@ class MainWindow(QMainWindow):
         self.init_settingsEventHandlers()
 
         self.init_logger()
+        self.init_project_watcher()
+
+        application = QApplication.instance()
+        if application is not None:
+            application.aboutToQuit.connect(self.close_project)
 
     def load_ui(self) -> None:
         loader = QUiLoader()
@@ -116,6 +138,7 @@ class MainWindow(QMainWindow):
         )
 
         self.status_bar = self.ui.findChild(QStatusBar, 'statusbar')
+        self.setup_project_loading_ui()
 
         self.ui.installEventFilter(self)
         self.setup_flows_management_ui()
@@ -138,6 +161,7 @@ class MainWindow(QMainWindow):
 
         self.menu.signals.onOpenProjectRoot.connect(
             self.open_project_dialog)
+        self.menu.signals.onLoadProfile.connect(self.load_profile_dialog)
 
     def init_ui(self) -> None:
         self.flowsGroupBox.setVisible(self.settings.ui.viewFlows)
@@ -158,6 +182,10 @@ class MainWindow(QMainWindow):
         self.settings.ui.viewObjectPropertiesChanged.connect(
             self.on_view_hide_event)
 
+        # persist the changes
+        self.settings_manager = SettingsManager.get_instance(
+            self.settings, parent=self)
+
     def init_logger(self) -> None:
         logger = logging.getLogger()
         self.logStream = StringIO()
@@ -169,6 +197,61 @@ class MainWindow(QMainWindow):
 
         logging.getLogger('UI').debug('Logger initialized')
 
+    def init_project_watcher(self) -> None:
+        self.rescan_pool = QThreadPool(self)
+        self.rescan_pool.setMaxThreadCount(1)
+        self.rescanners = set()
+
+        self.project_watcher = ProjectWatcher(parent=self)
+        self.project_watcher.sourcesChanged.connect(
+            self.on_project_sources_changed)
+        # watch the project once it's fully loaded
+        self.signals.projectLoaded.connect(self.watch_project)
+
+        self.watch_project()
+
+    def watch_project(self) -> None:
+        if not self.project:
+            self.project_watcher.stop()
+            return
+
+        self.project_watcher.watch(self.project.settings.get_project_root())
+
+    def on_project_sources_changed(self, changed: List[str], deleted: List[str]) -> None:
+        '''
+            Rescan the changed sources in the background (the modules are
+            imported again), applying their functions once done
+        '''
+        if not self.project:
+            return
+
+        rescanner = SourcesRescanner(self.project, changed, deleted)
+        rescanner.signals.finished.connect(
+            partial(self.on_project_sources_rescanned, rescanner))
+        rescanner.signals.failed.connect(
+            partial(self.on_project_sources_rescan_failed, rescanner))
+
+        self.rescanners.add(rescanner)
+        rescanner.start(self.rescan_pool)
+
+    # as with the loaders, the rescans of a project closed meanwhile are ignored
+
+    def on_project_sources_rescanned(
+            self, rescanner: SourcesRescanner, functions_by_module: Dict[str, List[Function]]) -> None:
+        self.rescanners.discard(rescanner)
+        if rescanner.project is not self.project or not functions_by_module:
+            return
+
+        self.project.update_functions(functions_by_module)
+        self.update_functions_tree(functions_by_module)
+
+    def on_project_sources_rescan_failed(self, rescanner: SourcesRescanner, error: str) -> None:
+        self.rescanners.discard(rescanner)
+        if rescanner.project is not self.project:
+            return
+
+        self.status_bar.showMessage(f'Error scanning the changed sources: {error}', 5000)
+
     def on_view_hide_event(self, *args) -> None:
         self.ui.findChild(QWidget, 'leftSideWidget').setVisible(
             self.settings.ui.viewFlows or self.settings.ui.viewFunctions)
@@ -178,31 +261,137 @@ class MainWindow(QMainWindow):
 
     def on_functions_filter_edit(self, *args) -> None:
         self.functionsFilter = self.functionsFilterLineEdit.text()
-        self.load_functions_from_project()
+        self.functionsTreeModel.set_visible(self.filtered_function_ids())
 
-    def load_project(self):
-        self.status_bar.showMessage('Loading project...')
-        self.project = load_project(self.settings)
+    def load_project(self) -> None:
+        '''
+            Load the settings' project in the background: the project is
+            usable right away, its functions showing up as they're scanned
+        '''
+        self.cancel_project_loading()
+        self.project_watcher.stop()
+
+        if not self.settings.get_project_root():
+            return
 
-        self.status_bar.showMessage('Project loaded', 5000)
+        self.close_project()
+        self.project = create_project(self.settings, [])
         self.load_functions_from_project()
         self.load_flows_from_project()
 
+        loader = ProjectLoader(self.settings)
+        loader.signals.progress.connect(
+            partial(self.on_project_load_progress, loader))
+        loader.signals.modulesLoaded.connect(
+            partial(self.on_project_modules_loaded, loader))
+        loader.signals.finished.connect(
+            partial(self.on_project_loaded, loader))
+        loader.signals.failed.connect(
+            partial(self.on_project_load_failed, loader))
+
+        self.project_loader = loader
+        self.status_bar.showMessage('Loading project...')
+        self.loadingProgressBar.setRange(0, 0)
+        self.loadingProgressBar.setVisible(True)
+        self.cancelLoadingPushButton.setVisible(True)
+
+        loader.start()
+
+    def cancel_project_loading(self) -> None:
+        if self.project_loader is not None:
+            self.project_loader.cancel()
+
+    def end_project_loading(self) -> None:
+        self.project_loader = None
+        self.loadingProgressBar.setVisible(False)
+        self.cancelLoadingPushButton.setVisible(False)
+
+    # a cancelled loader may still emit while the next one is running:
+    # the handlers ignore whatever doesn't come from the current one
+
+    def on_project_load_progress(self, loader: ProjectLoader, done: int, total: int, module: str) -> None:
+        if loader is not self.project_loader:
+            return
+
+        self.loadingProgressBar.setRange(0, total)
+        self.loadingProgressBar.setValue(done)
+        self.status_bar.showMessage(f'Loading project... {module}')
+
+    def on_project_modules_loaded(
+            self, loader: ProjectLoader, functions_by_module: Dict[str, List[Function]]) -> None:
+        if loader is not self.project_loader:
+            return
+
+        self.project.update_functions(functions_by_module)
+        self.update_functions_tree(functions_by_module)
+
+    def on_project_loaded(
+            self,
+            loader: ProjectLoader,
+            scan_index: Optional[ScanIndex],
+            search_index: FunctionSearchIndex) -> None:
+        if loader is not self.project_loader:
+            return
+
+        self.end_project_loading()
+
+        self.project.scan_index = scan_index
+        self.project.set_search_index(search_index)
+        if loader.cancelled:
+            self.status_bar.showMessage(
+                f'Project loading cancelled ({len(self.project.functions)} functions loaded)', 5000)
+        else:
+            self.status_bar.showMessage('Project loaded', 5000)
+
+        self.signals.projectLoaded.emit()
+
+    def on_project_load_failed(self, loader: ProjectLoader, error: str) -> None:
+        if loader is not self.project_loader:
+            return
+
+        self.end_project_loading()
+        self.status_bar.showMessage(f'Error loading project: {error}', 5000)
+
     def open_project_dialog(self, *args) -> Callable:
         pathStr = QFileDialog.getExistingDirectory(
             self, 'Open project folder...', os.getcwd())
 
-        project_path = Path(pathStr).absolute()
-
-        if not project_path:
+        if not pathStr:
             return
 
+        project_path = Path(pathStr).absolute()
+
+        if self.settings_manager:
+            self.settings_manager.flush()
         self.settings = Settings(
             filePath=Settings.get_settings_path(project_path), load=True)
+        self.settings_manager = SettingsManager.get_instance(
+            self.settings, parent=self)
+
+        self.load_project()
 
-        self.project_load_thread = Thread(
-            target=self.load_project)
-        self.project_load_thread.start()
+    def load_profile_dialog(self, *args) -> None:
+        pathStr, _ = QFileDialog.getOpenFileName(
+            self, 'Load flow profile...', os.getcwd(), 'Flow profiles (*.json)')
+
+        if not pathStr:
+            return
+
+        try:
+            profile = FlowProfile.load(Path(pathStr))
+        except (OSError, ValueError, KeyError) as ex:
+            self.status_bar.showMessage(f'Unable to load the profile: {ex}', 5000)
+            return
+
+        view = self.graphics_views.get(profile.flow_uid)
+        if view is None:
+            self.status_bar.showMessage(
+                f'Open the flow {profile.flow_name} to see its profile.', 5000)
+            return
+
+        view.set_profile(profile)
+        self.blueprintsTabWidget.setCurrentIndex(
+            self.blueprintsTabWidget.indexOf(view))
 
     def on_new_flow(self, *args):
         logger = logging.getLogger('on_new_flow')
@@ -218,6 +407,7 @@ class MainWindow(QMainWindow):
                 flow = Flow(name=name, nodes=[])
                 self.project.flows.append(flow)
                 self.project.flows.sort(key=lambda flow: flow.name)
+                self.save_flow(flow)
 
                 self.load_flows_from_project()
 
@@ -237,6 +427,31 @@ class MainWindow(QMainWindow):
 
                 error_dialog.show()
 
+    def save_flow(self, flow: Flow) -> None:
+        try:
+            self.project.save_flow(flow)
+        except OSError as ex:
+            self.status_bar.showMessage(
+                f'Unable to save the flow {flow.name}: {ex}', 5000)
+
+    def edit_flow(self, edit: Callable[..., None], flow: Flow, *args) -> None:
+        '''
+            Apply an edit of the project (e.g. Project.move_node) to a flow
+        '''
+        try:
+            edit(flow, *args)
+        except (OSError, ValueError) as ex:
+            self.status_bar.showMessage(
+                f'Unable to save the flow {flow.name}: {ex}', 5000)
+
+    def close_project(self) -> None:
+        # the flows' tabs edit the project they were opened from
+        for view in list(self.graphics_views.values()):
+            self.close_flow_tab(view)
+
+        if self.project:
+            self.project.close()
+
     def on_flow_delete(self, *args):
         logger = logging.getLogger('on_flow_delete')
 
@@ -247,15 +462,23 @@ class MainWindow(QMainWindow):
         flow = next(
             flow for flow in self.project.flows if flow.name == flow_name)
 
+        try:
+            self.project.open_flow(flow)
+        except FlowFileError as ex:
+            self.status_bar.showMessage(str(ex), 5000)
+            return
+
         flow_scene = QGraphicsScene(self)
 
         if flow.uid in self.graphics_views:
-            previous_tab = self.graphics_views[flow.uid]
-            previous_tab.deleteLater()
+            self.close_flow_tab(self.graphics_views[flow.uid])
 
         self.graphics_views[flow.uid] = BlueprintGraphicsView(flow, flow_scene)
         view = self.graphics_views[flow.uid]
         view.setObjectName(f'{flow.uid}_scene')
+        view.nodeAdded.connect(partial(self.edit_flow, self.project.add_node, flow))
+        view.nodeMoved.connect(partial(self.edit_flow, self.project.move_node, flow))
+        view.nodeDeleted.connect(partial(self.edit_flow, self.project.delete_node, flow))
 
         self.blueprintsTabWidget.addTab(
             view, flow_name)
@@ -264,12 +487,21 @@ class MainWindow(QMainWindow):
             self.blueprintsTabWidget.indexOf(view))
 
     def on_flow_close(self, tab_index: int):
-        widget: BlueprintGraphicsView = self.blueprintsTabWidget.widget(
-            tab_index)
+        widget = self.blueprintsTabWidget.widget(tab_index)
+
+        if isinstance(widget, BlueprintGraphicsView):
+            self.close_flow_tab(widget)
+        else:
+            self.blueprintsTabWidget.removeTab(tab_index)
 
-        if widget.flow.uid in self.graphics_views:
-            self.graphics_views.pop(widget.flow.uid)
-        self.blueprintsTabWidget.removeTab(tab_index)
+    def close_flow_tab(self, view: BlueprintGraphicsView) -> None:
+        if self.graphics_views.get(view.flow.uid) is view:
+            self.graphics_views.pop(view.flow.uid)
+
+        tab_index = self.blueprintsTabWidget.indexOf(view)
+        if tab_index >= 0:
+            self.blueprintsTabWidget.removeTab(tab_index)
+        view.deleteLater()
 
     def on_flow_item_change(self, tab_index: int):
         if not self.project:
@@ -303,7 +535,7 @@ class MainWindow(QMainWindow):
 
             return
 
-        existing_flow.name = new_name
+        self.edit_flow(self.project.rename_flow, existing_flow, new_name)
         self.blueprintsTabWidget.setTabText(tab_index, new_name)
 
         self.load_flows_from_project()
@@ -336,23 +568,36 @@ class MainWindow(QMainWindow):
         self.blueprintsTabWidget.addTab(
             FunctionGraphicWidget(fn), 'FunctionWidget demo')
 
+    def setup_project_loading_ui(self):
+        self.loadingProgressBar = QProgressBar(self.status_bar)
+        self.loadingProgressBar.setMaximumWidth(200)
+        self.loadingProgressBar.setVisible(False)
+        self.status_bar.addPermanentWidget(self.loadingProgressBar)
+
+        self.cancelLoadingPushButton = QPushButton('Cancel', self.status_bar)
+        self.cancelLoadingPushButton.setToolTip('Stop loading the project')
+        self.cancelLoadingPushButton.setVisible(False)
+        self.cancelLoadingPushButton.clicked.connect(
+            self.cancel_project_loading)
+        self.status_bar.addPermanentWidget(self.cancelLoadingPushButton)
+
     def setup_functions_tree_view(self):
         view = self.functionsTreeView
-        view.setModel(QStandardItemModel())
+        self.functionsTreeModel = FunctionTreeModel(view)
+        view.setModel(self.functionsTreeModel)
         view.setHeaderHidden(True)
         view.setDragEnabled(True)
+        view.setUniformRowHeights(True)
 
         view.clicked.connect(lambda index: self.load_function_prop(
-            index.model().itemFromIndex(index).function))
+            self.functionsTreeModel.function(index)))
 
     def setup_functions_filter(self):
-        functions_timer = QTimer(self)
-        functions_timer.setSingleShot(True)
-        functions_timer.setInterval(300)
-        functions_timer.timeout.connect(self.on_functions_filter_edit)
-
+        # filtering is cheap enough to follow the typing: the search index
+        # is built while the project loads, and a query's cost follows its
+        # matches (see benchmarks/function_search.py)
         self.functionsFilterLineEdit.textChanged.connect(
-            lambda: functions_timer.start())
+            self.on_functions_filter_edit)
 
     def setup_function_props_view(self):
         view = self.propertiesTreeView
@@ -383,44 +628,30 @@ class MainWindow(QMainWindow):
         self.newFlowPushButton.setEnabled(True)
         self.deleteFlowPushButton.setEnabled(True)
 
-    def load_functions_from_project(self):
-        model = self.functionsTreeView.model()
+    def filtered_function_ids(self) -> Optional[Set[int]]:
+        '''
+            The ids of the functions matching the filter, None if not filtering
+        '''
+        if not self.project or not self.functionsFilter:
+            return None
 
-        if model.hasChildren():
-            model.removeRows(0, model.rowCount())
-
-        if not self.project:
-            return
+        return self.project.search_index.search(self.functionsFilter)
 
-        functions = self.project.functions
+    def load_functions_from_project(self):
+        self.functionsTreeModel.set_catalog(
+            self.project.functions if self.project else None,
+            self.filtered_function_ids())
+
+    def update_functions_tree(self, functions_by_module: Dict[str, List[Function]]) -> None:
+        '''
+            Update the tree after the given modules were rescanned, keeping
+            its expanded packages and selection, instead of resetting it
+            as load_functions_from_project does
+        '''
         if self.functionsFilter:
-            functions = list(filter(
-                lambda fn: self.functionsFilter in f'{fn.module}.{fn.name}', functions))
-        functions.sort(key=lambda fn: f'{fn.module}{fn.name}')
-
-        rootNode = model.invisibleRootItem()
-        items: Dict[str, FnTreeItem] = {}
-
-        for fn in functions:
-            module_path = fn.module.split('.')
-            current_path = ''
-            for path in module_path:
-                previous_path = current_path
-                if not previous_path:
-                    current_path = path
-                else:
-                    current_path = '.'.join([current_path, path])
-                if current_path not in items:
-                    node = FnTreeItem(text=path)
-                    items[current_path] = node
-                    if not previous_path:
-                        rootNode.appendRow(node)
-                    else:
-                        items[previous_path].appendRow(node)
-            node = FnTreeItem(text=fn.name, function=fn)
-            items[fn.module].appendRow(node)
-
-        self.functionsTreeView.collapseAll()
+            self.functionsTreeModel.set_visible(self.filtered_function_ids())
+        else:
+            self.functionsTreeModel.refresh()
 
     def load_function_prop(self, fn: Function) -> None:
         if not fn:
@@ -431,6 +662,10 @@ class MainWindow(QMainWindow):
         if model.hasChildren():
             model.removeRows(0, model.rowCount())
 
+        # lazily scanned functions get their signature resolved here
+        if fn.signature is None:
+            return
+
         rootItem = model.invisibleRootItem()
 
         parameters = FnPropsCategoryItem('Params')
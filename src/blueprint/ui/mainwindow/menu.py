@@ -12,6 +12,7 @@ class MenuSignals(QObject):
     onProjectSettings = Signal(bool)
     onNewFlow = Signal(bool)
     onManageFlows = Signal(bool)
+    onLoadProfile = Signal(bool)
     # View
     onViewFlows = Signal(bool)
     onViewFunctions = Signal(bool)
@@ -29,6 +30,7 @@ class Menu:
     actionProjectSettings: QAction
     actionNewFlow: QAction
     actionManageFlows: QAction
+    actionLoadProfile: QAction
     # View
     actionViewFlows: QAction
     actionViewFunctions: QAction
@@ -42,6 +44,7 @@ class Menu:
             self.signals.onProjectSettings)
         self.actionNewFlow.triggered.connect(self.signals.onNewFlow)
         self.actionManageFlows.triggered.connect(self.signals.onManageFlows)
+        self.actionLoadProfile.triggered.connect(self.signals.onLoadProfile)
         self.actionExit.triggered.connect(self.signals.onExit)
 
         self.actionViewFlows.triggered.connect(
@@ -68,6 +71,7 @@ class Menu:
 
         self.actionNewFlow = ui.findChild(QAction, 'actionNew_flow')
         self.actionManageFlows = ui.findChild(QAction, 'actionManage_flows')
+        self.actionLoadProfile = ui.findChild(QAction, 'actionLoad_profile')
 
         self.actionViewFlows = ui.findChild(QAction, 'actionViewFlows')
         self.actionViewFunctions = ui.findChild(QAction, 'actionViewFunctions')
@@ -1,19 +1,309 @@
-from typing import Optional
+from typing import Any, Dict, List, Optional, Set, Union
+from PySide6.QtCore import QAbstractItemModel, QModelIndex, QObject, Qt
 from PySide6.QtGui import QFont, QStandardItem
-from blueprint.models import Flow, Function
+from blueprint.models import Flow, Function, FunctionCatalog
 
 
-class FnTreeItem(QStandardItem):
-    function: Function
+class FunctionTreeModel(QAbstractItemModel):
+    '''
+        Lazy tree model of a FunctionCatalog's packages and functions
 
-    def __init__(self, text: str, function: Optional[Function] = None) -> None:
-        super().__init__()
+        A package's rows (its sub-packages, then its functions, both sorted
+        by name) are only computed when the package is expanded (see
+        canFetchMore and fetchMore); functions are rows holding their
+        catalog id, so that no per-function object is created. Filtering
+        recomputes the rows of the already fetched packages, removing and
+        inserting the rows that changed (so that the views keep their
+        selection and expanded packages).
 
-        self.setEditable(False)
-        self.setText(text)
-        self.setDragEnabled(function is not None)
+        Each index points to the node of its parent package, the row
+        telling which of the parent's rows it is.
+    '''
+    class Node:
+        __slots__ = ('path', 'name', 'parent', 'row', 'rows')
+
+        path: str
+        name: str
+        parent: Optional['FunctionTreeModel.Node']
+        # row in the parent's rows (see _renumber)
+        row: int
+        # sub-packages' nodes and functions' ids, None until fetched
+        rows: Optional[List[Union['FunctionTreeModel.Node', int]]]
+
+        def __init__(self, path: str, name: str, parent: Optional['FunctionTreeModel.Node']) -> None:
+            self.path = path
+            self.name = name
+            self.parent = parent
+            self.row = 0
+            self.rows = None
+
+    catalog: Optional[FunctionCatalog]
+    root: Node
+
+    # package path -> node, kept alive as the indexes point to them
+    _nodes: Dict[str, Node]
+    # visible functions and packages, None if not filtered
+    _visible_ids: Optional[Set[int]]
+    _visible_packages: Optional[Set[str]]
+
+    def __init__(self, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+
+        self.catalog = None
+        self._visible_ids = None
+        self._visible_packages = None
+        self._reset_nodes()
+
+    def _reset_nodes(self) -> None:
+        self.root = FunctionTreeModel.Node('', '', None)
+        self._nodes = {'': self.root}
+
+    def set_catalog(self, catalog: Optional[FunctionCatalog], visible: Optional[Set[int]] = None) -> None:
+        '''
+            Show another catalog, with only the given functions if not None
+        '''
+        self.beginResetModel()
+        self.catalog = catalog
+        self._set_visible(visible)
+        self._reset_nodes()
+        self.endResetModel()
+
+    def set_visible(self, visible: Optional[Set[int]]) -> None:
+        '''
+            Show only the given functions (and their packages), or all of
+            them if None
+        '''
+        self._set_visible(visible)
+        self.refresh()
+
+    def _set_visible(self, visible: Optional[Set[int]]) -> None:
+        self._visible_ids = visible
+        if visible is None or self.catalog is None:
+            self._visible_packages = None
+            return
+
+        modules = {self.catalog[id].module for id in visible}
+        packages: Set[str] = set()
+        for module in modules:
+            while module and module not in packages:
+                packages.add(module)
+                module = module.rpartition('.')[0]
+        self._visible_packages = packages
+
+    def refresh(self) -> None:
+        '''
+            Recompute the fetched packages' rows, after the catalog or the
+            filter changed
+        '''
+        self._refetch(self.root, QModelIndex())
+
+    def _refetch(self, node: Node, index: QModelIndex) -> None:
+        if node.rows is None:
+            return
+
+        # both sorted the same way: the kept rows stay in the same order
+        rows = self._rows(node)
+        kept = set(rows)
+
+        # the removed rows, a contiguous run at a time (the last one first)
+        end = len(node.rows)
+        while end > 0:
+            if node.rows[end - 1] in kept:
+                end -= 1
+                continue
+            start = end - 1
+            while start > 0 and node.rows[start - 1] not in kept:
+                start -= 1
+
+            removed = node.rows[start:end]
+            self.beginRemoveRows(index, start, end - 1)
+            del node.rows[start:end]
+            self._renumber(node)
+            self.endRemoveRows()
+            for row in removed:
+                if isinstance(row, FunctionTreeModel.Node):
+                    self._forget(row)
+            end = start
+
+        # then the inserted ones
+        current = set(node.rows)
+        start = 0
+        while start < len(rows):
+            if rows[start] in current:
+                start += 1
+                continue
+            end = start
+            while end < len(rows) and rows[end] not in current:
+                end += 1
+
+            self.beginInsertRows(index, start, end - 1)
+            node.rows[start:start] = rows[start:end]
+            self._renumber(node)
+            self.endInsertRows()
+            start = end
+
+        for row in node.rows:
+            if not isinstance(row, FunctionTreeModel.Node):
+                break
+            self._refetch(row, self.createIndex(row.row, 0, node))
+
+    @staticmethod
+    def _renumber(node: Node) -> None:
+        # the sub-packages come first
+        for row, child in enumerate(node.rows):
+            if not isinstance(child, FunctionTreeModel.Node):
+                break
+            child.row = row
+
+    def _forget(self, node: Node) -> None:
+        '''
+            Drop a hidden package's rows: it will be fetched again if shown
+        '''
+        if node.rows is None:
+            return
+
+        for row in node.rows:
+            if isinstance(row, FunctionTreeModel.Node):
+                self._forget(row)
+        node.rows = None
+
+    def _rows(self, node: Node) -> List[Union[Node, int]]:
+        package = self.catalog.package(node.path) if self.catalog else None
+        if package is None:
+            return []
+
+        packages = self._visible_packages
+        ids = self._visible_ids
+
+        rows: List[Union[FunctionTreeModel.Node, int]] = []
+        for name in sorted(package.children):
+            child = package.children[name]
+            if packages is not None and child.path not in packages:
+                continue
+
+            child_node = self._nodes.get(child.path)
+            if child_node is None:
+                child_node = FunctionTreeModel.Node(child.path, name, node)
+                self._nodes[child.path] = child_node
+            rows.append(child_node)
+
+        rows.extend(id for _, id in sorted(package.functions.items())
+                    if ids is None or id in ids)
+
+        return rows
+
+    def _item(self, index: QModelIndex) -> Union[Node, int, None]:
+        if not index.isValid():
+            return None
+
+        parent: FunctionTreeModel.Node = index.internalPointer()
+        if parent.rows is None or index.row() >= len(parent.rows):
+            return None
+
+        return parent.rows[index.row()]
+
+    def _node(self, index: QModelIndex) -> Optional[Node]:
+        if not index.isValid():
+            return self.root
+
+        item = self._item(index)
+        return item if isinstance(item, FunctionTreeModel.Node) else None
+
+    def function(self, index: QModelIndex) -> Optional[Function]:
+        item = self._item(index)
+        if item is None or isinstance(item, FunctionTreeModel.Node):
+            return None
+
+        return self.catalog[item]
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        node = self._node(parent)
+        if node is None or node.rows is None or not 0 <= row < len(node.rows) or column != 0:
+            return QModelIndex()
+
+        return self.createIndex(row, column, node)
+
+    def parent(self, index: Optional[QModelIndex] = None) -> Any:
+        if index is None:
+            return super().parent()
+        if not index.isValid():
+            return QModelIndex()
+
+        node: FunctionTreeModel.Node = index.internalPointer()
+        if node.parent is None:
+            return QModelIndex()
+
+        return self.createIndex(node.row, 0, node.parent)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        node = self._node(parent)
+        if node is None or node.rows is None:
+            return 0
+
+        return len(node.rows)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 1
+
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        node = self._node(parent)
+        if node is None:
+            return False
+        if node.rows is not None:
+            return len(node.rows) > 0
+
+        # only packages with (visible) functions are shown
+        return node is not self.root or self.catalog is not None
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        node = self._node(parent)
+
+        return node is not None and node.rows is None and self.catalog is not None
+
+    def fetchMore(self, parent: QModelIndex) -> None:
+        node = self._node(parent)
+        if node is None or node.rows is not None:
+            return
+
+        rows = self._rows(node)
+        if not rows:
+            node.rows = rows
+            return
+
+        self.beginInsertRows(parent, 0, len(rows) - 1)
+        node.rows = rows
+        self._renumber(node)
+        self.endInsertRows()
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlags:
+        if not index.isValid():
+            return Qt.NoItemFlags
+
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if not isinstance(self._item(index), FunctionTreeModel.Node):
+            flags |= Qt.ItemIsDragEnabled
+
+        return flags
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> Any:
+        item = self._item(index)
+        if item is None:
+            return None
+
+        if isinstance(item, FunctionTreeModel.Node):
+            if role == Qt.DisplayRole:
+                return item.name
+            if role == Qt.ToolTipRole:
+                return item.path
+            return None
+
+        if role == Qt.DisplayRole:
+            return self.catalog[item].name
+        if role == Qt.ToolTipRole:
+            fn = self.catalog[item]
+            return FunctionCatalog.qualified_name(fn.module, fn.name)
 
-        self.function = function
+        return None
 
 
 class FnPropsPropItem(QStandardItem):
@@ -2,27 +2,31 @@ import pickle
 from enum import Enum
 from pathlib import Path
 import platform
-from typing import Optional
+from typing import Dict, List, Optional
 
-from blueprint.models import Flow, Function
-from blueprint.ui.models import FnTreeItem
+from blueprint.models import Flow, FlowElement, Function
+from blueprint.runner.profiling import (CacheStatus, FlowProfile, format_size,
+                                        format_time)
+from blueprint.ui.models import FunctionTreeModel
 from PySide6 import QtCore, QtGui
 from PySide6.QtSvg import QSvgRenderer
-from PySide6.QtWidgets import (QFrame, QGraphicsView, QHBoxLayout, QLabel,
-                               QSizePolicy, QSpacerItem, QTreeView,
+from PySide6.QtWidgets import (QFrame, QGraphicsItem, QGraphicsScene,
+                               QGraphicsView, QHBoxLayout, QLabel,
+                               QSizePolicy, QSpacerItem,
+                               QStyleOptionGraphicsItem, QTreeView,
                                QVBoxLayout, QWidget)
 
 
 class FnTreeView(QTreeView):
     def startDrag(self, supportedActions: QtCore.Qt.DropActions) -> None:
         index = self.currentIndex()
-        model: QtGui.QStandardItemModel = self.model()
-        fn_item: FnTreeItem = model.itemFromIndex(index)
+        model: FunctionTreeModel = self.model()
+        function = model.function(index)
 
-        if type(fn_item) != FnTreeItem:
+        if function is None:
             return super().startDrag(supportedActions)
 
-        widget = FunctionGraphicWidget(fn_item.function)
+        widget = FunctionGraphicWidget(function)
 
         # QPixmap preparation
         pixmap = widget.grab(QtCore.QRect(
@@ -36,7 +40,7 @@ class FnTreeView(QTreeView):
         pixmap = QtGui.QPixmap.fromImage(pm_image)
 
         mime_data = QtCore.QMimeData()
-        mime_data.setData('binary/pickle', pickle.dumps(fn_item.function))
+        mime_data.setData('binary/pickle', pickle.dumps(function))
 
         drag = QtGui.QDrag(self)
         drag.setPixmap(pixmap)
@@ -44,13 +48,141 @@ class FnTreeView(QTreeView):
         drag.exec(QtCore.Qt.CopyAction)
 
 
+class FlowNodeItem(QGraphicsItem):
+    '''
+        A node of a flow, painted directly (rather than through a widget,
+        see FunctionGraphicWidget) and cached in device coordinates
+
+        Zoomed out (under DETAIL_LOD), only the node's box and title are
+        drawn.
+    '''
+    DETAIL_LOD = 0.5
+    MIN_WIDTH = 160
+    PADDING = 6
+    PORT_RADIUS = 4
+
+    node: FlowElement
+
+    _rect: QtCore.QRectF
+    _header: QtCore.QRectF
+    _title: str
+    _parameters: List[str]
+
+    # shared by the items, created with the first one
+    _header_pixmap: Optional[QtGui.QPixmap] = None
+
+    def __init__(self, node: FlowElement, parent: Optional[QGraphicsItem] = None) -> None:
+        super().__init__(parent)
+
+        self.node = node
+        self._title = f'{GraphWidget.Type.FUNCTION.value} {node.function.name}'
+        # the signatures are resolved on demand only: the node's own data
+        self._parameters = list(dict.fromkeys([*node.inputs, *node.constants]))
+
+        metrics = QtGui.QFontMetrics(QtGui.QFont())
+        padding = self.PADDING
+        width = max(self.MIN_WIDTH, metrics.horizontalAdvance(self._title),
+                    metrics.horizontalAdvance(node.function.module),
+                    *(metrics.horizontalAdvance(parameter) + 2 * self.PORT_RADIUS
+                      for parameter in self._parameters)) + 2 * padding
+        header_height = 2 * metrics.height() + 2 * padding
+        height = header_height + max(1, len(self._parameters)) * metrics.height() + 2 * padding
+        self._rect = QtCore.QRectF(0, 0, width, height)
+        self._header = QtCore.QRectF(0, 0, width, header_height)
+
+        if FlowNodeItem._header_pixmap is None:
+            FlowNodeItem._header_pixmap = QtGui.QPixmap(str(Path(__file__).parent.joinpath(
+                'images', 'background', 'spectrum-gradient.png')))
+
+        self.setFlags(QGraphicsItem.GraphicsItemFlag.ItemIsMovable
+                      | QGraphicsItem.GraphicsItemFlag.ItemIsSelectable)
+        self.setCacheMode(QGraphicsItem.CacheMode.DeviceCoordinateCache)
+        self.setPos(node.coords.x, node.coords.y)
+
+    def boundingRect(self) -> QtCore.QRectF:
+        return self._rect
+
+    def paint(
+            self, painter: QtGui.QPainter, option: QStyleOptionGraphicsItem,
+            widget: Optional[QWidget] = None) -> None:
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        padding = self.PADDING
+        selected = self.isSelected()
+
+        painter.setPen(QtGui.QPen(
+            QtGui.QColor(QtCore.Qt.GlobalColor.yellow if selected else QtCore.Qt.GlobalColor.black),
+            2 if selected else 1))
+        painter.setBrush(QtGui.QColor(255, 255, 255, 204))
+
+        if lod < self.DETAIL_LOD:
+            painter.drawRect(self._rect)
+            painter.fillRect(self._header, QtGui.QColor(96, 96, 160))
+            painter.setPen(QtGui.QColor(QtCore.Qt.GlobalColor.white))
+            painter.drawText(self._header.adjusted(padding, 0, -padding, 0),
+                             int(QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.AlignmentFlag.AlignVCenter),
+                             self._title)
+            return
+
+        painter.drawRoundedRect(self._rect, padding, padding)
+        painter.drawPixmap(self._header.toRect(), FlowNodeItem._header_pixmap)
+
+        metrics = painter.fontMetrics()
+        line = metrics.height()
+        text = self._header.adjusted(padding, padding, -padding, -padding)
+        font = painter.font()
+        painter.setPen(QtGui.QColor(QtCore.Qt.GlobalColor.black))
+
+        font.setBold(True)
+        painter.setFont(font)
+        painter.drawText(text, int(QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.AlignmentFlag.AlignTop),
+                         self._title)
+        font.setBold(False)
+        font.setItalic(True)
+        painter.setFont(font)
+        painter.drawText(text.adjusted(0, line, 0, 0),
+                         int(QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.AlignmentFlag.AlignTop),
+                         self.node.function.module)
+        font.setItalic(False)
+        painter.setFont(font)
+
+        # the parameters' ports on the left, the return value's on the right
+        radius = self.PORT_RADIUS
+        top = self._header.bottom() + padding
+        painter.setBrush(QtGui.QColor(64, 64, 192))
+        for index, parameter in enumerate(self._parameters):
+            center = QtCore.QPointF(radius + 1, top + (index + 0.5) * line)
+            painter.drawEllipse(center, radius, radius)
+            painter.drawText(QtCore.QRectF(2 * radius + padding, top + index * line, self._rect.width(), line),
+                             int(QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.AlignmentFlag.AlignVCenter),
+                             parameter)
+        painter.setBrush(QtGui.QColor(192, 64, 64))
+        painter.drawEllipse(QtCore.QPointF(self._rect.right() - radius - 1, top + line / 2), radius, radius)
+
+
 class BlueprintGraphicsView(QGraphicsView):
+    # the edits of the flow, to be saved (see Project.add_node...)
+    nodeAdded = QtCore.Signal(FlowElement)
+    # node, x, y
+    nodeMoved = QtCore.Signal(FlowElement, int, int)
+    nodeDeleted = QtCore.Signal(FlowElement)
+
     flow: Flow
+    # the profile of a run of the flow, drawn over its nodes
+    profile: Optional[FlowProfile]
+    # by node uid
+    items: Dict[str, FlowNodeItem]
+
+    PROFILE_PADDING = 4
+    ZOOM_STEP = 1.15
+    MIN_ZOOM = 0.05
+    MAX_ZOOM = 4.0
 
     def __init__(self, flow: Flow, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.flow = flow
+        self.profile = None
+        self.items = {}
 
         svg_data = Path(__file__).parent.joinpath(
             'images', 'background', 'graph-paper.svg').read_bytes()
@@ -66,6 +198,138 @@ class BlueprintGraphicsView(QGraphicsView):
         brush_painter.end()
 
         self.setBackgroundBrush(QtGui.QBrush(brush_pixmap))
+        self.setAcceptDrops(True)
+
+        # pan by dragging the background, zoom with the wheel
+        self.setDragMode(QGraphicsView.DragMode.ScrollHandDrag)
+        self.setTransformationAnchor(QGraphicsView.ViewportAnchor.AnchorUnderMouse)
+        self.setCacheMode(QGraphicsView.CacheModeFlag.CacheBackground)
+        self.setViewportUpdateMode(QGraphicsView.ViewportUpdateMode.SmartViewportUpdate)
+        self.setOptimizationFlags(QGraphicsView.OptimizationFlag.DontSavePainterState)
+        self.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+
+        scene = self.scene()
+        if scene is not None:
+            scene.setItemIndexMethod(QGraphicsScene.ItemIndexMethod.BspTreeIndex)
+            for node in flow.nodes:
+                self.add_node_item(node)
+
+    def add_node_item(self, node: FlowElement) -> FlowNodeItem:
+        item = FlowNodeItem(node)
+        self.items[node.uid] = item
+        self.scene().addItem(item)
+
+        return item
+
+    def wheelEvent(self, event: QtGui.QWheelEvent) -> None:
+        steps = event.angleDelta().y() / 120
+        if not steps:
+            return super().wheelEvent(event)
+
+        zoom = self.transform().m11()
+        factor = min(self.MAX_ZOOM, max(self.MIN_ZOOM, zoom * self.ZOOM_STEP ** steps)) / zoom
+        self.scale(factor, factor)
+        event.accept()
+
+    def mouseReleaseEvent(self, event: QtGui.QMouseEvent) -> None:
+        super().mouseReleaseEvent(event)
+
+        for item in self.scene().selectedItems():
+            if not isinstance(item, FlowNodeItem):
+                continue
+            x, y = round(item.pos().x()), round(item.pos().y())
+            if (x, y) != (item.node.coords.x, item.node.coords.y):
+                self.nodeMoved.emit(item.node, x, y)
+        # the profile's badges follow the nodes
+        if self.profile is not None:
+            self.viewport().update()
+
+    def keyPressEvent(self, event: QtGui.QKeyEvent) -> None:
+        if event.key() not in (QtCore.Qt.Key.Key_Delete, QtCore.Qt.Key.Key_Backspace):
+            return super().keyPressEvent(event)
+
+        for item in self.scene().selectedItems():
+            if isinstance(item, FlowNodeItem):
+                self.scene().removeItem(item)
+                self.items.pop(item.node.uid, None)
+                self.nodeDeleted.emit(item.node)
+
+    def dragEnterEvent(self, event: QtGui.QDragEnterEvent) -> None:
+        if event.mimeData().hasFormat('binary/pickle'):
+            event.acceptProposedAction()
+        else:
+            super().dragEnterEvent(event)
+
+    def dragMoveEvent(self, event: QtGui.QDragMoveEvent) -> None:
+        if event.mimeData().hasFormat('binary/pickle'):
+            event.acceptProposedAction()
+        else:
+            super().dragMoveEvent(event)
+
+    def dropEvent(self, event: QtGui.QDropEvent) -> None:
+        '''
+            Add a node calling the function dragged from the functions'
+            tree (see FnTreeView.startDrag)
+        '''
+        if not event.mimeData().hasFormat('binary/pickle'):
+            return super().dropEvent(event)
+
+        function: Function = pickle.loads(event.mimeData().data('binary/pickle').data())
+        position = self.mapToScene(event.position().toPoint())
+        node = FlowElement(
+            coords=FlowElement.ChartCoords(round(position.x()), round(position.y())),
+            function=Function(function.module, function.name))
+        event.acceptProposedAction()
+
+        self.add_node_item(node)
+        self.nodeAdded.emit(node)
+
+    def set_profile(self, profile: Optional[FlowProfile]) -> None:
+        self.profile = profile
+        self.viewport().update()
+
+    def drawForeground(self, painter: QtGui.QPainter, rect: QtCore.QRectF) -> None:
+        super().drawForeground(painter, rect)
+
+        if self.profile is None:
+            return
+
+        hottest = self.profile.hottest() or 1.0
+        metrics = painter.fontMetrics()
+        padding = self.PROFILE_PADDING
+
+        for element in self.flow.nodes:
+            node = self.profile.nodes.get(element.uid)
+            if node is None:
+                continue
+
+            if node.cache in (CacheStatus.HIT, CacheStatus.RESUMED):
+                lines = [node.cache]
+            else:
+                lines = [f'{format_time(node.wall)} ms ({node.wall / hottest:.0%})',
+                         f'CPU {format_time(node.cpu)} ms, {format_size(node.memory)}']
+
+            width = max(metrics.horizontalAdvance(line) for line in lines) + 2 * padding
+            height = metrics.height() * len(lines) + 2 * padding
+            item = self.items.get(element.uid)
+            position = item.pos() if item is not None else QtCore.QPointF(element.coords.x, element.coords.y)
+            badge = QtCore.QRectF(position.x(), position.y() - height, width, height)
+            if not badge.intersects(rect):
+                continue
+
+            # green (cold) to red (the slowest node)
+            heat = min(1.0, node.wall / hottest)
+            color = QtGui.QColor.fromHsvF((1.0 - heat) / 3, 0.8, 0.9, 0.85)
+
+            painter.setPen(QtCore.Qt.PenStyle.NoPen)
+            painter.setBrush(color)
+            painter.drawRoundedRect(badge, padding, padding)
+
+            painter.setPen(QtGui.QColor(QtCore.Qt.GlobalColor.black))
+            painter.drawText(
+                badge.adjusted(padding, padding, -padding, -padding),
+                int(QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.AlignmentFlag.AlignTop),
+                '\n'.join(lines))
 
 
 class GraphWidget(QWidget):